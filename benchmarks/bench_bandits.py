@@ -0,0 +1,57 @@
+from rlp.multi_armed_bandits.envs import MultiArmedBandit, BatchedMultiArmedBandit
+from rlp.multi_armed_bandits.agents import EpsGreedy, EpsGreedyConstStep, UCB, GradientBandit, \
+    BatchedEpsGreedy, BatchedUCB, BatchedGradientBandit
+from rlp.multi_armed_bandits.testbed import BanditTestbed
+import numpy as np
+"""
+Bandit steps (action, reward, update) per agent, the rate is steps per second,
+summed over runs for the batched agents.
+"""
+
+K = 10
+N_STEPS = 1000
+N_RUNS = 200
+
+AGENTS = {
+    'EpsGreedy': lambda: EpsGreedy(eps=0.1, Q0=np.zeros(K), seed=0),
+    'EpsGreedyConstStep': lambda: EpsGreedyConstStep(eps=0.1, Q0=np.zeros(K), alpha=0.1, seed=0),
+    'UCB': lambda: UCB(alpha=0.1, conf_level=2, Q0=np.zeros(K), seed=0),
+    'GradientBandit': lambda: GradientBandit(H0=np.zeros(K), alpha=0.1, baseline=True, seed=0),
+}
+
+BATCHED_AGENTS = {
+    'BatchedEpsGreedy': lambda: BatchedEpsGreedy(eps=0.1, Q0=np.zeros(K), n_runs=N_RUNS, seed=0),
+    'BatchedUCB': lambda: BatchedUCB(alpha=0.1, conf_level=2, Q0=np.zeros(K), n_runs=N_RUNS, seed=0),
+    'BatchedGradientBandit': lambda: BatchedGradientBandit(H0=np.zeros(K), alpha=0.1, n_runs=N_RUNS,
+                                                           baseline=True, seed=0),
+}
+
+
+class BanditSteps:
+    params = (list(AGENTS), )
+    param_names = ['agent']
+    items = N_STEPS
+
+    def setup(self, agent):
+        self.bandit = MultiArmedBandit(K, np.random.RandomState(0).normal(0, 1, K), np.ones(K), seed=1)
+        self.agent = AGENTS[agent]()
+
+    def time_steps(self, agent):
+        bandit, agent = self.bandit, self.agent
+        for _ in range(N_STEPS):
+            agent.set_experience(bandit.act(agent.action()))
+            agent.update()
+
+
+class BatchedBanditSteps:
+    params = (list(BATCHED_AGENTS), )
+    param_names = ['agent']
+    items = N_STEPS * N_RUNS
+
+    def setup(self, agent):
+        means = np.random.RandomState(0).normal(0, 1, (N_RUNS, K))
+        self.testbed = BanditTestbed(BatchedMultiArmedBandit(N_RUNS, K, means, np.ones(K), seed=1),
+                                     BATCHED_AGENTS[agent]())
+
+    def time_steps(self, agent):
+        self.testbed.run(N_STEPS)
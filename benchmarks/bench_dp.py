@@ -0,0 +1,45 @@
+from rlp.dynamic_programming.solver import DPGridWorldSolver, JackCarRentalSolver
+from rlp.dynamic_programming.base import DPGridWorldAgent, DPGridWorldEnv, JackCarRentalAgent, JackCarRentalEnv
+"""
+Policy evaluation sweeps of DynamicProgrammingSolver, the rate is state backups per second.
+The model is compiled in setup, every timed call starts from V = 0 and runs a fixed number of sweeps.
+"""
+
+SWEEPS = 5
+
+
+def _zero(V):
+    for state in V:
+        V[state] = 0.
+
+
+class GridWorldPolicyEval:
+    params = ([10, 30, 60], ['dict', 'numpy'])
+    param_names = ['size', 'backend']
+
+    def setup(self, size, backend):
+        self.agent = DPGridWorldAgent(size, size, discountRatio=0.9)
+        self.solver = DPGridWorldSolver(self.agent, DPGridWorldEnv(size, size, [(0, 0), (size - 1, size - 1)]),
+                                        threshold=0., backend=backend)
+        self.solver.policy_eval(onestep=True)
+        self.items = SWEEPS * len(self.agent.V)
+
+    def time_policy_eval(self, size, backend):
+        _zero(self.agent.V)
+        self.solver.policy_eval(max_sweeps=SWEEPS)
+
+
+class JackCarRentalPolicyEval:
+    params = ([5, 10, 20], ['dict', 'numpy'])
+    param_names = ['capacity', 'backend']
+
+    def setup(self, capacity, backend):
+        self.agent = JackCarRentalAgent(discountRatio=0.9, capacity=capacity, max_move=min(5, capacity))
+        self.solver = JackCarRentalSolver(self.agent, JackCarRentalEnv((3, 4), (3, 2), capacity=capacity),
+                                          threshold=0., backend=backend)
+        self.solver.policy_eval(onestep=True)
+        self.items = SWEEPS * len(self.agent.V)
+
+    def time_policy_eval(self, capacity, backend):
+        _zero(self.agent.V)
+        self.solver.policy_eval(max_sweeps=SWEEPS)
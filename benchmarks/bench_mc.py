@@ -0,0 +1,35 @@
+from rlp.monte_carlo.base import BlackJackEnv, BatchedBlackJackEnv, NaiveBlackJackAgent, AdvancedBlackJackAgent, \
+    encode_state
+from rlp.rollout import rollout, encode_states, episode_batches, learn, drain
+import numpy as np
+"""
+Black Jack episodes with Monte Carlo learning, the rate is episodes per second.
+"""
+
+
+class BlackJackEpisodes:
+    params = (['naive', 'advanced'], )
+    param_names = ['agent']
+    items = 1000
+
+    def setup(self, agent):
+        self.env = BlackJackEnv(seed=0)
+        self.agent = NaiveBlackJackAgent(seed=0) if agent == 'naive' else AdvancedBlackJackAgent(seed=0)
+        np.random.seed(0)
+
+    def time_episodes(self, agent):
+        drain(learn(episode_batches(encode_states(rollout(self.env, self.agent, n_episodes=self.items),
+                                                  encode_state), 100), self.agent.update_batch))
+
+
+class BatchedBlackJackEpisodes:
+    params = ([10000, 100000], )
+    param_names = ['n_episodes']
+
+    def setup(self, n_episodes):
+        self.env = BatchedBlackJackEnv(seed=0)
+        self.agent = AdvancedBlackJackAgent(seed=0)
+        self.items = n_episodes
+
+    def time_simulate_and_update(self, n_episodes):
+        self.agent.update_batch(*self.env.simulate(self.agent.policy_table, n_episodes, exploring_starts=True))
@@ -0,0 +1,50 @@
+from rlp import utilis
+import numpy as np
+"""
+Hot helpers of rlp.utilis, the rate is calls per second.
+"""
+
+
+class PoissonProb:
+    """ possion_prob served from the cached tables, and the tables built anew.
+    """
+    items = 21
+
+    def time_possion_prob(self):
+        for n in range(self.items):
+            utilis.possion_prob(n, 3, truncate_threshold=15)
+
+    def time_possion_prob_uncached(self):
+        for n in range(self.items):
+            utilis._poisson_tables.cache_clear()
+            utilis.possion_prob(n, 3, truncate_threshold=15)
+
+
+class Argmax:
+    params = (['dict', 'array', 'rows'], )
+    param_names = ['container']
+    items = 1
+
+    def setup(self, container):
+        values = np.random.RandomState(0).randint(0, 5, (1000, 10)).astype(float)
+        self.container = {
+            'dict': dict(enumerate(values[0])),
+            'array': values[0],
+            'rows': values,
+        }[container]
+
+    def time_argmax(self, container):
+        utilis.argmax(self.container)
+
+
+class Softmax:
+    params = ([(10, ), (1000, 10)], )
+    param_names = ['shape']
+    items = 1
+
+    def setup(self, shape):
+        self.x = np.random.RandomState(0).randn(*shape)
+        self.out = np.empty_like(self.x)
+
+    def time_softmax(self, shape):
+        utilis.softmax(self.x, out=self.out)
@@ -0,0 +1,120 @@
+from itertools import product
+import argparse
+import importlib
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+import numpy as np
+"""
+This module runs the benchmark suite and writes the timings to JSON, e.g.
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run -o new.json --compare results.json
+
+Benchmarks follow the asv layout: classes in the bench_* modules with optional params, param_names
+and setup(*params), and time_* methods. A class may set items, the amount of work in one call,
+e.g. episodes or state backups, which gives a rate in items per second.
+"""
+
+MODULES = ('bench_dp', 'bench_mc', 'bench_bandits', 'bench_utilis')
+
+
+def iter_benchmarks(modules=MODULES, pattern=None):
+    """ yield (name, class, method name, params) of every benchmark whose name contains pattern.
+    """
+    for module_name in modules:
+        module = importlib.import_module('benchmarks.' + module_name)
+        for cls_name, cls in sorted(vars(module).items()):
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            names = getattr(cls, 'param_names', [])
+            for method in sorted(m for m in vars(cls) if m.startswith('time_')):
+                for params in product(*getattr(cls, 'params', ())):
+                    args = ', '.join('%s=%r' % pair for pair in zip(names, params))
+                    name = '%s.%s.%s(%s)' % (module_name, cls_name, method, args)
+                    if pattern is None or pattern in name:
+                        yield name, cls, method, params
+
+
+def time_benchmark(cls, method, params, repeat=5):
+    """ time one benchmark with timeit, the number of calls per repeat is picked by Timer.autorange.
+
+    Returns:
+    dict with the best and mean seconds per call, number, repeat and the rate if the class sets items.
+    """
+    bench = cls()
+    if hasattr(bench, 'setup'):
+        bench.setup(*params)
+    fn = getattr(bench, method)
+    timer = timeit.Timer(lambda: fn(*params))
+    number, _ = timer.autorange()
+    times = np.array(timer.repeat(repeat, number)) / number
+    result = {'best': float(times.min()), 'mean': float(times.mean()), 'number': number, 'repeat': repeat}
+    items = getattr(bench, 'items', None)
+    if items is not None:
+        result['rate'] = items / result['best']
+    if hasattr(bench, 'teardown'):
+        bench.teardown(*params)
+    return result
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'machine': platform.machine(), 'platform': platform.platform()}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """ benchmarks whose best time grew by more than tolerance over the baseline.
+
+    Returns:
+    list of (name, baseline seconds, seconds, ratio), slowest first.
+    """
+    slower = []
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result['best'] / baseline[name]['best']
+            if ratio > 1 + tolerance:
+                slower.append((name, baseline[name]['best'], result['best'], ratio))
+    return sorted(slower, key=lambda row: -row[3])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the rlp benchmark suite.')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='JSON file of the results.')
+    parser.add_argument('-k', '--filter', default=None, help='only run benchmarks whose name contains FILTER.')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timing repeats.')
+    parser.add_argument('--compare', default=None, help='JSON results of a previous run to check against.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown reported as regression.')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, cls, method, params in iter_benchmarks(pattern=args.filter):
+        results[name] = time_benchmark(cls, method, params, args.repeat)
+        rate = results[name].get('rate')
+        print('%-90s %12.3f ms%s' % (name, 1e3 * results[name]['best'],
+                                     '' if rate is None else '  %14.1f /s' % rate))
+
+    with open(args.output, 'w') as f:
+        json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+    print('results written to %s' % args.output)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        slower = compare(results, baseline, args.tolerance)
+        for name, old, new, ratio in slower:
+            print('regression: %s %.3f ms => %.3f ms (x%.2f)' % (name, 1e3 * old, 1e3 * new, ratio))
+        return int(bool(slower))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
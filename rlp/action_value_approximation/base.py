@@ -0,0 +1,135 @@
+from rlp.base import BaseEnvironment, BaseAgent
+from .tile_coding import TileCoder
+import numpy as np
+"""
+This module provides Mountain Car and episodic semi-gradient SARSA
+with linear action values over tile-coded features, see chapter 10.
+"""
+
+# action
+REVERSE, ZERO, FORWARD = 0, 1, 2
+ACTIONS = [REVERSE, ZERO, FORWARD]
+IN_PROGRESS, TERMINAL = 0, 1
+
+POSITION_BOUND = (-1.2, 0.5)
+VELOCITY_BOUND = (-0.07, 0.07)
+
+
+class MountainCarEnv(BaseEnvironment):
+    """ Mountain Car task in page 245, states are (position, velocity),
+    reward is -1 at each step until the car passes the right bound.
+    """
+
+    def __init__(self, seed=None):
+        super(MountainCarEnv, self).__init__(seed)
+
+    def step(self, state, action):
+        assert action in ACTIONS
+        position, velocity = state
+        velocity += 0.001 * (action - 1) - 0.0025 * np.cos(3 * position)
+        velocity = min(max(velocity, VELOCITY_BOUND[0]), VELOCITY_BOUND[1])
+        position += velocity
+        position = min(max(position, POSITION_BOUND[0]), POSITION_BOUND[1])
+        if position == POSITION_BOUND[0]:
+            velocity = 0.
+        if position == POSITION_BOUND[1]:
+            return -1, (position, velocity), TERMINAL
+        return -1, (position, velocity), IN_PROGRESS
+
+    def reset(self):
+        """ start at a random position in [-0.6, -0.4) with zero velocity.
+        """
+        return self.random_state.uniform(-0.6, -0.4), 0.
+
+    def tile_coder(self, n_tilings=8, n_tiles=8, size=4096):
+        """ TileCoder over the (position, velocity) box.
+        """
+        return TileCoder((POSITION_BOUND[0], VELOCITY_BOUND[0]), (POSITION_BOUND[1], VELOCITY_BOUND[1]),
+                         n_tilings, n_tiles, size)
+
+
+class SemiGradientSarsaAgent(BaseAgent):
+    """ Episodic semi-gradient SARSA, page 244, with q(s, a, w) = \\sum_{i active} w_i
+    over the tiles of the pair (s, a). An update touches the active weights only.
+    The agent follows the TD agents' protocol, see rlp.temporal_difference.base.run_episode.
+    """
+
+    def __init__(self, coder, n_actions, alpha, discountRatio, eps=0., seed=None):
+        """
+        Params:
+        coder - feature function (state, action) => int array of active indices, e.g. TileCoder.
+        n_actions - number of actions, actions are 0 .. n_actions - 1.
+        alpha - step size, divided by the number of active features, e.g. 0.5 means 0.5 / n_tilings.
+        discountRatio - discount ratio for returns.
+        eps - prob. of exploration.
+        seed - random seed.
+        """
+        super(SemiGradientSarsaAgent, self).__init__(seed)
+        self.coder = coder
+        self.n_actions = n_actions
+        self.alpha = alpha
+        self.discountRatio = discountRatio
+        self.eps = eps
+        self.w = np.zeros(coder.size)
+        self.timestep = 0
+        self.reset()
+
+    def features(self, state):
+        """ active indices of every action in state, int array (n_actions, n_active).
+        """
+        return np.stack([self.coder(state, action) for action in range(self.n_actions)])
+
+    def q_values(self, state, features=None):
+        """ float array (n_actions, ), estimated action values of state.
+        """
+        features = self.features(state) if features is None else features
+        return self.w[features].sum(axis=1)
+
+    def _eps_greedy(self, features):
+        if self.random_state.random_sample() < self.eps:
+            return self.random_state.randint(self.n_actions)
+        q = self.w[features].sum(axis=1)
+        ties = np.flatnonzero(q == q.max())
+        return int(ties[0] if len(ties) == 1 else ties[self.random_state.randint(len(ties))])
+
+    def set_state(self, state):
+        # the next state of the last update, whose action was chosen with its target
+        if self._next_features is not None and np.array_equal(state, self._next_state):
+            self._features = self._next_features
+        else:
+            self._features = self.features(state)
+            self._next_action = None
+
+    def action(self):
+        if self._next_action is not None:
+            self.At, self._next_action = self._next_action, None
+        else:
+            self.At = self._eps_greedy(self._features)
+        return self.At
+
+    def set_experience(self, reward, new_state, terminal=False):
+        self.Rt = reward
+        self.done = terminal
+        self._next_state = None if terminal else new_state
+        self._next_features = None
+
+    def update(self):
+        active = self._features[self.At]
+        target = self.Rt
+        if not self.done:
+            self._next_features = self.features(self._next_state)
+            self._next_action = self._eps_greedy(self._next_features)
+            target += self.discountRatio * self.w[self._next_features[self._next_action]].sum()
+        delta = target - self.w[active].sum()
+        # hashed tiles may collide within one feature vector
+        np.add.at(self.w, active, self.alpha / len(active) * delta)
+        self.timestep += 1
+
+    def reset(self):
+        self._features = None
+        self._next_state = None
+        self._next_features = None
+        self._next_action = None
+        self.At = None
+        self.Rt = 0.
+        self.done = False
@@ -0,0 +1,105 @@
+from math import floor
+import numpy as np
+"""
+This module provides hashed tile coding, see page 217, after Sutton's tiles3.
+Tile coordinates are mapped to indices by an index hash table of fixed size,
+so memory stays bounded however large the state space is.
+"""
+
+
+class IHT:
+    """ Index hash table, maps tile coordinates to indices 0 .. size - 1.
+    Coordinates get consecutive indices until the table is full,
+    after that they are hashed into the table and may collide.
+    """
+
+    def __init__(self, size):
+        """
+        Params:
+        size - number of indices, i.e. the length of the weight vector.
+        """
+        self.size = size
+        self.overfull_count = 0
+        self.dictionary = {}
+
+    def count(self):
+        return len(self.dictionary)
+
+    def full(self):
+        return len(self.dictionary) >= self.size
+
+    def get_index(self, coordinates, read_only=False):
+        """ index of the coordinates tuple, None if unseen and read_only.
+        """
+        d = self.dictionary
+        if coordinates in d:
+            return d[coordinates]
+        elif read_only:
+            return None
+        if len(d) >= self.size:
+            if self.overfull_count == 0:
+                print("rlp::warning:: IHT of size %d is full, tiles start to collide." % self.size)
+            self.overfull_count += 1
+            return hash(coordinates) % self.size
+        index = len(d)
+        d[coordinates] = index
+        return index
+
+    def __repr__(self):
+        return 'IHT(size = %d, count = %d, overfull = %d)' % (self.size, self.count(), self.overfull_count)
+
+
+def tiles(iht, n_tilings, floats, ints=(), read_only=False):
+    """ indices of the active tiles, one per tiling.
+    Params:
+    iht - IHT object.
+    n_tilings - number of tilings, a power of 2 is recommended.
+    floats - scaled continuous variables, one unit is the width of a tile.
+    ints - extra discrete variables, e.g. the action.
+    read_only - do not add unseen tiles to iht, their index is None.
+
+    Returns:
+    list of n_tilings indices.
+    """
+    qfloats = [floor(f * n_tilings) for f in floats]
+    ret = []
+    for tiling in range(n_tilings):
+        # asymmetric offsets 1, 3, 5, ... per dimension
+        coordinates = [tiling]
+        b = tiling
+        for q in qfloats:
+            coordinates.append((q + b) // n_tilings)
+            b += tiling * 2
+        coordinates.extend(ints)
+        ret.append(iht.get_index(tuple(coordinates), read_only))
+    return ret
+
+
+class TileCoder:
+    """ Tile coding of a box shaped continuous state space with an IHT of fixed size.
+    """
+
+    def __init__(self, low, high, n_tilings=8, n_tiles=8, size=4096):
+        """
+        Params:
+        low, high - bounds of each state variable, array-like (n_dims, ).
+        n_tilings - number of tilings.
+        n_tiles - number of tiles per dimension across [low, high] in each tiling.
+        size - size of the index hash table.
+        """
+        self.low = np.asarray(low, dtype=float)
+        self.scale = n_tiles / (np.asarray(high, dtype=float) - self.low)
+        self.n_tilings = n_tilings
+        self.n_tiles = n_tiles
+        self.size = size
+        self.iht = IHT(size)
+
+    def __call__(self, state, action=None):
+        """ int array (n_tilings, ), active tiles of state, or of the pair (state, action).
+        """
+        floats = ((np.asarray(state, dtype=float) - self.low) * self.scale).tolist()
+        ints = () if action is None else (int(action), )
+        return np.array(tiles(self.iht, self.n_tilings, floats, ints), dtype=np.int64)
+
+    def __repr__(self):
+        return 'TileCoder(%d tilings of %d tiles, %r)' % (self.n_tilings, self.n_tiles, self.iht)
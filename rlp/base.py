@@ -30,6 +30,10 @@ class BaseAgent(ABC):
 
 class BaseEnvironment(ABC):
     """ Abstract Class for Environment.
+    Episodic environments share one contract:
+        state = env.reset()
+        reward, state, status = env.step(state, action)
+    until status is TERMINAL (1), see rlp.vector_env.VectorEnv for running copies of them.
     """
 
     def __init__(self, seed):
@@ -38,5 +42,12 @@ class BaseEnvironment(ABC):
     @abstractmethod
     def step(self, state, action):
         """ Give a scalar reward and next state based on current action and state.
+        Returns:
+        reward, new_state, status - status is IN_PROGRESS (0) or TERMINAL (1).
         """
         raise NotImplemented
+
+    def reset(self):
+        """ Start a new episode, return its first state.
+        """
+        raise NotImplementedError('%s has no start state' % self.__class__.__name__)
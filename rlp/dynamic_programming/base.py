@@ -1,8 +1,8 @@
-from rlp.mdps import MDP
+from rlp.mdps import MDP, CompiledMDP
 from rlp.base import BaseAgent
 from rlp.grid_world import GridWorld, GridWorldAgent, OFFSET
 from rlp import utilis
-from itertools import product
+import numpy as np
 
 
 class DynamicProgrammingEnvModel(MDP):
@@ -45,29 +45,43 @@ class DPGridWorldEnv(DynamicProgrammingEnvModel, GridWorld):
         GridWorld.__init__(self, width, length, terminals, seed)
 
     def prob_next_state_n_reward(self, state, action):
-        ret = {}
-
-        if state in self.terminal_states:
-            reward = 0
-            nextState = state
-            ret[(nextState, reward)] = 1
-            return ret
-
-        y, x = state
-        assert y >= 0 and y < self.width
-        assert x >= 0 and x < self.length
-
-        reward = -1
-        dy, dx = OFFSET[action]
-        y_, x_ = y + dy, x + dx
-        nextState = GridWorld.clip_range(y_, 0, self.width - 1),\
-            GridWorld.clip_range(x_, 0, self.length - 1)
+        s = self.encode(state)
+        nextState = self.decode(self.next_state_table[s, action])
+        return {(nextState, int(self.reward_table[s, action])): 1}
 
-        if nextState in self.terminal_states:
-            reward = 0
-        ret[(nextState, reward)] = 1
+    def model_params(self):
+        return self.width, self.length, tuple(self.terminal_states)
 
-        return ret
+    def compile_rows(self, states, actions, state_actions, state_index=None):
+        """ CSR rows read from next_state_table and reward_table, one entry per (state, action) pair,
+        see MDP.compile_rows.
+        """
+        if self._table_params != self.model_params():
+            self._init_tables()
+        if state_index is None:
+            state_index = dict((state, s) for s, state in enumerate(states))
+        # flat state => index used for next states
+        position = np.full(self.n_states, -1, dtype=np.int64)
+        for state, s in state_index.items():
+            position[self.encode(state)] = s
+
+        flat = np.array([self.encode(state) for state in states], dtype=np.int64).reshape(-1)
+        action_ids = np.asarray(actions, dtype=np.int64)
+        action_index = dict((action, a) for a, action in enumerate(actions))
+        mask = np.zeros((len(states), len(actions)), dtype=bool)
+        for s, state in enumerate(states):
+            for action in state_actions[state]:
+                mask[s, action_index[action]] = True
+
+        next_states = position[self.next_state_table[flat[:, None], action_ids]]
+        if np.any(next_states[mask] < 0):
+            raise KeyError('next states must be in state_index')
+        indptr = np.zeros(mask.size + 1, dtype=np.int64)
+        np.cumsum(mask.ravel(), out=indptr[1:])
+        indices = next_states[mask]
+        data = np.ones(len(indices))
+        R = np.where(mask, self.reward_table[flat[:, None], action_ids], 0).astype(float)
+        return indptr, indices, data, R
 
 
 class DPGridWorldAgent(DynamicProgrammingAgent, GridWorldAgent):
@@ -80,54 +94,184 @@ class DPGridWorldAgent(DynamicProgrammingAgent, GridWorldAgent):
 
 class JackCarRentalEnv(DynamicProgrammingEnvModel):
     """ DEMO Environment for jack's car rental problem.
+    The two locations are independent given the cars after moving, so the transition
+    is the outer product of two per-location distributions over next-day car counts.
     """
 
-    def __init__(self, rental_lams, return_lams, seed=None):
+    def __init__(self, rental_lams, return_lams, capacity=20, seed=None):
+        """
+        Params:
+        rental_lams - possion params of rentals at the two locations.
+        return_lams - possion params of returns at the two locations.
+        capacity - max num of cars at each location.
+        seed - random seed.
+        """
         super(JackCarRentalEnv, self).__init__(seed)
         self.rental_lams = rental_lams
         self.return_lams = return_lams
+        self.capacity = capacity
+        self._tables = None
+
+    def step(self, state, action):
+        print("rlp::warning:: Do not call 'step' in %s." % self.__class__)
+        pass
 
     def prob_next_state_n_reward(self, state, action):
+        """ Rewards are given as their expectation conditioned on the next state,
+        which keeps \\sum_{s', r} p(s', r| s, a)[r + \\gamma V(s')] exact.
+        """
         n_car0, n_car1 = state  # num of cars avaliable at current timestep
         # move the car
         n_car0 -= action
         n_car1 += action
 
+        (P0, rentals0), (P1, rentals1) = self.location_tables()
+        # customer rent and return cars, independently at each location
+        probs = np.outer(P0[n_car0], P1[n_car1])
+        rewards = 10 * np.add.outer(rentals0[n_car0], rentals1[n_car1]) - 2 * abs(action)
+
         ret = {}
-        # customer rent and return cars
-        for n_rental0, n_rental1 in product(range(0, n_car0 + 1), range(0, n_car1 + 1)):
-            p_rental0 = utilis.possion_prob(n_rental0, self.rental_lams[0], truncate_threshold=n_car0)
-            p_rental1 = utilis.possion_prob(n_rental1, self.rental_lams[1], truncate_threshold=n_car1)
-
-            max_n_return0, max_n_return1 = 20 - (n_car0 - n_rental0), 20 - (n_car1 - n_rental1)
-            for n_return0, n_return1 in product(range(0, max_n_return0 + 1), range(0, max_n_return1 + 1)):
-                p_return0 = utilis.possion_prob(n_return0, self.return_lams[0], truncate_threshold=max_n_return0)
-                p_return1 = utilis.possion_prob(n_return1, self.return_lams[1], truncate_threshold=max_n_return1)
-                prob = p_rental0 * p_rental1 * p_return0 * p_return1
-
-                n_car0_next = n_car0 - n_rental0 + n_return0
-                n_car1_next = n_car1 - n_rental1 + n_return1
-                nextState = n_car0_next, n_car1_next
-                reward = 10 * (n_rental0 + n_rental1) - 2 * abs(action)
-
-                # if still we get invalid value
-                # just ignore this value and count it as 0
-                if (nextState, reward) not in ret:
-                    ret[(nextState, reward)] = prob
-                else:
-                    ret[(nextState, reward)] += prob
+        for n_car0_next, n_car1_next in zip(*[idx.tolist() for idx in np.nonzero(probs)]):
+            nextState = n_car0_next, n_car1_next
+            ret[(nextState, float(rewards[nextState]))] = probs[nextState]
 
         return ret
 
+    def location_tables(self):
+        """ per-location transition tables indexed by num of cars after moving, built once per model_params.
+
+        Returns:
+        list of (P, rentals) for the two locations,
+        P - float array (capacity + 1, capacity + 1), [m, n] => Pr{n cars next day | m cars after moving}
+        rentals - float array (capacity + 1, capacity + 1), [m, n] => E[num of rentals | m, n]
+        """
+        key = self.model_params()
+        if self._tables is None or self._tables[0] != key:
+            self._tables = key, [self._location_table(self.rental_lams[i], self.return_lams[i]) for i in range(2)]
+        return self._tables[1]
+
+    def model_params(self):
+        return tuple(self.rental_lams), tuple(self.return_lams), self.capacity
+
+    def _location_table(self, rental_lam, return_lam):
+        cap = self.capacity
+        P = np.zeros((cap + 1, cap + 1))
+        rentals = np.zeros((cap + 1, cap + 1))
+        for n_car in range(cap + 1):
+            joint = self._location_joint(n_car, rental_lam, return_lam)
+            P[n_car] = joint.sum(axis=0)
+            # E[k | n] = \sum_k k Pr{k, n} / Pr{n}
+            np.divide(np.arange(n_car + 1) @ joint, P[n_car], out=rentals[n_car], where=P[n_car] > 0)
+        return P, rentals
+
+    def _location_joint(self, n_car, rental_lam, return_lam):
+        """ joint prob of number of rentals and number of cars next day at one location.
+        Params:
+        n_car - num of cars after moving.
+        rental_lam, return_lam - possion params of rentals and returns.
+
+        Returns:
+        float array (n_car + 1, capacity + 1), [k, n] => Pr{k rentals, n cars next day}
+        """
+        joint = np.zeros((n_car + 1, self.capacity + 1))
+        p_rental = utilis.truncated_poisson(rental_lam, n_car)
+        for n_rental in range(n_car + 1):
+            n_left = n_car - n_rental
+            joint[n_rental, n_left:] = p_rental[n_rental] * utilis.truncated_poisson(return_lam, self.capacity - n_left)
+        return joint
+
+    def _compile(self, state_actions):
+        return JackCarRentalModel(self, state_actions)
+
+
+class JackCarRentalModel(CompiledMDP):
+    """ Compiled model of JackCarRentalEnv which never builds the dense transition tensor.
+    With P0, P1 the per-location transition tables and V as a matrix over car counts,
+    \\sum_{s'} p(s'| s, a) V(s') = (P0 V P1^T)[n0 - a, n1 + a], O(capacity^3) for all pairs.
+    """
+
+    def __init__(self, env, state_actions):
+        states, actions, mask = MDP.enumerate(state_actions)
+
+        (self.P0, rentals0), (self.P1, rentals1) = env.location_tables()
+        cap = env.capacity
+        self.n_car0 = np.array([state[0] for state in states])
+        self.n_car1 = np.array([state[1] for state in states])
+        moves = np.array(actions)
+        # num of cars after moving, clipped for unavailable actions
+        self.moved0 = np.clip(self.n_car0[:, None] - moves[None, :], 0, cap)
+        self.moved1 = np.clip(self.n_car1[:, None] + moves[None, :], 0, cap)
+        exp_rentals0 = (self.P0 * rentals0).sum(axis=1)
+        exp_rentals1 = (self.P1 * rentals1).sum(axis=1)
+        R = 10 * (exp_rentals0[self.moved0] + exp_rentals1[self.moved1]) - 2 * np.abs(moves)[None, :]
+        R[~mask] = 0
+
+        self.grid_index = np.full((cap + 1, cap + 1), -1, dtype=np.int64)
+        self.grid_index[self.n_car0, self.n_car1] = np.arange(len(states))
+        super(JackCarRentalModel, self).__init__(states, actions, mask, None, None, None, R)
+
+    def _value_grid(self, V):
+        grid = np.zeros(self.grid_index.shape)
+        grid[self.n_car0, self.n_car1] = V
+        return grid
+
+    def expected_next_values(self, V):
+        W = self.P0 @ self._value_grid(V) @ self.P1.T
+        return np.where(self.mask, W[self.moved0, self.moved1], 0)
+
+    def state_q_values(self, s, V, discountRatio):
+        grid = self._value_grid(V)
+        ev = np.einsum('ai,ij,aj->a', self.P0[self.moved0[s]], grid, self.P1[self.moved1[s]])
+        return self.R[s] + discountRatio * np.where(self.mask[s], ev, 0)
+
+    def transitions(self, s, a):
+        probs = np.outer(self.P0[self.moved0[s, a]], self.P1[self.moved1[s, a]])
+        keep = (probs > 0) & (self.grid_index >= 0)
+        return self.grid_index[keep], probs[keep]
+
+    def predecessors(self):
+        self._materialize()
+        return super(JackCarRentalModel, self).predecessors()
+
+    def absorbing_states(self):
+        self._materialize()
+        return super(JackCarRentalModel, self).absorbing_states()
+
+    def _materialize(self):
+        """ build the CSR arrays, only needed by the predecessor index.
+        """
+        if self.indptr is not None:
+            return
+        S, A = self.n_states, self.n_actions
+        counts = np.zeros(S * A, dtype=np.int64)
+        indices, data = [], []
+        for s in range(S):
+            for a in np.flatnonzero(self.mask[s]):
+                next_states, probs = self.transitions(s, a)
+                counts[s * A + a] = len(next_states)
+                indices.append(next_states)
+                data.append(probs)
+        self.indptr = np.concatenate([[0], np.cumsum(counts)])
+        self.indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+        self.data = np.concatenate(data) if data else np.zeros(0)
+        self._rows = np.repeat(np.arange(S * A), counts)
+
 
 class JackCarRentalAgent(DynamicProgrammingAgent):
     """ DEMO Agent for jack's car rental problem.
     """
 
-    ACTIONS = list(range(-5, 6))  # predefined possbile actions
-
-    def __init__(self, discountRatio, seed=None):
+    def __init__(self, discountRatio, capacity=20, max_move=5, seed=None):
+        """
+        Params:
+        discountRatio - discount ratio for returns.
+        capacity - max num of cars at each location.
+        max_move - max num of cars moved overnight.
+        seed - random seed.
+        """
         super(JackCarRentalAgent, self).__init__(seed)
+        self.capacity = capacity
+        self.actions = list(range(-max_move, max_move + 1))
         self._init_state_value_fun()
         self._init_policy()
         self.discountRatio = discountRatio
@@ -136,23 +280,24 @@ class JackCarRentalAgent(DynamicProgrammingAgent):
         """ initialize V function, all as 0.
         """
         self.V = {}
-        for i in range(21):
-            for j in range(21):
+        for i in range(self.capacity + 1):
+            for j in range(self.capacity + 1):
                 self.V[(i, j)] = 0
 
     def _init_policy(self):
         """ initialize policy as a uniform distribution.
         """
+        cap = self.capacity
         self.policy = {}
-        for i in range(21):
-            for j in range(21):
+        for i in range(cap + 1):
+            for j in range(cap + 1):
                 if (i, j) not in self.policy:
                     self.policy[(i, j)] = {}
                 possbile_actions = []
-                for action in JackCarRentalAgent.ACTIONS:
-                    if i - action < 0 or i - action > 20 or j + action > 20 or j + action < 0:
+                for action in self.actions:
+                    if i - action < 0 or i - action > cap or j + action > cap or j + action < 0:
                         continue
                     else:
                         possbile_actions.append(action)
                 for action in possbile_actions:
-                    self.policy[(i, j)][action] = 1 / len(possbile_actions)
\ No newline at end of file
+                    self.policy[(i, j)][action] = 1 / len(possbile_actions)
@@ -0,0 +1,159 @@
+from rlp import utilis
+from rlp.mdps import MDP
+from threading import BrokenBarrierError
+import multiprocessing as mp
+import numpy as np
+"""
+This module runs synchronous DP sweeps on a pool of worker processes.
+Each worker owns a contiguous slice of the states, builds that slice of the model
+with prob_next_state_n_reward once, and backs up its states from a V array
+in shared memory.
+"""
+
+# COMMANDS
+STOP, EVAL, GREEDY_EVAL, IMPROVE = 0, 1, 2, 3
+
+
+class ParallelSweeper:
+    """ Pool of worker processes running Jacobi-style DP sweeps on shared memory.
+    V is double buffered, a sweep reads V[src] and writes V[1 - src],
+    the max diff of every worker is collected after a barrier.
+    """
+
+    def __init__(self, model, state_actions, discountRatio, n_workers=None):
+        """
+        Params:
+        model - MDP object, must be picklable if processes are spawned instead of forked.
+        state_actions - dict: state => iterable of actions available in that state.
+        discountRatio - discount ratio for returns.
+        n_workers - number of worker processes, default os.cpu_count().
+        """
+        self.states, self.actions, self.mask = MDP.enumerate(state_actions)
+        n_workers = n_workers or mp.cpu_count()
+        n_workers = max(1, min(n_workers, len(self.states)))
+        S, A = len(self.states), len(self.actions)
+
+        self._V_raw = mp.RawArray('d', 2 * S)
+        self._pi_raw = mp.RawArray('d', S * A)
+        self._diffs_raw = mp.RawArray('d', n_workers)
+        self._stable_raw = mp.RawArray('b', n_workers)
+        self._cmd = mp.RawValue('i', STOP)
+        self._src = mp.RawValue('i', 0)
+        self._barrier = mp.Barrier(n_workers + 1)
+
+        self.V = np.frombuffer(self._V_raw).reshape(2, S)
+        self.pi = np.frombuffer(self._pi_raw).reshape(S, A)
+        self.diffs = np.frombuffer(self._diffs_raw)
+        self.stable = np.frombuffer(self._stable_raw, dtype=np.int8)
+
+        bounds = np.linspace(0, S, n_workers + 1).astype(int)
+        self.workers = []
+        for rank in range(n_workers):
+            lo, hi = bounds[rank], bounds[rank + 1]
+            slice_actions = dict((state, list(state_actions[state])) for state in self.states[lo:hi])
+            worker = mp.Process(target=_worker, daemon=True,
+                                args=(rank, model, self.states, self.actions, slice_actions, lo, hi,
+                                      discountRatio, self._V_raw, self._pi_raw, self._diffs_raw,
+                                      self._stable_raw, self._cmd, self._src, self._barrier))
+            worker.start()
+            self.workers.append(worker)
+
+    @property
+    def n_workers(self):
+        return len(self.workers)
+
+    def load(self, V, pi=None):
+        """ copy V (n_states, ) and pi (n_states, n_actions) into shared memory.
+        """
+        self.V[self._src.value] = V
+        if pi is not None:
+            self.pi[:] = pi
+
+    def values(self):
+        return self.V[self._src.value].copy()
+
+    def policy(self):
+        return self.pi.copy()
+
+    def sweep(self, greedy=False):
+        """ one synchronous sweep over all states, returns the max diff.
+        Params:
+        greedy - back up max over actions (value iteration) instead of the policy expectation.
+        """
+        self._run(GREEDY_EVAL if greedy else EVAL)
+        self._src.value = 1 - self._src.value
+        return self.diffs.max()
+
+    def improve(self):
+        """ greedy one-hot policy w.r.t. the current V, returns True if the policy is stable.
+        """
+        self._run(IMPROVE)
+        return bool(self.stable.all())
+
+    def close(self):
+        if not self.workers:
+            return
+        try:
+            self._run(STOP, wait=False)
+        except RuntimeError:
+            # the barrier is broken, the workers cannot be stopped by a command
+            for worker in self.workers:
+                worker.terminate()
+        finally:
+            for worker in self.workers:
+                worker.join()
+            self.workers = []
+
+    def _run(self, cmd, wait=True):
+        self._cmd.value = cmd
+        try:
+            self._barrier.wait()
+            if wait:
+                self._barrier.wait()
+        except BrokenBarrierError:
+            raise RuntimeError('a parallel DP worker failed, see its traceback above')
+
+
+def _worker(rank, model, states, actions, state_actions, lo, hi, discountRatio,
+            V_raw, pi_raw, diffs_raw, stable_raw, cmd, src, barrier):
+    try:
+        state_index = dict((state, s) for s, state in enumerate(states))
+        n, A = hi - lo, len(actions)
+        # build the slice of the model once
+        indptr, indices, data, R = model.compile_rows(states[lo:hi], actions, state_actions, state_index)
+        rows = np.repeat(np.arange(n * A), np.diff(indptr))
+        mask = np.zeros((n, A), dtype=bool)
+        action_index = dict((action, a) for a, action in enumerate(actions))
+        for s, state in enumerate(states[lo:hi]):
+            for action in state_actions[state]:
+                mask[s, action_index[action]] = True
+
+        V = np.frombuffer(V_raw).reshape(2, len(states))
+        pi = np.frombuffer(pi_raw).reshape(len(states), A)
+        diffs = np.frombuffer(diffs_raw)
+        stable = np.frombuffer(stable_raw, dtype=np.int8)
+
+        while True:
+            barrier.wait()
+            if cmd.value == STOP:
+                return
+            Vsrc = V[src.value]
+            ev = np.bincount(rows, weights=data * Vsrc[indices], minlength=n * A).reshape(n, A)
+            Q = R + discountRatio * ev
+            if cmd.value == IMPROVE:
+                Q[~mask] = -np.inf
+                newPi = utilis.one_hot_argmax(Q, keep=pi[lo:hi].argmax(axis=1))
+                stable[rank] = np.array_equal(newPi, pi[lo:hi])
+                pi[lo:hi] = newPi
+            else:
+                if cmd.value == GREEDY_EVAL:
+                    Q[~mask] = -np.inf
+                    newV = Q.max(axis=1)
+                else:
+                    newV = (pi[lo:hi] * Q).sum(axis=1)
+                diffs[rank] = np.abs(newV - Vsrc[lo:hi]).max() if n else 0
+                V[1 - src.value, lo:hi] = newV
+            barrier.wait()
+    except BaseException:
+        barrier.abort()
+        raise
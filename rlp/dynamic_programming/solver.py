@@ -1,89 +1,443 @@
 from rlp import utilis
 from .base import JackCarRentalAgent, JackCarRentalEnv, DPGridWorldAgent, DPGridWorldEnv
+from .parallel import ParallelSweeper
 import numpy as np
+from collections import deque
+import heapq
+import time
 
 
 class DynamicProgrammingSolver:
     """ dp solver API.
     """
 
-    def __init__(self, agent, model, threshold=1e-3):
+    BACKENDS = ('dict', 'numpy', 'gauss_seidel', 'prioritized', 'parallel')
+
+    def __init__(self, agent, model, threshold=1e-3, backend='dict', n_workers=None):
         """
         Params:
         agent - DynamicProgrammingAgent object.
         model - DynamicProgrammingEnvModel object.
         threshold - threshold for loop termination.
-        seed - random seed.
+        backend - 'dict' updates agent.V and agent.policy state by state in place,
+            'numpy' keeps V as a (n_states, ) array and the policy as a (n_states, n_actions)
+            matrix, runs synchronous sweeps as matrix-vector products
+            and writes the result back to the agent.
+            'gauss_seidel' and 'prioritized' are asynchronous array backends,
+            'gauss_seidel' updates V in place ordered by distance to the absorbing states,
+            'prioritized' only backs up states whose Bellman error bound is above threshold,
+            popped from a priority queue fed by the predecessor index of the model.
+            'parallel' runs the synchronous sweeps of 'numpy' on a pool of worker processes,
+            each building its slice of the model with prob_next_state_n_reward.
+            Call close() to stop the workers.
+        n_workers - number of worker processes of the 'parallel' backend, default os.cpu_count().
         """
+        assert backend in DynamicProgrammingSolver.BACKENDS, 'invalid backend %s' % backend
         self.agent = agent
         self.model = model
         self.threshold = threshold
+        self.backend = backend
+        self.n_workers = n_workers
+        self.backups = 0  # number of state backups done so far
+        self._compiled = None
+        self._sweep_order = None
+        self._sweeper = None
 
-    def policy_eval(self, onestep=False):
+    def policy_eval(self, onestep=False, max_sweeps=None):
         """ DP policy evaluation. see page 74.
         Params:
         onestep - run evalution until converge or just run onestep, if True, only run one-step
+        max_sweeps - stop after at most max_sweeps sweeps, default None (until converge).
+
+        Returns:
+        number of sweeps over the state set.
+        """
+        if onestep:
+            max_sweeps = 1
+        if self.backend != 'dict':
+            V, sweeps, _ = self._policy_eval_arrays(self._load_values(), self._load_policy(), max_sweeps)
+            self._store_values(V)
+            return sweeps
+
+        sweeps, _ = self._policy_eval_dict(max_sweeps)
+        return sweeps
+
+    def _policy_eval_dict(self, max_sweeps=None):
+        """ in-place policy evaluation on agent.V, returns (sweeps, last max diff).
         """
+        model = self.compiled_model()
+        sweeps = 0
         while True:
             diff = 0
             for state in self.agent.policy:
                 oldV = self.agent.V[state]
                 # \sum \pi(a|s) \sum_{s', r} p(s', r| s, a)[r + \gamma V(s')]
-                newV = sum(utilis.element_wise_product(self._expectation_by_action(state), self.agent.policy[state]).values())
+                newV = sum(utilis.element_wise_product(self._expectation_by_action(state, model),
+                                                       self.agent.policy[state]).values())
                 self.agent.V[state] = newV
                 diff = max(diff, abs(oldV - newV))
-            if diff < self.threshold or onestep:
-                break
+            sweeps += 1
+            self.backups += len(self.agent.policy)
+            if diff < self.threshold or sweeps == max_sweeps:
+                return sweeps, diff
 
-    def _expectation_by_action(self, state):
+    def _expectation_by_action(self, state, model):
         """ helper function to compute the expecation by action in DP update.
         i.e.
             \\pi(a|s) \\sum_{s', r} p(s', r| s, a)[r + \\gamma V(s')]
+        Params:
+        state - state to back up.
+        model - CompiledMDP of compiled_model(), fetched once per sweep by the caller.
         """
+        s = model.state_index[state]
         ret = {}
         for action in self.agent.policy[state]:
-            # p(s', r| s, a)
-            probs_on_nextState_reward = self.model.prob_next_state_n_reward(state, action)
-            s = 0
-            for (nextState, reward), p in probs_on_nextState_reward.items():
-                s += (reward + self.agent.discountRatio * self.agent.V[nextState]) * p
-            ret[action] = s
+            a = model.action_index[action]
+            # p(s'| s, a), rewards are already folded into R
+            next_states, probs = model.transitions(s, a)
+            ev = 0
+            for j, p in zip(next_states, probs):
+                ev += p * self.agent.V[model.states[j]]
+            ret[action] = float(model.R[s, a] + self.agent.discountRatio * ev)
         return ret
 
+    def compiled_model(self):
+        """ the tabular model compiled from self.model, see MDP.compile.
+        Held by the solver and compiled again only if the model params change
+        or the agent gets another policy dict, which keeps a lookup O(1) in the number of states.
+        """
+        params, policy = self.model.model_params(), self.agent.policy
+        if self._compiled is None or self._compiled[0] != params or self._compiled[1] is not policy:
+            self._compiled = params, policy, self.model.compile(policy)
+        return self._compiled[2]
+
+    def parallel_sweeper(self):
+        """ the worker pool of the 'parallel' backend, started on first use
+        and restarted if the model params or the discount ratio change.
+        """
+        key = self.model.model_params(), self.agent.discountRatio
+        if self._sweeper is not None and self._sweeper[0] != key:
+            self.close()
+        if self._sweeper is None:
+            self._sweeper = key, ParallelSweeper(self.model, self.agent.policy, self.agent.discountRatio,
+                                                 self.n_workers)
+        return self._sweeper[1]
+
+    def close(self):
+        """ stop the worker processes of the 'parallel' backend.
+        """
+        if self._sweeper is not None:
+            self._sweeper[1].close()
+            self._sweeper = None
+
+    def _index(self):
+        """ states and actions in the order of the array backends.
+        """
+        if self.backend == 'parallel':
+            sweeper = self.parallel_sweeper()
+            return sweeper.states, dict((action, a) for a, action in enumerate(sweeper.actions))
+        model = self.compiled_model()
+        return model.states, model.action_index
+
     def policy_improve(self):
         """ DP policy improvement. see page 76.
+
+        Returns:
+        True if the policy is stable, i.e. not changed by the improvement.
         """
+        if self.backend != 'dict':
+            pi, stable = self._policy_improve_arrays(self._load_values(), self._load_policy())
+            self._store_policy(pi)
+            return stable
+
+        return self._policy_improve_dict()
+
+    def _policy_improve_dict(self):
+        model = self.compiled_model()
+        stable = True
         for state in self.agent.policy:
-            max_a = utilis.argmax(self._expectation_by_action(state))
+            max_a = utilis.argmax(self._expectation_by_action(state, model))
+            # keep the current action among ties, so that policy iteration does not flip between them
+            current = [action for action, prob in self.agent.policy[state].items() if prob == 1]
+            best = current[0] if current and current[0] in max_a else max_a[0]
+            for action in self.agent.policy[state]:
+                prob = 1 if action == best else 0
+                if self.agent.policy[state][action] != prob:
+                    stable = False
+                self.agent.policy[state][action] = prob
+        return stable
+
+    def policy_iteration(self, max_iterations=None):
+        """ Policy iteration, see page 80.
+        Alternate full policy evaluation and policy improvement until the policy is stable.
+        Params:
+        max_iterations - max number of improvement steps, default None (until stable).
+
+        Returns:
+        dict with 'iterations' (improvement steps), 'sweeps' (evaluation sweeps),
+        'backups' (state backups) and 'wall_time' (seconds).
+        For the 'prioritized' backend sweeps are counted as backups / n_states, rounded up.
+        """
+        return self._iterate(None, max_iterations)
+
+    def modified_policy_iteration(self, k, max_iterations=None):
+        """ Modified policy iteration, only k evaluation sweeps between two improvements.
+        Stop when the policy is stable and the last sweep changes V by less than threshold.
+        Params:
+        k - number of evaluation sweeps per iteration.
+        max_iterations - max number of improvement steps, default None (until converge).
+
+        Returns:
+        same as policy_iteration.
+        """
+        assert k >= 1
+        return self._iterate(k, max_iterations)
+
+    def _iterate(self, max_sweeps, max_iterations):
+        start, backups = time.perf_counter(), self.backups
+        iterations = sweeps = 0
+        if self.backend != 'dict':
+            V, pi = self._load_values(), self._load_policy()
+
+        while max_iterations is None or iterations < max_iterations:
+            if self.backend != 'dict':
+                V, n_sweeps, diff = self._policy_eval_arrays(V, pi, max_sweeps)
+                pi, stable = self._policy_improve_arrays(V, pi)
+            else:
+                n_sweeps, diff = self._policy_eval_dict(max_sweeps)
+                stable = self._policy_improve_dict()
+            sweeps += n_sweeps
+            iterations += 1
+            if stable and diff < self.threshold:
+                break
+
+        if self.backend != 'dict':
+            self._store_values(V)
+            self._store_policy(pi)
+        return self._stats(iterations, sweeps, backups, start)
+
+    def _stats(self, iterations, sweeps, backups, start):
+        return {'iterations': iterations, 'sweeps': sweeps, 'backups': self.backups - backups,
+                'wall_time': time.perf_counter() - start}
+
+    def value_iteration(self, max_sweeps=None):
+        """ Value iteration, see page 83.
+        Sweep V(s) <- max_a \\sum_{s', r} p(s', r| s, a)[r + \\gamma V(s')] until converge,
+        then output the greedy policy.
+        Params:
+        max_sweeps - max number of sweeps, default None (until converge).
+
+        Returns:
+        same as policy_iteration, each sweep counts as one iteration.
+        """
+        start, backups = time.perf_counter(), self.backups
+        if self.backend != 'dict':
+            V, sweeps, _ = self._policy_eval_arrays(self._load_values(), None, max_sweeps)
+            pi, _ = self._policy_improve_arrays(V, self._load_policy())
+            self._store_values(V)
+            self._store_policy(pi)
+        else:
+            model = self.compiled_model()
+            sweeps = 0
+            while True:
+                diff = 0
+                for state in self.agent.policy:
+                    oldV = self.agent.V[state]
+                    newV = max(self._expectation_by_action(state, model).values())
+                    self.agent.V[state] = newV
+                    diff = max(diff, abs(oldV - newV))
+                sweeps += 1
+                self.backups += len(self.agent.policy)
+                if diff < self.threshold or sweeps == max_sweeps:
+                    break
+            self._policy_improve_dict()
+        return self._stats(sweeps, sweeps, backups, start)
+
+    def _policy_eval_arrays(self, V, pi, max_sweeps=None):
+        """ policy evaluation on arrays with the array backend, returns (V, sweeps, last max diff).
+        If pi is None, back up the max over actions instead, i.e. value iteration.
+        """
+        if self.backend == 'gauss_seidel':
+            return self._gauss_seidel_eval(V, pi, max_sweeps)
+        if self.backend == 'prioritized':
+            return self._prioritized_eval(V, pi, max_sweeps)
+        if self.backend == 'parallel':
+            return self._parallel_eval(V, pi, max_sweeps)
+
+        sweeps = 0
+        while True:
+            newV = self._backup_all(V, pi)
+            diff = np.abs(newV - V).max() if len(V) else 0
+            V = newV
+            sweeps += 1
+            if diff < self.threshold or sweeps == max_sweeps:
+                return V, sweeps, diff
+
+    def _backup_all(self, V, pi):
+        """ synchronous backup of all states at once.
+        """
+        model = self.compiled_model()
+        self.backups += model.n_states
+        Q = model.q_values(V, self.agent.discountRatio)
+        if pi is None:
+            Q[~model.mask] = -np.inf
+            return Q.max(axis=1)
+        # \sum_a \pi(a|s) q(s, a)
+        return (pi * Q).sum(axis=1)
+
+    def _backup(self, model, s, V, pi):
+        """ backup of a single state index s, O(out-degree of s) given the CompiledMDP model.
+        """
+        self.backups += 1
+        q = model.state_q_values(s, V, self.agent.discountRatio)
+        if pi is None:
+            return q[model.mask[s]].max()
+        return pi[s] @ q
+
+    def sweep_order(self):
+        """ state indices in the order of Gauss-Seidel sweeps, built once per compiled model.
+        Breadth first from the absorbing states along the predecessor index,
+        so that a sweep backs up a state after the states it leads to.
+        States which cannot reach an absorbing state follow in index order.
+        """
+        model = self.compiled_model()
+        if self._sweep_order is None or self._sweep_order[0] is not model:
+            pred_indptr, pred_indices, _ = model.predecessors()
+            seen = model.absorbing_states()
+            queue = deque(np.flatnonzero(seen).tolist())
+            order = []
+            while queue:
+                j = queue.popleft()
+                order.append(j)
+                for s in pred_indices[pred_indptr[j]:pred_indptr[j + 1]].tolist():
+                    if not seen[s]:
+                        seen[s] = True
+                        queue.append(s)
+            order.extend(np.flatnonzero(~seen).tolist())
+            self._sweep_order = model, order
+        return self._sweep_order[1]
+
+    def _gauss_seidel_eval(self, V, pi, max_sweeps=None):
+        model = self.compiled_model()
+        V = V.copy()
+        order = self.sweep_order()
+        sweeps = 0
+        while True:
+            diff = 0
+            for s in order:
+                newV = self._backup(model, s, V, pi)
+                diff = max(diff, abs(newV - V[s]))
+                V[s] = newV
+            sweeps += 1
+            if diff < self.threshold or sweeps == max_sweeps:
+                return V, sweeps, diff
+
+    def _prioritized_eval(self, V, pi, max_sweeps=None):
+        """ prioritized sweeping, priority of a state is an upper bound of its Bellman error.
+        After backing up s by delta, the bound of each predecessor p grows by
+        \\gamma max_a p(s| p, a) |delta|.
+        """
+        model = self.compiled_model()
+        pred_indptr, pred_indices, pred_probs = model.predecessors()
+        V = V.copy()
+        priority = np.abs(self._backup_all(V, pi) - V)
+        heap = [(-p, s) for s, p in enumerate(priority.tolist()) if p >= self.threshold]
+        heapq.heapify(heap)
+
+        max_backups = None if max_sweeps is None else max_sweeps * model.n_states
+        backups = 0
+        while heap and backups != max_backups:
+            p, s = heapq.heappop(heap)
+            if -p != priority[s]:
+                # stale entry, s was pushed again with a larger priority
+                continue
+            newV = self._backup(model, s, V, pi)
+            delta = abs(newV - V[s])
+            V[s] = newV
+            priority[s] = 0
+            backups += 1
+            lo, hi = pred_indptr[s], pred_indptr[s + 1]
+            for j, prob in zip(pred_indices[lo:hi].tolist(), pred_probs[lo:hi].tolist()):
+                priority[j] += self.agent.discountRatio * prob * delta
+                if priority[j] >= self.threshold:
+                    heapq.heappush(heap, (-priority[j], j))
+
+        sweeps = -(-backups // model.n_states) if model.n_states else 0
+        return V, sweeps, priority.max() if len(priority) else 0
+
+    def _parallel_eval(self, V, pi, max_sweeps=None):
+        sweeper = self.parallel_sweeper()
+        sweeper.load(V, pi)
+        sweeps = 0
+        while True:
+            diff = sweeper.sweep(greedy=pi is None)
+            self.backups += len(V)
+            sweeps += 1
+            if diff < self.threshold or sweeps == max_sweeps:
+                return sweeper.values(), sweeps, diff
+
+    def _policy_improve_arrays(self, V, pi):
+        """ greedy policy w.r.t. V as a one-hot (n_states, n_actions) matrix,
+        returns (new policy, stable).
+        """
+        if self.backend == 'parallel':
+            sweeper = self.parallel_sweeper()
+            sweeper.load(V, pi)
+            stable = sweeper.improve()
+            return sweeper.policy(), stable
+
+        model = self.compiled_model()
+        Q = model.q_values(V, self.agent.discountRatio)
+        Q[~model.mask] = -np.inf
+        newPi = utilis.one_hot_argmax(Q, keep=pi.argmax(axis=1))
+        return newPi, np.array_equal(newPi, pi)
+
+    def _load_values(self):
+        states, _ = self._index()
+        return np.array([self.agent.V[state] for state in states], dtype=float)
+
+    def _load_policy(self):
+        states, action_index = self._index()
+        pi = np.zeros((len(states), len(action_index)))
+        for s, state in enumerate(states):
+            for action, p in self.agent.policy[state].items():
+                pi[s, action_index[action]] = p
+        return pi
+
+    def _store_values(self, V):
+        states, _ = self._index()
+        for state, v in zip(states, V.tolist()):
+            self.agent.V[state] = v
+
+    def _store_policy(self, pi):
+        states, action_index = self._index()
+        for s, state in enumerate(states):
             for action in self.agent.policy[state]:
-                if action == max_a[0]:
-                    self.agent.policy[state][action] = 1
-                else:
-                    self.agent.policy[state][action] = 0
+                self.agent.policy[state][action] = int(pi[s, action_index[action]])
 
 
 class DPGridWorldSolver(DynamicProgrammingSolver):
     """Dynamic programming GridWorld Solver. see page 76.
     """
 
-    def __init__(self, agent, model, threshold=1e-3):
+    def __init__(self, agent, model, threshold=1e-3, backend='dict', n_workers=None):
         """
         Params:
         agent - Gridworld Agent object.
         model - Gridworld env object.
         threshold - threshold for loop termination.
-        seed - random seed.
+        backend, n_workers - see DynamicProgrammingSolver.
         """
         assert isinstance(agent, DPGridWorldAgent)
         assert isinstance(model, DPGridWorldEnv)
-        super(DPGridWorldSolver, self).__init__(agent, model, threshold)
+        super(DPGridWorldSolver, self).__init__(agent, model, threshold, backend, n_workers)
 
 
 class JackCarRentalSolver(DynamicProgrammingSolver):
     """ DP sovler for Jack's Car Rental Problem in page-81.
     """
 
-    def __init__(self, agent, model, threshold=1e-3):
+    def __init__(self, agent, model, threshold=1e-3, backend='dict', n_workers=None):
         assert isinstance(agent, JackCarRentalAgent)
         assert isinstance(model, JackCarRentalEnv)
-        super(JackCarRentalSolver, self).__init__(agent, model, threshold)
+        super(JackCarRentalSolver, self).__init__(agent, model, threshold, backend, n_workers)
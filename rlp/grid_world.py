@@ -1,4 +1,5 @@
 from .base import BaseEnvironment, BaseAgent
+import numpy as np
 """
 This module provides basic API for the simple gridworld example.
 """
@@ -29,6 +30,44 @@ class GridWorld(BaseEnvironment):
         self.length = length
         self.terminal_states = terminals
         super(GridWorld, self).__init__(seed)
+        self._init_tables()
+
+    def _init_tables(self):
+        """ flatten state (y, x) to y * length + x and precompute
+        next_state_table - int array (n_states, 4), next flat state of each action, terminals stay.
+        reward_table - int array (n_states, 4), reward of each transition.
+        terminal_mask - bool array (n_states, ), True for terminal states.
+        """
+        self._table_params = self.width, self.length, tuple(self.terminal_states)
+        self.n_states = self.width * self.length
+        self.terminal_mask = np.zeros(self.n_states, dtype=bool)
+        for state in self.terminal_states:
+            self.terminal_mask[self.encode(state)] = True
+
+        y, x = np.divmod(np.arange(self.n_states), self.length)
+        self.next_state_table = np.empty((self.n_states, len(ACTIONS)), dtype=np.int64)
+        for action in ACTIONS:
+            dy, dx = OFFSET[action]
+            y_ = np.clip(y + dy, 0, self.width - 1)
+            x_ = np.clip(x + dx, 0, self.length - 1)
+            self.next_state_table[:, action] = y_ * self.length + x_
+        self.next_state_table[self.terminal_mask] = np.flatnonzero(self.terminal_mask)[:, None]
+
+        self.reward_table = np.where(self.terminal_mask[self.next_state_table], 0, -1)
+
+    def encode(self, state):
+        """ flat index of state (y, x).
+        """
+        y, x = state
+        assert y >= 0 and y < self.width
+        assert x >= 0 and x < self.length
+        return y * self.length + x
+
+    def decode(self, s):
+        """ state (y, x) of flat index s.
+        """
+        y, x = divmod(int(s), self.length)
+        return y, x
 
     def step(self, state, action):
         """Params:
@@ -38,24 +77,30 @@ class GridWorld(BaseEnvironment):
         Return:
         reward, new_state, status
         """
-        if state in self.terminal_states:
+        s = self.encode(state)
+        if self.terminal_mask[s]:
             return 0, state, TERMINAL
 
-        y, x = state
-        assert y >= 0 and y < self.width
-        assert x >= 0 and x < self.length
+        s_ = self.next_state_table[s, action]
+        return int(self.reward_table[s, action]), self.decode(s_), int(self.terminal_mask[s_])
 
-        reward = -1
-        dy, dx = OFFSET[action]
-        y_, x_ = y + dy, x + dx
-        new_state = GridWorld.clip_range(y_, 0, self.width - 1),\
-            GridWorld.clip_range(x_, 0, self.length - 1)
-
-        status = int(new_state in self.terminal_states)
-        if status:
-            reward = 0
+    def reset(self):
+        """ start an episode in a uniformly random non-terminal state.
+        """
+        starts = np.flatnonzero(~self.terminal_mask)
+        return self.decode(starts[self.random_state.randint(len(starts))])
 
-        return reward, new_state, status
+    def step_batch(self, states, actions):
+        """ step many (state, action) pairs at once.
+        Params:
+        states - int array, flat states.
+        actions - int array, same shape as states.
+        =====================
+        Return:
+        rewards, new_states, status - arrays with the shape of states.
+        """
+        new_states = self.next_state_table[states, actions]
+        return self.reward_table[states, actions], new_states, self.terminal_mask[new_states].astype(int)
 
     @staticmethod
     def clip_range(x, low_bnd, up_bnd):
@@ -68,8 +113,7 @@ class GridWorld(BaseEnvironment):
         return min(max(x, low_bnd), up_bnd)
 
     def __repr__(self):
-        return 'GridWorld-Environment (%d, %d)\n\t start (%d, %d),\
-                     end (%d, %d)' % (self.width, self.length)
+        return 'GridWorld-Environment (%d, %d), terminals %s' % (self.width, self.length, self.terminal_states)
 
 
 class GridWorldAgent(BaseAgent):
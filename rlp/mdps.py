@@ -1,5 +1,6 @@
 from .base import BaseEnvironment
 from abc import abstractmethod
+import numpy as np
 
 
 class MDP(BaseEnvironment):
@@ -21,3 +22,206 @@ class MDP(BaseEnvironment):
         dict: (next_state, reward) => prob, type: tuple => float
         """
         raise NotImplementedError
+
+    def model_params(self):
+        """ hashable parameters the dynamics depend on, e.g. rates or sizes, part of the compile cache key.
+        """
+        return ()
+
+    def compile(self, state_actions):
+        """ Enumerate states and actions once and cache the model as a CompiledMDP.
+        The result is cached on the model, calling it again with the same
+        states, actions and model_params returns the cached object.
+        Params:
+        state_actions - dict: state => iterable of actions available in that state,
+            e.g. the policy dict of a DP agent.
+
+        Returns:
+        CompiledMDP object.
+        """
+        key = (self.model_params(), tuple((state, tuple(actions)) for state, actions in state_actions.items()))
+        cached = getattr(self, '_compiled', None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        compiled = self._compile(state_actions)
+        self._compiled = (key, compiled)
+        return compiled
+
+    @staticmethod
+    def enumerate(state_actions):
+        """ map states and actions to integer indices.
+        States keep the order of state_actions, actions the order of first appearance.
+
+        Returns:
+        states - list of states.
+        actions - list of actions.
+        mask - bool array (n_states, n_actions), True if action is available in state.
+        """
+        states = list(state_actions)
+        actions, action_index = [], {}
+        for state in states:
+            for action in state_actions[state]:
+                if action not in action_index:
+                    action_index[action] = len(actions)
+                    actions.append(action)
+
+        mask = np.zeros((len(states), len(actions)), dtype=bool)
+        for s, state in enumerate(states):
+            for action in state_actions[state]:
+                mask[s, action_index[action]] = True
+        return states, actions, mask
+
+    def _compile(self, state_actions):
+        """ Build the CompiledMDP by calling prob_next_state_n_reward
+        once for every (state, action) pair.
+        """
+        states, actions, mask = MDP.enumerate(state_actions)
+        indptr, indices, data, R = self.compile_rows(states, actions, state_actions)
+        return CompiledMDP(states, actions, mask, indptr, indices, data, R)
+
+    def compile_rows(self, states, actions, state_actions, state_index=None):
+        """ CSR transition arrays and expected rewards of the given states only,
+        the row of pair (s, a) is r = s * len(actions) + a with s the position in states.
+        Params:
+        states - list of states to compile.
+        actions - list of all actions.
+        state_actions - dict: state => iterable of actions available in that state.
+        state_index - dict: state => index used for next states, default the position in states.
+
+        Returns:
+        indptr, indices, data, R
+        """
+        if state_index is None:
+            state_index = dict((state, s) for s, state in enumerate(states))
+        action_index = dict((action, a) for a, action in enumerate(actions))
+
+        n_states, n_actions = len(states), len(actions)
+        R = np.zeros((n_states, n_actions))
+        rows, indices, data = [], [], []
+        for s, state in enumerate(states):
+            for action in state_actions[state]:
+                a = action_index[action]
+                # merge the entries sharing the same next state, rewards go to R
+                next_probs = {}
+                for (nextState, reward), p in self.prob_next_state_n_reward(state, action).items():
+                    j = state_index[nextState]
+                    next_probs[j] = next_probs.get(j, 0) + p
+                    R[s, a] += p * reward
+                rows.extend([s * n_actions + a] * len(next_probs))
+                indices.extend(next_probs.keys())
+                data.extend(next_probs.values())
+
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(n_states * n_actions + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_states * n_actions), out=indptr[1:])
+        indices = np.asarray(indices, dtype=np.int64)[order]
+        data = np.asarray(data, dtype=float)[order]
+        return indptr, indices, data, R
+
+
+class CompiledMDP:
+    """ Tabular MDP model with states and actions mapped to integer indices.
+    Transitions are stored CSR-style, the row of pair (s, a) is r = s * n_actions + a,
+    its next states are indices[indptr[r]:indptr[r + 1]] with probs data[indptr[r]:indptr[r + 1]].
+    R[s, a] holds the expected reward \\sum_{s', r} p(s', r| s, a) r.
+    """
+
+    def __init__(self, states, actions, mask, indptr, indices, data, R):
+        """
+        Params:
+        states - list of states, position in the list is the state index.
+        actions - list of actions, position in the list is the action index.
+        mask - bool array (n_states, n_actions), True if action is available in state.
+        indptr, indices, data - CSR arrays of the transition tensor,
+            None for subclasses which compute transitions from a structured form.
+        R - float array (n_states, n_actions), expected rewards.
+        """
+        self.states = states
+        self.actions = actions
+        self.state_index = dict((state, s) for s, state in enumerate(states))
+        self.action_index = dict((action, a) for a, action in enumerate(actions))
+        self.mask = mask
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.R = R
+        # row id of each stored entry, used to reduce the rows in one call
+        self._rows = None if indptr is None else np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+    @property
+    def n_states(self):
+        return len(self.states)
+
+    @property
+    def n_actions(self):
+        return len(self.actions)
+
+    def transitions(self, s, a):
+        """ next state indices and their probs for state index s and action index a.
+        """
+        row = s * self.n_actions + a
+        lo, hi = self.indptr[row], self.indptr[row + 1]
+        return self.indices[lo:hi], self.data[lo:hi]
+
+    def expected_next_values(self, V):
+        """ \\sum_{s'} p(s'| s, a) V(s') for all pairs.
+        Params:
+        V - float array (n_states, ), state values.
+
+        Returns:
+        float array (n_states, n_actions)
+        """
+        ev = np.bincount(self._rows, weights=self.data * V[self.indices],
+                         minlength=self.n_states * self.n_actions)
+        return ev.reshape(self.n_states, self.n_actions)
+
+    def q_values(self, V, discountRatio):
+        """ \\sum_{s', r} p(s', r| s, a)[r + \\gamma V(s')] for all pairs,
+        entries of unavailable actions are meaningless.
+        """
+        return self.R + discountRatio * self.expected_next_values(V)
+
+    def state_q_values(self, s, V, discountRatio):
+        """ q_values of a single state index s, float array (n_actions, ).
+        """
+        A = self.n_actions
+        lo, hi = self.indptr[s * A], self.indptr[(s + 1) * A]
+        ev = np.bincount(self._rows[lo:hi] - s * A, weights=self.data[lo:hi] * V[self.indices[lo:hi]],
+                         minlength=A)
+        return self.R[s] + discountRatio * ev
+
+    def predecessors(self):
+        """ predecessor index in CSR form, built once and cached.
+        Predecessors of state index j are pred_indices[pred_indptr[j]:pred_indptr[j + 1]],
+        pred_probs holds max_a p(j| s, a) for each predecessor s.
+
+        Returns:
+        pred_indptr, pred_indices, pred_probs
+        """
+        if getattr(self, '_predecessors', None) is None:
+            nonzero = self.data > 0
+            src = self._rows[nonzero] // self.n_actions
+            dst = self.indices[nonzero]
+            probs = self.data[nonzero]
+            order = np.lexsort((src, dst))
+            src, dst, probs = src[order], dst[order], probs[order]
+            # merge the entries of the same (dst, src) pair from different actions
+            starts = np.flatnonzero(np.r_[True, (dst[1:] != dst[:-1]) | (src[1:] != src[:-1])])
+            pred_probs = np.maximum.reduceat(probs, starts) if len(starts) else probs
+            src, dst = src[starts], dst[starts]
+            pred_indptr = np.zeros(self.n_states + 1, dtype=np.int64)
+            np.cumsum(np.bincount(dst, minlength=self.n_states), out=pred_indptr[1:])
+            self._predecessors = pred_indptr, src, pred_probs
+        return self._predecessors
+
+    def absorbing_states(self):
+        """ bool array (n_states, ), True if every available action loops back to the state itself.
+        """
+        S, A = self.n_states, self.n_actions
+        nnz = np.diff(self.indptr)
+        first = np.full(S * A, -1, dtype=np.int64)
+        first[nnz > 0] = self.indices[self.indptr[:-1][nnz > 0]]
+        self_loop = (nnz == 1) & (first == np.arange(S * A) // A)
+        return (self_loop.reshape(S, A) | ~self.mask).all(axis=1)
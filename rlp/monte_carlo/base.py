@@ -1,5 +1,5 @@
 from rlp.base import BaseEnvironment, BaseAgent
-from collections import defaultdict
+from collections.abc import Mapping
 from itertools import product
 import numpy as np
 from rlp import utilis
@@ -11,6 +11,9 @@ CARD_PROBS = [1 / 13] * 9 + [1 / 13 * 4]
 HIT, STICK = 0, 1
 ACTIONS = [HIT, STICK]
 IN_PROGRESS, TERMINAL = 0, 1
+# states the agent acts in: (usable_ace, player_sum, dealer_show)
+STATES = list(product((0, 1), range(12, 22), DECK))
+STATE_SHAPE = (2, 10, 10)
 
 
 def get_card(uniform=False):
@@ -22,6 +25,101 @@ def get_card(uniform=False):
     return ret
 
 
+def encode_state(state):
+    """ map a state (usable_ace, player_sum, dealer_show) to its index in arrays of STATE_SHAPE,
+    i.e. (usable_ace, player_sum - 12, dealer_show - 1), where 'A' counts as 1.
+    Raise KeyError for states out of the table, e.g. player_sum < 12.
+    """
+    usable_ace, player_sum, dealer_show = state
+    dealer = 0 if dealer_show == 'A' else dealer_show - 1
+    if usable_ace not in (0, 1) or not 12 <= player_sum <= 21 or not 0 <= dealer <= 9:
+        raise KeyError(state)
+    return int(usable_ace), player_sum - 12, dealer
+
+
+def decode_state(index):
+    """ inverse of encode_state.
+    """
+    usable_ace, player, dealer = index
+    return usable_ace, player + 12, DECK[dealer]
+
+
+def threshold_policy(stick_sum=20):
+    """ deterministic policy which sticks on player sums >= stick_sum and hits otherwise,
+    array STATE_SHAPE + (2, ) of action probabilities.
+    """
+    policy = np.zeros(STATE_SHAPE + (len(ACTIONS), ))
+    policy[:, :stick_sum - 12, :, HIT] = 1
+    policy[:, stick_sum - 12:, :, STICK] = 1
+    return policy
+
+
+class ActionRow(Mapping):
+    """ dict-style view over the action row of one state, action => value,
+    row[action] reads and writes array[action], e.g. row[action] += x writes through.
+    """
+
+    def __init__(self, array):
+        self.array = array
+
+    def __getitem__(self, action):
+        if action not in ACTIONS:
+            raise KeyError(action)
+        return self.array[action]
+
+    def __setitem__(self, action, value):
+        if action not in ACTIONS:
+            raise KeyError(action)
+        self.array[action] = value
+
+    def __iter__(self):
+        return iter(ACTIONS)
+
+    def __len__(self):
+        return len(ACTIONS)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.array, dtype=dtype)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class StateTable(Mapping):
+    """ dict-style view over an array whose leading axes are STATE_SHAPE,
+    table[state] reads and writes array[encode_state(state)].
+    For Q or policy arrays of shape STATE_SHAPE + (2, ), table[state] is the ActionRow
+    of the state, a dict of action => value as before, so table[state][action] += x writes through.
+    """
+
+    def __init__(self, array):
+        assert array.shape[:3] == STATE_SHAPE
+        self.array = array
+
+    def __getitem__(self, state):
+        if self.array.ndim == len(STATE_SHAPE):
+            return self.array[encode_state(state)]
+        return ActionRow(self.array[encode_state(state)])
+
+    def __setitem__(self, state, value):
+        if isinstance(value, Mapping):
+            value = [value[action] for action in ACTIONS]
+        self.array[encode_state(state)] = value
+
+    def __contains__(self, state):
+        try:
+            encode_state(state)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(STATES)
+
+    def __len__(self):
+        return len(STATES)
+
+
 def sum_over_cards(cards):
     """ return sum, usable/unusable ace 1/0
     """
@@ -100,6 +198,8 @@ class BlackJackEnv(BaseEnvironment):
             reward, new_state, status = self._judge()
         else:
             card = get_card()
+            # keep the hand, a 21 after hits is not a natural
+            self.player_cards.append(card)
             usable_ace, player_sum, dealer_show = state
 
             if card == 'A':
@@ -157,31 +257,239 @@ class BlackJackEnvES(BlackJackEnv):
         return self.usable_ace, self.player_sum, self.dealer_cards[0]
 
 
+class BatchedBlackJackEnv(BaseEnvironment):
+    """ Simulate many episodes of the Black Jack Problem in page 93 at once,
+    under the same rules as BlackJackEnv (and BlackJackEnvES with exploring starts).
+    Cards are encoded as 1 (Ace) .. 10 and taken from blocks pre-drawn with a seeded Generator,
+    player hits and the dealer's draws are masked array updates over the episodes still going.
+    """
+
+    def __init__(self, block_size=1 << 16, seed=None):
+        """
+        Params:
+        block_size - number of cards drawn from the Generator at a time.
+        seed - random seed.
+        """
+        super(BatchedBlackJackEnv, self).__init__(seed)
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._blocks = {}
+
+    def step(self, state, action):
+        print("rlp::warning:: Do not call 'step' in %s, use 'simulate'." % self.__class__)
+        pass
+
+    def _draw(self, n, uniform=False):
+        """ n cards from the pre-drawn block, 10, J, Q, K all count as 10 unless uniform over DECK.
+        """
+        block, pos = self._blocks.get(uniform, (None, 0))
+        if block is None or pos + n > len(block):
+            size = max(self.block_size, n)
+            if uniform:
+                block = self.rng.integers(1, 11, size, dtype=np.int8)
+            else:
+                block = np.minimum(self.rng.integers(1, 14, size, dtype=np.int8), 10)
+            pos = 0
+        self._blocks[uniform] = (block, pos + n)
+        return block[pos:pos + n]
+
+    @staticmethod
+    def _hand(raw, has_ace):
+        """ (sum, usable ace) from the sum counting aces as 1 and whether the hand holds an ace.
+        """
+        usable = has_ace & (raw + 10 <= 21)
+        return raw + 10 * usable, usable
+
+    def simulate(self, policy, n_episodes, exploring_starts=False):
+        """ Play n_episodes episodes under a tabular policy.
+        Params:
+        policy - array STATE_SHAPE + (2, ) of action probabilities, e.g. agent.policy_table,
+            or int array STATE_SHAPE of actions.
+        n_episodes - number of episodes.
+        exploring_starts - deal the first cards uniformly over DECK and take a random first action,
+            like BlackJackEnvES with AdvancedBlackJackAgent.
+
+        Returns:
+        states - int array (n_steps, 3), encode_state index of the state at each step.
+        actions - int array (n_steps, ).
+        rewards - int array (n_steps, ), reward following each action.
+        offsets - int array (n_episodes + 1, ), episode i is steps offsets[i]:offsets[i + 1].
+        """
+        policy = np.asarray(policy)
+        n = n_episodes
+        dealer_show = self._draw(n, exploring_starts).astype(np.int64)
+        dealer_hole = self._draw(n, exploring_starts)
+        dealer_raw = dealer_show + dealer_hole
+        dealer_ace = (dealer_show == 1) | (dealer_hole == 1)
+        # the player holds an ace and another card
+        player_raw = 1 + self._draw(n, exploring_starts).astype(np.int64)
+        player_ace = np.ones(n, dtype=bool)
+        n_hits = np.zeros(n, dtype=np.int64)
+        final_rewards = np.zeros(n, dtype=np.int64)
+        stuck = np.zeros(n, dtype=bool)
+
+        steps = []  # per round: (episodes, states, actions)
+        alive = np.arange(n)
+        t = 0
+        while len(alive):
+            player_sum, usable = self._hand(player_raw[alive], player_ace[alive])
+            index = (usable.astype(np.int64), player_sum - 12, dealer_show[alive] - 1)
+            if exploring_starts and t == 0:
+                actions = self.rng.integers(0, len(ACTIONS), len(alive))
+            elif policy.ndim == len(STATE_SHAPE):
+                actions = policy[index].astype(np.int64)
+            else:
+                actions = (self.rng.random(len(alive)) >= policy[index + (HIT, )]).astype(np.int64)
+            steps.append((alive, np.stack(index, axis=1), actions))
+
+            hits = alive[actions == HIT]
+            cards = self._draw(len(hits))
+            player_raw[hits] += cards
+            player_ace[hits] |= cards == 1
+            n_hits[hits] += 1
+            bust = self._hand(player_raw[hits], player_ace[hits])[0] > 21
+            final_rewards[hits[bust]] = -1
+            stuck[alive[actions == STICK]] = True
+
+            alive = hits[~bust]
+            t += 1
+
+        self._judge(stuck, player_raw, player_ace, n_hits, dealer_raw, dealer_ace, final_rewards)
+
+        episodes = np.concatenate([step[0] for step in steps])
+        # rounds are in time order, a stable sort groups steps by episode and keeps that order
+        order = np.argsort(episodes, kind='stable')
+        states = np.concatenate([step[1] for step in steps])[order]
+        actions = np.concatenate([step[2] for step in steps])[order]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(episodes, minlength=n), out=offsets[1:])
+        rewards = np.zeros(len(order), dtype=np.int64)
+        rewards[offsets[1:] - 1] = final_rewards
+        return states, actions, rewards, offsets
+
+    def _judge(self, stuck, player_raw, player_ace, n_hits, dealer_raw, dealer_ace, rewards):
+        """ After players stick, dealers draw cards and make judgements, written into rewards.
+        """
+        episodes = np.flatnonzero(stuck)
+        player_sum = self._hand(player_raw[episodes], player_ace[episodes])[0]
+        dealer_natural = self._hand(dealer_raw[episodes], dealer_ace[episodes])[0] == 21
+
+        # if the player gets natural
+        natural = (player_sum == 21) & (n_hits[episodes] == 0)
+        rewards[episodes[natural]] = np.where(dealer_natural[natural], 0, 1)
+        episodes, player_sum = episodes[~natural], player_sum[~natural]
+
+        # Dealer sticks if >= 17 else hit
+        dealer_raw, dealer_ace = dealer_raw[episodes], dealer_ace[episodes]
+        dealer_sum = self._hand(dealer_raw, dealer_ace)[0]
+        drawing = np.flatnonzero(dealer_sum < 17)
+        while len(drawing):
+            cards = self._draw(len(drawing))
+            dealer_raw[drawing] += cards
+            dealer_ace[drawing] |= cards == 1
+            dealer_sum[drawing] = self._hand(dealer_raw[drawing], dealer_ace[drawing])[0]
+            drawing = drawing[dealer_sum[drawing] < 17]
+
+        rewards[episodes] = np.where(dealer_sum > 21, 1, np.sign(player_sum - dealer_sum))
+
+
 class BlackJackAgent(BaseAgent):
     """ Abstract class for Black Jack Agent in page 93.
+    Tables are arrays indexed by encode_state, V, Q, policy and visit_counts are StateTable views of them.
     """
 
-    def __init__(self, discountRatio=0.99, seed=None):
+    # shape of the estimates averaged by _count_visit, STATE_SHAPE for V, STATE_SHAPE + (2, ) for Q
+    count_shape = STATE_SHAPE
+
+    def __init__(self, discountRatio=0.99, first_visit=True, seed=None):
+        """
+        Params:
+        discountRatio - discount ratio for returns.
+        first_visit - first-visit MC if True, otherwise every-visit MC.
+        seed - random seed.
+        """
         super(BlackJackAgent, self).__init__(seed)
         self._init_policy()
+        self._init_counts()
 
         self.discountRatio = discountRatio
+        self.first_visit = first_visit
 
         self.history_rewards = []
         self.experiences = []
 
-        self.returns = defaultdict(list)
-
     def _init_policy(self):
-        self.policy = {}
-        for usable_ace, player_sum, dealer_show in product((0, 1), range(12, 22), DECK):
-            self.policy[(usable_ace, player_sum, dealer_show)] = {}
-            for action in ACTIONS:
-                self.policy[(usable_ace, player_sum, dealer_show)][action] = 1 / len(ACTIONS)
+        self.policy_table = np.full(STATE_SHAPE + (len(ACTIONS), ), 1 / len(ACTIONS))
+        self.policy = StateTable(self.policy_table)
+
+    def _init_counts(self):
+        # number of returns averaged into each estimate, the estimates are running means
+        self.count_table = np.zeros(self.count_shape, dtype=np.int64)
+        self.visit_counts = StateTable(self.count_table)
 
     def set_state(self, state):
         self.curr_state = state
 
+    def _episode_returns(self):
+        """ walk the episode backward, yield (t, experience, G_t) for every visit to be updated.
+        With first-visit MC, only the first occurrence of each experience in the episode is yielded.
+        """
+        first_occurrence = {}
+        for t, experience in enumerate(self.experiences):
+            first_occurrence.setdefault(experience, t)
+
+        G = 0
+        for t in range(len(self.experiences) - 1, -1, -1):
+            experience = self.experiences[t]
+            G = self.discountRatio * G + self.history_rewards[t]
+            if not self.first_visit or first_occurrence[experience] == t:
+                yield t, experience, G
+
+    def _count_visit(self, table, index, G):
+        """ incremental mean, average G into table[index].
+        Params:
+        table - estimates array with the shape of count_table.
+        index - tuple index into table and count_table.
+        """
+        self.count_table[index] += 1
+        table[index] += (G - table[index]) / self.count_table[index]
+
+    def _batch_returns(self, rewards, offsets):
+        """ G_t of every step of a batch of episodes from BatchedBlackJackEnv.simulate,
+        float array (n_steps, ).
+        """
+        episode = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        steps_to_go = offsets[episode + 1] - 1 - np.arange(len(rewards))
+        G = rewards.astype(float)
+        for k in range(1, steps_to_go.max() + 1 if len(G) else 0):
+            t = np.flatnonzero(steps_to_go == k)
+            G[t] += self.discountRatio * G[t + 1]
+        return G
+
+    def _batch_average(self, table, flat_index, G):
+        """ average every G into table.flat[flat_index], same result as calling _count_visit in turn.
+        """
+        counts = np.bincount(flat_index, minlength=table.size).reshape(table.shape)
+        sums = np.bincount(flat_index, weights=G, minlength=table.size).reshape(table.shape)
+        self.count_table += counts
+        seen = counts > 0
+        table[seen] += (sums[seen] - counts[seen] * table[seen]) / self.count_table[seen]
+        return seen
+
+    def replay(self, states, actions, rewards):
+        """ learn from a recorded episode, e.g. one of a TrajectoryStore, as if it had just been played.
+        Params:
+        states - int array (T, 3), states encoded by encode_state.
+        actions, rewards - arrays (T, ).
+        """
+        self.reset()
+        for index, action, reward in zip(states, actions, rewards):
+            self.set_state(decode_state(tuple(int(i) for i in index)))
+            self.action_ = int(action)
+            self.set_experience(reward, None)
+        self.update()
+        self.reset()
+
     def reset(self):
         self.experiences.clear()
         self.history_rewards.clear()
@@ -191,14 +499,17 @@ class NaiveBlackJackAgent(BlackJackAgent):
     """ Naive agent sticks only on 20 or 21, shown in page 94.
     """
 
-    def __init__(self, discountRatio=0.99, seed=None):
-        super(NaiveBlackJackAgent, self).__init__(discountRatio, seed)
+    def __init__(self, discountRatio=0.99, first_visit=True, seed=None):
+        super(NaiveBlackJackAgent, self).__init__(discountRatio, first_visit, seed)
         self._initVs()
 
+    def _init_policy(self):
+        super(NaiveBlackJackAgent, self)._init_policy()
+        self.policy_table[:] = threshold_policy(20)
+
     def _initVs(self):
-        self.V = {}
-        for usable_ace, player_sum, dealer_show in product((0, 1), range(12, 22), DECK):
-            self.V[(usable_ace, player_sum, dealer_show)] = 0
+        self.V_table = np.zeros(STATE_SHAPE)
+        self.V = StateTable(self.V_table)
 
     def action(self):
         player_sum = self.curr_state[1]
@@ -210,15 +521,15 @@ class NaiveBlackJackAgent(BlackJackAgent):
     def update(self):
         """ update V function after each episode
         """
-        T = len(self.experiences)
-        G = 0
-        for t in range(T - 1, -1, -1):
-            state = self.experiences[t]
-            reward = self.history_rewards[t]
-            G = self.discountRatio * G + reward
-            if state not in self.experiences[:t - 1]:
-                self.returns[state].append(G)
-                self.V[state] = np.mean(self.returns[state])
+        for t, state, G in self._episode_returns():
+            self._count_visit(self.V_table, encode_state(state), G)
+
+    def update_batch(self, states, actions, rewards, offsets):
+        """ update V function with a batch of episodes from BatchedBlackJackEnv.simulate.
+        A state never repeats within a Black Jack episode, so first-visit and every-visit coincide.
+        """
+        G = self._batch_returns(rewards, offsets)
+        self._batch_average(self.V_table, np.ravel_multi_index(tuple(states.T), STATE_SHAPE), G)
 
     def set_experience(self, reward, new_state):
         self.history_rewards.append(reward)
@@ -229,17 +540,16 @@ class AdvancedBlackJackAgent(BlackJackAgent):
     """ An Advanced Black Jack agent.
     """
 
-    def __init__(self, discountRatio=0.99, seed=None):
-        super(AdvancedBlackJackAgent, self).__init__(discountRatio, seed)
+    count_shape = STATE_SHAPE + (len(ACTIONS), )
+
+    def __init__(self, discountRatio=0.99, first_visit=True, seed=None):
+        super(AdvancedBlackJackAgent, self).__init__(discountRatio, first_visit, seed)
         self._initQs()
         self.is_start = True
 
     def _initQs(self):
-        self.Q = {}
-        for usable_ace, player_sum, dealer_show in product((0, 1), range(12, 22), DECK):
-            self.Q[(usable_ace, player_sum, dealer_show)] = {}
-            for action in ACTIONS:
-                self.Q[(usable_ace, player_sum, dealer_show)][action] = 0
+        self.Q_table = np.zeros(STATE_SHAPE + (len(ACTIONS), ))
+        self.Q = StateTable(self.Q_table)
 
     def action(self):
         # keep exploring start
@@ -247,28 +557,28 @@ class AdvancedBlackJackAgent(BlackJackAgent):
             self.action_ = self.random_state.choice(ACTIONS)
             self.is_start = False
         else:
-            probs = [self.policy[self.curr_state][act] for act in ACTIONS]
-            self.action_ = self.random_state.choice(ACTIONS, p=probs)
+            self.action_ = self.random_state.choice(ACTIONS, p=self.policy_table[encode_state(self.curr_state)])
         return self.action_
 
     def update(self):
-        T = len(self.experiences)
-        G = 0
-        for t in range(T - 1, -1, -1):
-            state, action = self.experiences[t]
-            reward = self.history_rewards[t]
-            G = self.discountRatio * G + reward
-            if (state, action) not in self.experiences[:t - 1]:
-                self.returns[(state, action)].append(G)
-                self.Q[state][action] = np.mean(self.returns[(state, action)])
-
-                opt_acts = utilis.argmax(self.Q[state])
-
-                for action in self.Q[state]:
-                    if action == opt_acts[0]:
-                        self.policy[state][action] = 1
-                    else:
-                        self.policy[state][action] = 0
+        for t, (state, action), G in self._episode_returns():
+            index = encode_state(state)
+            self._count_visit(self.Q_table, index + (action, ), G)
+
+            # greedy one-hot policy, ties broken at random
+            greedy = utilis.random_argmax(self.Q_table[index], self.random_state)
+            self.policy_table[index] = 0
+            self.policy_table[index + (greedy, )] = 1
+
+    def update_batch(self, states, actions, rewards, offsets):
+        """ update Q function with a batch of episodes from BatchedBlackJackEnv.simulate,
+        then act greedily in every visited state.
+        """
+        G = self._batch_returns(rewards, offsets)
+        flat_index = np.ravel_multi_index(tuple(states.T) + (actions, ), self.Q_table.shape)
+        seen = self._batch_average(self.Q_table, flat_index, G).any(axis=-1)
+        self.policy_table[seen] = 0
+        self.policy_table[seen, utilis.random_argmax(self.Q_table[seen], self.random_state)] = 1
 
     def set_experience(self, reward, new_state):
         self.history_rewards.append(reward)
@@ -277,3 +587,114 @@ class AdvancedBlackJackAgent(BlackJackAgent):
     def reset(self):
         super(AdvancedBlackJackAgent, self).reset()
         self.is_start = True
+
+
+class OffPolicyBlackJackAgent(BlackJackAgent):
+    """ Off-policy every-visit MC prediction of Q for a target policy, page 110.
+    The agent follows the behavior policy, returns are weighted by the importance-sampling ratio
+    of the later steps, the backward walk stops once that ratio reaches zero.
+    """
+
+    count_shape = STATE_SHAPE + (len(ACTIONS), )
+
+    def __init__(self, target_policy=None, behavior_policy=None, weighted=True, discountRatio=0.99, seed=None):
+        """
+        Params:
+        target_policy - array STATE_SHAPE + (2, ) of action probabilities, default sticks on 20 or 21.
+        behavior_policy - same shape as target_policy, must cover it, default uniformly random.
+        weighted - weighted importance sampling if True, otherwise ordinary importance sampling.
+        discountRatio - discount ratio for returns.
+        seed - random seed.
+        """
+        super(OffPolicyBlackJackAgent, self).__init__(discountRatio, False, seed)
+        if target_policy is not None:
+            self.policy_table[:] = target_policy
+        else:
+            self.policy_table[:] = threshold_policy(20)
+        self.behavior_table = np.full(self.policy_table.shape, 1 / len(ACTIONS))
+        if behavior_policy is not None:
+            self.behavior_table[:] = behavior_policy
+        assert np.all(self.behavior_table[self.policy_table > 0] > 0), 'behavior policy must cover the target policy'
+        self.behavior = StateTable(self.behavior_table)
+        self.weighted = weighted
+        self._initQs()
+
+    def _initQs(self):
+        self.Q_table = np.zeros(STATE_SHAPE + (len(ACTIONS), ))
+        self.Q = StateTable(self.Q_table)
+        # cumulative importance-sampling weights C(s, a) of weighted IS
+        self.C_table = np.zeros(STATE_SHAPE + (len(ACTIONS), ))
+        self.C = StateTable(self.C_table)
+
+    def values(self):
+        """ V of the target policy, \\sum_a \\pi(a|s) Q(s, a), array STATE_SHAPE.
+        """
+        return (self.policy_table * self.Q_table).sum(axis=-1)
+
+    def action(self):
+        self.action_ = self.random_state.choice(ACTIONS, p=self.behavior_table[encode_state(self.curr_state)])
+        return self.action_
+
+    def _weighted_update(self, index, G, W):
+        self.C_table[index] += W
+        self.Q_table[index] += W / self.C_table[index] * (G - self.Q_table[index])
+
+    def update(self):
+        G = 0
+        W = 1
+        for t in range(len(self.experiences) - 1, -1, -1):
+            state, action = self.experiences[t]
+            index = encode_state(state) + (action, )
+            G = self.discountRatio * G + self.history_rewards[t]
+            if self.weighted:
+                self._weighted_update(index, G, W)
+            else:
+                self._count_visit(self.Q_table, index, W * G)
+            W *= self.policy_table[index] / self.behavior_table[index]
+            if W == 0:
+                if not self.weighted:
+                    # ordinary IS still averages a zero return into every earlier visit
+                    for state, action in self.experiences[:t]:
+                        self._count_visit(self.Q_table, encode_state(state) + (action, ), 0.)
+                break
+
+    def set_experience(self, reward, new_state):
+        self.history_rewards.append(reward)
+        self.experiences.append((self.curr_state, self.action_))
+
+
+class OffPolicyControlBlackJackAgent(OffPolicyBlackJackAgent):
+    """ Off-policy MC control with weighted importance sampling, page 111.
+    The target policy is greedy w.r.t. Q, the agent follows a soft behavior policy.
+    """
+
+    def __init__(self, behavior_policy=None, discountRatio=0.99, seed=None):
+        """
+        Params:
+        behavior_policy - array STATE_SHAPE + (2, ) of action probabilities, all positive,
+            default uniformly random.
+        discountRatio - discount ratio for returns.
+        seed - random seed.
+        """
+        super(OffPolicyControlBlackJackAgent, self).__init__(
+            None, behavior_policy, True, discountRatio, seed)
+        assert np.all(self.behavior_table > 0), 'behavior policy must be soft'
+        # greedy w.r.t. Q = 0
+        self.policy_table[:] = 0
+        self.policy_table[..., 0] = 1
+
+    def update(self):
+        G = 0
+        W = 1
+        for t in range(len(self.experiences) - 1, -1, -1):
+            state, action = self.experiences[t]
+            index = encode_state(state)
+            G = self.discountRatio * G + self.history_rewards[t]
+            self._weighted_update(index + (action, ), G, W)
+
+            greedy = utilis.random_argmax(self.Q_table[index], self.random_state)
+            self.policy_table[index] = 0
+            self.policy_table[index + (greedy, )] = 1
+            if action != greedy:
+                break
+            W /= self.behavior_table[index + (action, )]
@@ -8,10 +8,17 @@ class MultiArmedBanditBaseAgent(BaseAgent):
     """ Abstract Class for Multi Armed Bandit Agent
     """
 
-    def __init__(self, seed):
+    def __init__(self, seed, record_history=True, history_size=None):
+        """
+        Params:
+        seed - random seed.
+        record_history - keep rewards and actions of every step, if False only running stats are kept.
+        history_size - if given, keep only the last history_size steps in a ring buffer.
+        """
         super(MultiArmedBanditBaseAgent, self).__init__(seed)
-        self.rewards = []
-        self.actions = []
+        ring = history_size is not None
+        self.rewards = utilis.History(history_size, ring, record_history, dtype=float)
+        self.actions = utilis.History(history_size, ring, record_history, dtype=int)
 
         self.timestep = 0
 
@@ -33,8 +40,8 @@ class ActionValueMethod(MultiArmedBanditBaseAgent):
     """ Abstract Class for Action Value Methods
     """
 
-    def __init__(self, Q0, seed):
-        super(ActionValueMethod, self).__init__(seed)
+    def __init__(self, Q0, seed, record_history=True, history_size=None):
+        super(ActionValueMethod, self).__init__(seed, record_history, history_size)
         self.aciton_value_estimate = Q0
         self.n_arms = len(Q0)
         self.action_cnt = np.zeros((self.n_arms, ))
@@ -50,20 +57,21 @@ class EpsGreedy(ActionValueMethod):
     """ EpsGreedy Agent.
     """
 
-    def __init__(self, eps, Q0, seed=None):
+    def __init__(self, eps, Q0, seed=None, record_history=True, history_size=None):
         """
         Params:
         eps - prob. of exploration (being totally greedy when eps = 0).
         Q0 - initial estimate for action value. Can be a list or numpy array.
         seed - random seed.
+        record_history, history_size - see MultiArmedBanditBaseAgent.
         """
-        super(EpsGreedy, self).__init__(Q0, seed)
+        super(EpsGreedy, self).__init__(Q0, seed, record_history, history_size)
         self.eps = eps
 
     def action(self):
         # exploit
         if self.random_state.uniform(0, 1) >= self.eps:
-            At = np.argmax(self.aciton_value_estimate)
+            At = utilis.random_argmax(self.aciton_value_estimate, self.random_state)
         # explore
         else:
             At = self.random_state.choice(range(self.n_arms))
@@ -86,15 +94,16 @@ class EpsGreedyConstStep(EpsGreedy):
     """ EpsGreedy Agent Using Constant Step Size.
     """
 
-    def __init__(self, eps, Q0, alpha, seed=None):
+    def __init__(self, eps, Q0, alpha, seed=None, record_history=True, history_size=None):
         """Params:
         eps - prob. of exploration (being totally greedy when eps = 0).
         Q0 - initial estimate for action value. Can be a list or numpy array.
         alpha - const step size.
         seed - random seed.
+        record_history, history_size - see MultiArmedBanditBaseAgent.
         """
         assert alpha <= 1 and alpha > 0
-        super(EpsGreedyConstStep, self).__init__(eps, Q0, seed)
+        super(EpsGreedyConstStep, self).__init__(eps, Q0, seed, record_history, history_size)
         self.alpha = alpha
 
     # step size is a constatnt alpha
@@ -113,21 +122,22 @@ class UCB(ActionValueMethod):
     """Upper Confidence Bound (UCB) Action Selection.
     """
 
-    def __init__(self, alpha, conf_level, Q0, seed=None):
+    def __init__(self, alpha, conf_level, Q0, seed=None, record_history=True, history_size=None):
         """Params:
         alpha - const step size.
         conf_level - confident level.
         Q0 - initial estimate for action value. Can be a list or numpy array.
         seed - random seed.
+        record_history, history_size - see MultiArmedBanditBaseAgent.
         """
-        super(UCB, self).__init__(Q0, seed)
+        super(UCB, self).__init__(Q0, seed, record_history, history_size)
         self.c = conf_level
         self.alpha = alpha
 
     def action(self):
         if 0 in self.action_cnt:
             zeroA = np.argwhere(self.action_cnt == 0).ravel()
-            At = np.random.choice(zeroA)
+            At = self.random_state.choice(zeroA)
         else:
             t_arr = self.timestep * np.ones((self.n_arms, ))
             tmp = self.aciton_value_estimate + self.c * \
@@ -151,14 +161,15 @@ class GradientBandit(MultiArmedBanditBaseAgent):
     """Gradient Bandit Algorithm.
     """
 
-    def __init__(self, H0, alpha, baseline=False, seed=None):
+    def __init__(self, H0, alpha, baseline=False, seed=None, record_history=True, history_size=None):
         """Params:
         H0 - initial estimate for action value. Can be a list or numpy array.
         alpha - const step size.
         baseline - use baseline or not.
         seed - random seed.
+        record_history, history_size - see MultiArmedBanditBaseAgent.
         """
-        super(GradientBandit, self).__init__(seed)
+        super(GradientBandit, self).__init__(seed, record_history, history_size)
         self.Hs = H0
         self.prob = utilis.softmax(self.Hs)
         self.n_arms = len(H0)
@@ -166,11 +177,12 @@ class GradientBandit(MultiArmedBanditBaseAgent):
         self.alpha = alpha
 
     def update(self):
-        baseline = np.mean(self.rewards) if self.use_baseline else 0
+        # running mean over all rewards, O(1) per step
+        baseline = self.rewards.mean if self.use_baseline else 0
         self.Hs += self._step_size() * (self.Rt - baseline) * \
             ((np.arange(self.n_arms) == self.At) - self.prob)
 
-        self.prob = utilis.softmax(self.Hs)
+        utilis.softmax(self.Hs, out=self.prob)
         self.timestep += 1
 
     def action(self):
@@ -185,3 +197,190 @@ class GradientBandit(MultiArmedBanditBaseAgent):
 
     def __repr__(self):
         return 'GradientBandit(alpha = %.2f)' % self.alpha
+
+
+class BatchedBanditAgent(BaseAgent):
+    """ Abstract Class for agents running n_runs independent bandit problems at once.
+    Actions, rewards and estimates are arrays with a leading n_runs axis.
+    """
+
+    def __init__(self, n_runs, n_arms, seed):
+        super(BatchedBanditAgent, self).__init__(seed)
+        self.n_runs = n_runs
+        self.n_arms = n_arms
+        self.timestep = 0
+
+        self.At = None
+        self.Rt = np.zeros((n_runs, ))
+        self._runs = np.arange(n_runs)
+
+    def set_experience(self, reward):
+        """ Get rewards of all runs, float array (n_runs, ).
+        """
+        self.Rt = reward
+
+    @abstractmethod
+    def _step_size(self):
+        return self.alpha
+
+
+class BatchedActionValueMethod(BatchedBanditAgent):
+    """ Abstract Class for batched Action Value Methods
+    """
+
+    def __init__(self, Q0, n_runs, seed):
+        """Params:
+        Q0 - initial estimate for action value, array (n_arms, ) shared by all runs or (n_runs, n_arms).
+        n_runs - number of independent runs.
+        seed - random seed.
+        """
+        Q0 = np.asarray(Q0, dtype=float)
+        super(BatchedActionValueMethod, self).__init__(n_runs, Q0.shape[-1], seed)
+        self.aciton_value_estimate = np.broadcast_to(Q0, (n_runs, self.n_arms)).copy()
+        self.action_cnt = np.zeros((n_runs, self.n_arms))
+
+    def update(self):
+        Qt = self.aciton_value_estimate[self._runs, self.At]
+        self.aciton_value_estimate[self._runs, self.At] = Qt + self._step_size() * (self.Rt - Qt)
+        self.timestep += 1
+
+    def _select(self, At):
+        self.At = At
+        self.action_cnt[self._runs, At] += 1
+        return At
+
+
+class BatchedEpsGreedy(BatchedActionValueMethod):
+    """ EpsGreedy Agent for n_runs bandit problems.
+    """
+
+    def __init__(self, eps, Q0, n_runs, seed=None):
+        """
+        Params:
+        eps - prob. of exploration (being totally greedy when eps = 0).
+        Q0 - initial estimate for action value, array (n_arms, ) or (n_runs, n_arms).
+        n_runs - number of independent runs.
+        seed - random seed.
+        """
+        super(BatchedEpsGreedy, self).__init__(Q0, n_runs, seed)
+        self.eps = eps
+
+    def action(self):
+        # exploit
+        At = utilis.random_argmax(self.aciton_value_estimate, self.random_state)
+        # explore
+        explore = self.random_state.uniform(0, 1, self.n_runs) < self.eps
+        At[explore] = self.random_state.randint(self.n_arms, size=explore.sum())
+        return self._select(At)
+
+    def _step_size(self):
+        return 1 / self.action_cnt[self._runs, self.At]
+
+    def __repr__(self):
+        return 'Batched ' + EpsGreedy.__repr__(self)
+
+
+class BatchedEpsGreedyConstStep(BatchedEpsGreedy):
+    """ EpsGreedy Agent Using Constant Step Size for n_runs bandit problems.
+    """
+
+    def __init__(self, eps, Q0, alpha, n_runs, seed=None):
+        """Params:
+        eps - prob. of exploration (being totally greedy when eps = 0).
+        Q0 - initial estimate for action value, array (n_arms, ) or (n_runs, n_arms).
+        alpha - const step size.
+        n_runs - number of independent runs.
+        seed - random seed.
+        """
+        assert alpha <= 1 and alpha > 0
+        super(BatchedEpsGreedyConstStep, self).__init__(eps, Q0, n_runs, seed)
+        self.alpha = alpha
+
+    def _step_size(self):
+        return self.alpha
+
+    def __repr__(self):
+        return 'Batched ' + EpsGreedyConstStep.__repr__(self)
+
+
+class BatchedUCB(BatchedActionValueMethod):
+    """Upper Confidence Bound (UCB) Action Selection for n_runs bandit problems.
+    """
+
+    def __init__(self, alpha, conf_level, Q0, n_runs, seed=None):
+        """Params:
+        alpha - const step size.
+        conf_level - confident level.
+        Q0 - initial estimate for action value, array (n_arms, ) or (n_runs, n_arms).
+        n_runs - number of independent runs.
+        seed - random seed.
+        """
+        super(BatchedUCB, self).__init__(Q0, n_runs, seed)
+        self.c = conf_level
+        self.alpha = alpha
+
+    def action(self):
+        untried = self.action_cnt == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tmp = self.aciton_value_estimate + self.c * \
+                np.sqrt(np.log(self.timestep) / self.action_cnt)
+        At = tmp.argmax(axis=1)
+        # runs with zero-cnt actions pick one of them at random
+        has_untried = untried.any(axis=1)
+        if has_untried.any():
+            At[has_untried] = utilis.random_argmax(untried[has_untried], self.random_state)
+        return self._select(At)
+
+    def _step_size(self):
+        return self.alpha
+
+    def __repr__(self):
+        return 'Batched ' + UCB.__repr__(self)
+
+
+class BatchedGradientBandit(BatchedBanditAgent):
+    """Gradient Bandit Algorithm for n_runs bandit problems.
+    """
+
+    def __init__(self, H0, alpha, n_runs, baseline=False, seed=None):
+        """Params:
+        H0 - initial action preferences, array (n_arms, ) or (n_runs, n_arms).
+        alpha - const step size.
+        n_runs - number of independent runs.
+        baseline - use baseline or not.
+        seed - random seed.
+        """
+        H0 = np.asarray(H0, dtype=float)
+        super(BatchedGradientBandit, self).__init__(n_runs, H0.shape[-1], seed)
+        self.Hs = np.broadcast_to(H0, (n_runs, self.n_arms)).copy()
+        self.use_baseline = baseline
+        self.alpha = alpha
+        self.avg_reward = np.zeros((n_runs, ))
+        self.prob = np.empty_like(self.Hs)
+        self._update_prob()
+
+    def _update_prob(self):
+        utilis.softmax(self.Hs, axis=1, out=self.prob)
+
+    def update(self):
+        self.timestep += 1
+        # running mean of all rewards so far, the current one included
+        self.avg_reward += (self.Rt - self.avg_reward) / self.timestep
+        baseline = self.avg_reward if self.use_baseline else 0
+        one_hot = np.zeros_like(self.Hs)
+        one_hot[self._runs, self.At] = 1
+        self.Hs += self._step_size() * (self.Rt - baseline)[:, None] * (one_hot - self.prob)
+        self._update_prob()
+
+    def action(self):
+        # ramdom sample from the softmax distribution of each run
+        u = self.random_state.uniform(0, 1, (self.n_runs, 1))
+        At = (self.prob.cumsum(axis=1) < u).sum(axis=1)
+        self.At = np.minimum(At, self.n_arms - 1)
+        return self.At
+
+    def _step_size(self):
+        return self.alpha
+
+    def __repr__(self):
+        return 'Batched ' + GradientBandit.__repr__(self)
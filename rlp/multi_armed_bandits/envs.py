@@ -1,4 +1,8 @@
 from ..base import BaseEnvironment
+import numpy as np
+
+# STATUS, a bandit never terminates
+IN_PROGRESS, TERMINAL = 0, 1
 
 
 class MultiArmedBandit(BaseEnvironment):
@@ -28,6 +32,14 @@ class MultiArmedBandit(BaseEnvironment):
         sig = self.reward_dist_stds[action]
         return self.random_state.normal(mu, sig)
 
+    def step(self, state, action):
+        """ Bandit has a single state, give reward and the unchanged state.
+        """
+        return self.act(action), state, IN_PROGRESS
+
+    def reset(self):
+        return None
+
     def __repr__(self):
         name = '%d-Armed Bandit' % self.n_arms
         params = ['\tarm %d  Gaussian(%.2f, %.2f)' % (a + 1, self.reward_dist_means[a], self.reward_dist_stds[a])
@@ -43,14 +55,64 @@ class NonStationaryMultiArmedBandit(MultiArmedBandit):
     """
 
     def __init__(self, k, means, stds, seed=None):
-        MultiArmedBandit.__init__(self, k, means, stds, seed)
+        # the means drift, keep a private copy
+        MultiArmedBandit.__init__(self, k, np.array(means, dtype=float), stds, seed)
 
     def _update(self):
         noise = self.random_state.randn(self.n_arms) * 0.01
         self.reward_dist_means += noise
 
-    def action(self, action):
-        """Bandit gives reward based on agent's action
+    def act(self, action):
+        """Bandit gives reward based on agent's action, after the means take a random walk step.
         """
         self._update()
-        return MultiArmedBandit.reward(self, action, None)
+        return MultiArmedBandit.act(self, action)
+
+
+class BatchedMultiArmedBandit(BaseEnvironment):
+    """ n_runs independent Multi-Armed Bandits stepped together,
+    e.g. all runs of the 10-armed testbed in page-28.
+    """
+
+    def __init__(self, n_runs, k, means, stds, seed=None):
+        """
+        Params:
+        ========================
+        n_runs - number of independent bandit problems.
+        k - number of arms of each bandit.
+        means - mean values of gaussian distributions, array (n_runs, k) or (k, ) shared by all runs.
+        stds - standard deviations of gaussian distributions, same shape as means.
+        seed - random seed.
+        """
+        super(BatchedMultiArmedBandit, self).__init__(seed)
+        self.n_runs = n_runs
+        self.n_arms = k
+        self.reward_dist_means = np.broadcast_to(np.asarray(means, dtype=float), (n_runs, k)).copy()
+        self.reward_dist_stds = np.broadcast_to(np.asarray(stds, dtype=float), (n_runs, k)).copy()
+        self._runs = np.arange(n_runs)
+
+    def act(self, actions):
+        """Bandits give rewards based on agents' actions.
+        Params:
+        actions - int array (n_runs, ), one arm for each run.
+
+        Returns:
+        float array (n_runs, )
+        """
+        mu = self.reward_dist_means[self._runs, actions]
+        sig = self.reward_dist_stds[self._runs, actions]
+        return mu + sig * self.random_state.standard_normal(self.n_runs)
+
+    def step(self, state, action):
+        return self.act(action), state, np.full(self.n_runs, IN_PROGRESS)
+
+    def reset(self):
+        return None
+
+    def optimal_actions(self):
+        """ arm with the highest mean reward of each run, int array (n_runs, ).
+        """
+        return self.reward_dist_means.argmax(axis=1)
+
+    def __repr__(self):
+        return '%d runs of %d-Armed Bandit' % (self.n_runs, self.n_arms)
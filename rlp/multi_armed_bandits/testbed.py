@@ -0,0 +1,115 @@
+from .envs import MultiArmedBandit
+from copy import deepcopy
+import multiprocessing as mp
+import numpy as np
+"""
+This module drives bandits and agents, e.g. the 10-armed testbed in page-28,
+either batched in one process or as independent runs over a process pool.
+"""
+
+
+class BanditTestbed:
+    """ Advance every run of a batched bandit and a batched agent together.
+    """
+
+    def __init__(self, bandit, agent):
+        """
+        Params:
+        bandit - BatchedMultiArmedBandit object.
+        agent - batched agent object with the same n_runs, e.g. BatchedEpsGreedy.
+        """
+        assert bandit.n_runs == agent.n_runs
+        self.bandit = bandit
+        self.agent = agent
+
+    def step(self):
+        """ one timestep for all runs.
+
+        Returns:
+        actions, rewards - arrays (n_runs, )
+        """
+        At = self.agent.action()
+        Rt = self.bandit.act(At)
+        self.agent.set_experience(Rt)
+        self.agent.update()
+        return At, Rt
+
+    def run(self, n_timesteps):
+        """ run n_timesteps steps.
+
+        Returns:
+        avg_rewards - float array (n_timesteps, ), reward at each step averaged over runs.
+        opt_act_rate - float array (n_timesteps, ), rate of runs taking the optimal action at each step.
+        """
+        avg_rewards = np.zeros((n_timesteps, ))
+        opt_act_rate = np.zeros((n_timesteps, ))
+        optimal = self.bandit.optimal_actions()
+        for t in range(n_timesteps):
+            At, Rt = self.step()
+            avg_rewards[t] = Rt.mean()
+            opt_act_rate[t] = (At == optimal).mean()
+        return avg_rewards, opt_act_rate
+
+
+def run_experiments(settings, n_runs, n_timesteps, k=10, n_workers=None, seed=None):
+    """ Run every setting n_runs times on the k-armed testbed, spreading (setting, run) jobs
+    over a process pool. Every job gets its own seeds from SeedSequence.spawn,
+    run j of every setting faces the same bandit, and results are accumulated
+    in job order, so the output is identical for any n_workers.
+    Params:
+    settings - dict: name => (agent class, dict of kwargs without seed),
+        e.g. {'UCB c=2': (UCB, {'alpha': 0.1, 'conf_level': 2, 'Q0': np.zeros(10)})}.
+    n_runs - number of independent runs per setting.
+    n_timesteps - number of steps per run.
+    k - number of arms, mean rewards are sampled from N(0, 1), stds are 1.
+    n_workers - number of worker processes, default os.cpu_count(), 1 runs in this process.
+    seed - entropy of the root SeedSequence.
+
+    Returns:
+    dict: name => (avg_rewards, opt_act_rate), float arrays (n_timesteps, ) averaged over runs.
+    """
+    names = list(settings)
+    # per run: child 0 draws the means, child 1 the reward noise, child 2 + i seeds the agent of setting i
+    run_seeds = [[int(seq.generate_state(1)[0]) for seq in run_seq.spawn(2 + len(names))]
+                 for run_seq in np.random.SeedSequence(seed).spawn(n_runs)]
+    jobs = [(i, settings[name][0], settings[name][1], n_timesteps, k, run_seeds[j][:2] + [run_seeds[j][2 + i]])
+            for i, name in enumerate(names) for j in range(n_runs)]
+
+    avg_rewards = np.zeros((len(names), n_timesteps))
+    opt_act_rate = np.zeros((len(names), n_timesteps))
+    n_workers = n_workers or mp.cpu_count()
+    if n_workers == 1:
+        results = map(_run_job, jobs)
+        _collect(results, avg_rewards, opt_act_rate)
+    else:
+        with mp.Pool(n_workers) as pool:
+            # ordered imap keeps the summation order fixed
+            results = pool.imap(_run_job, jobs, chunksize=max(1, len(jobs) // (4 * n_workers)))
+            _collect(results, avg_rewards, opt_act_rate)
+
+    return dict((name, (avg_rewards[i] / n_runs, opt_act_rate[i] / n_runs)) for i, name in enumerate(names))
+
+
+def _collect(results, avg_rewards, opt_act_rate):
+    for i, rewards, hit_opt in results:
+        avg_rewards[i] += rewards
+        opt_act_rate[i] += hit_opt
+
+
+def _run_job(job):
+    i, agent_cls, kwargs, n_timesteps, k, (means_seed, bandit_seed, agent_seed) = job
+    means = np.random.RandomState(means_seed).normal(0, 1, k)
+    bandit = MultiArmedBandit(k=k, means=means, stds=np.ones(k), seed=bandit_seed)
+    agent = agent_cls(seed=agent_seed, record_history=False, **deepcopy(kwargs))
+
+    optimal = np.argmax(means)
+    rewards = np.zeros((n_timesteps, ))
+    hit_opt = np.zeros((n_timesteps, ))
+    for t in range(n_timesteps):
+        At = agent.action()
+        Rt = bandit.act(At)
+        agent.set_experience(Rt)
+        agent.update()
+        rewards[t] = Rt
+        hit_opt[t] = At == optimal
+    return i, rewards, hit_opt
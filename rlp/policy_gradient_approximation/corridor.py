@@ -1,56 +1,212 @@
 import numpy as np
 from ..base import BaseEnvironment, BaseAgent
+from .. import utilis
 
 RIGHT, LEFT = 0, 1
 ACTIONS = [RIGHT, LEFT]
 IN_PROGRESS, TERMINAL = 0, 1
+START, GOAL = 0, 3
+# next state of (state, action), actions are switched in state 1
+NEXT_STATE = np.array([[1, 0],
+                       [0, 2],
+                       [GOAL, 1]])
+# theta with pi(RIGHT) = 0.05, as in Figure 13.1
+THETA0 = (-1.47, 1.47)
 
 
 class Corridor(BaseEnvironment):
     """ DEMO env for Short corridor with switched actions, see page 323
+    Reward is -1 per step, all states look the same to the agent.
     """
 
-    def __init__(self, seed):
-        super(self, Corridor).__init__(seed)
+    def __init__(self, seed=None):
+        super(Corridor, self).__init__(seed)
 
     def step(self, state, action):
         assert action in ACTIONS
-        if state == 0:
-            if action == LEFT:
-                return -1, state, IN_PROGRESS
-            else:
-                return -1, 1, IN_PROGRESS
-
-        if state == 1:
-            # the swith poistion
-            if action == LEFT:
-                return -1, 1, IN_PROGRESS
-            else:
-                return -1, 0, IN_PROGRESS
-
-        if state == 2:
-            if action == RIGHT:
-                return 0, 3, TERMINAL
-            else:
-                return -1, 1, IN_PROGRESS
+        new_state = int(NEXT_STATE[state, action])
+        return -1, new_state, int(new_state == GOAL)
 
+    def reset(self):
+        return START
+
+    @staticmethod
+    def start_value(p_right):
+        """ value of the start state when taking RIGHT with prob. p_right in every state.
+        """
+        # v0 = -1 + p v1 + (1 - p) v0, v1 = -1 + p v0 + (1 - p) v2, v2 = -1 + (1 - p) v1
+        p = p_right
+        A = np.array([[-p, p, 0], [p, -1, 1 - p], [0, 1 - p, -1]])
+        return np.linalg.solve(A, np.ones(3))[0]
 
-class CorridorAgent(BaseAgent):
-    def __init__(self, seed):
-        super(self, Corridor).__init__(seed)
-        self.theta = np.rand.randn(len(ACTIONS))
 
-    def _init_policy(self):
-        pass
+class CorridorAgent(BaseAgent):
+    """ Abstract Class for policy gradient agents of the short corridor,
+    softmax policy with features x(s, RIGHT) = [1, 0], x(s, LEFT) = [0, 1] in every state,
+    so pi(.|s) = softmax(theta).
+    The episode is recorded step by step and learned from at its end, see update.
+    """
 
-    def _process_state_action(self, state, action):
-        """ return the vector representation for
-        the state and action pair.
+    def __init__(self, alpha, discountRatio=1., theta0=THETA0, seed=None):
         """
+        Params:
+        alpha - step size of theta.
+        discountRatio - discount ratio for returns.
+        theta0 - initial action preferences (RIGHT, LEFT).
+        seed - random seed.
+        """
+        super(CorridorAgent, self).__init__(seed)
+        self.alpha = alpha
+        self.discountRatio = discountRatio
+        self.theta = np.array(theta0, dtype=float)
+        self.pi = utilis.softmax(self.theta)
+
+        self.actions = []
+        self.rewards = []
 
     def action(self):
-        probs = [self.policy[self.currState][a] for a in ACTIONS]
-        return self.random_state.choice(ACTIONS, probs)
+        self.At = RIGHT if self.random_state.random_sample() < self.pi[RIGHT] else LEFT
+        return self.At
+
+    def set_experience(self, reward, new_state):
+        self.actions.append(self.At)
+        self.rewards.append(reward)
+
+    def reset(self):
+        self.actions.clear()
+        self.rewards.clear()
+
+    def _policy_step(self, actions, weights):
+        """ theta += alpha \\sum_t weights_t \\nabla ln pi(A_t), where \\nabla ln pi(a) = x(a) - pi.
+        """
+        grad = np.bincount(actions, weights=weights, minlength=len(ACTIONS)) - weights.sum() * self.pi
+        self.theta += self.alpha * grad
+        utilis.softmax(self.theta, out=self.pi)
+
+
+class ReinforceAgent(CorridorAgent):
+    """ REINFORCE, Monte-Carlo policy gradient, page 328.
+    Returns and log-policy gradients of the whole episode are computed as arrays in one backward pass,
+    the gradients use theta of the episode start.
+    """
 
     def update(self):
-        pass
+        if not self.actions:
+            return
+        actions = np.asarray(self.actions)
+        G = utilis.discounted_returns(self.rewards, self.discountRatio)
+        discounts = self.discountRatio ** np.arange(len(G))
+        self._policy_step(actions, discounts * G)
+
+
+class ReinforceBaselineAgent(CorridorAgent):
+    """ REINFORCE with baseline, page 330, the baseline is a learned state value v(s, w) = w,
+    the same for all states as they look the same.
+    """
+
+    def __init__(self, alpha, alpha_w, discountRatio=1., theta0=THETA0, w0=0., seed=None):
+        """
+        Params:
+        alpha_w - step size of the baseline weight w.
+        w0 - initial baseline.
+        See CorridorAgent for the others.
+        """
+        super(ReinforceBaselineAgent, self).__init__(alpha, discountRatio, theta0, seed)
+        self.alpha_w = alpha_w
+        self.w = w0
+
+    def update(self):
+        if not self.actions:
+            return
+        actions = np.asarray(self.actions)
+        G = utilis.discounted_returns(self.rewards, self.discountRatio)
+        discounts = self.discountRatio ** np.arange(len(G))
+        baselines, self.w = running_baseline(G, self.alpha_w * discounts, self.w)
+        self._policy_step(actions, discounts * (G - baselines))
+
+
+def running_baseline(G, rates, w0):
+    """ the baseline updates w_{t + 1} = w_t + rates_t (G_t - w_t) of a whole episode, without a loop over steps:
+    w_t = P_t (w_0 + \\sum_{j < t} rates_j G_j / P_{j + 1}) with P_t = \\prod_{k < t} (1 - rates_k),
+    evaluated in blocks short enough for 1 / P not to overflow.
+    Params:
+    G - float array (T, ) or (T, n_runs), returns.
+    rates - float array with the shape of G, step sizes in [0, 1).
+    w0 - float or float array (n_runs, ), baseline before the episode.
+
+    Returns:
+    baselines - float array with the shape of G, w_t used at each step.
+    w - baseline after the episode.
+    """
+    log_keep = np.log1p(-rates)
+    T = len(G)
+    worst = -log_keep.min() if T else 0
+    block = T if worst == 0 else max(1, int(300 / worst))
+    baselines = np.empty_like(G, dtype=float)
+    w = w0
+    for start in range(0, T, block):
+        end = min(T, start + block)
+        L = np.cumsum(log_keep[start:end], axis=0)
+        terms = rates[start:end] * G[start:end] * np.exp(-L)
+        acc = np.cumsum(terms, axis=0)
+        baselines[start:end] = np.exp(L - log_keep[start:end]) * (w + acc - terms)
+        w = np.exp(L[-1]) * (w + acc[-1])
+    return baselines, w
+
+
+def run_batched(n_runs, n_episodes, alpha, alpha_w=None, discountRatio=1., theta0=THETA0, max_steps=1000,
+                seed=None):
+    """ Run REINFORCE (with baseline if alpha_w is given) on n_runs independent corridors at once,
+    e.g. for Figure 13.1 and 13.2. Each episode of all runs is simulated with masked array steps,
+    then learned from with one backward pass over the (steps, n_runs) arrays.
+    Params:
+    n_runs - number of independent runs.
+    n_episodes - number of episodes per run.
+    alpha - step size of theta.
+    alpha_w - step size of the baseline, default None (no baseline).
+    discountRatio - discount ratio for returns.
+    theta0 - initial action preferences (RIGHT, LEFT).
+    max_steps - episodes are cut after max_steps steps.
+    seed - random seed.
+
+    Returns:
+    float array (n_runs, n_episodes), total reward of each episode.
+    """
+    rng = np.random.default_rng(seed)
+    theta = np.tile(np.asarray(theta0, dtype=float), (n_runs, 1))
+    pi = utilis.softmax(theta, axis=1)
+    w = np.zeros(n_runs)
+    totals = np.zeros((n_runs, n_episodes))
+
+    actions = np.zeros((max_steps, n_runs), dtype=np.int64)
+    active = np.zeros((max_steps, n_runs), dtype=bool)
+    for episode in range(n_episodes):
+        state = np.full(n_runs, START)
+        T = 0
+        while T < max_steps and np.any(state != GOAL):
+            active[T] = state != GOAL
+            actions[T] = np.where(rng.random(n_runs) < pi[:, RIGHT], RIGHT, LEFT)
+            state = np.where(active[T], NEXT_STATE[np.minimum(state, GOAL - 1), actions[T]], state)
+            T += 1
+
+        mask = active[:T]
+        lengths = mask.sum(axis=0)
+        totals[:, episode] = -lengths
+        # reward is -1 per step, G_t = -\sum_{k < length - t} \gamma^k
+        steps_to_go = lengths - np.arange(T)[:, None]
+        if discountRatio == 1:
+            G = -steps_to_go.astype(float)
+        else:
+            G = -(1 - discountRatio ** steps_to_go) / (1 - discountRatio)
+        weights = (discountRatio ** np.arange(T))[:, None] * mask
+        if alpha_w is not None:
+            baselines, w = running_baseline(G, alpha_w * weights, w)
+            delta = weights * (G - baselines)
+        else:
+            delta = weights * G
+
+        right = (delta * (actions[:T] == RIGHT)).sum(axis=0)
+        grad = np.stack([right, delta.sum(axis=0) - right], axis=1) - delta.sum(axis=0)[:, None] * pi
+        theta += alpha * grad
+        utilis.softmax(theta, axis=1, out=pi)
+    return totals
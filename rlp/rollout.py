@@ -0,0 +1,147 @@
+from collections import namedtuple, deque
+import numpy as np
+"""
+This module runs environments and agents as a pipeline of generators:
+rollout yields transitions lazily, stages such as encode_states and episode_batches
+transform the stream, and learn passes every item to a learner on its way through, e.g.
+
+    drain(learn(episode_batches(encode_states(rollout(env, agent, n_episodes=1000), encode_state), 100),
+                agent.update_batch))
+
+Nothing runs until the pipeline is consumed, by drain or a for loop.
+Online learners (td_learner, bandit_learner) must come before batching stages,
+as the agent acts on the next state only after the current transition has passed through them.
+"""
+
+# STATUS
+IN_PROGRESS, TERMINAL = 0, 1
+
+Transition = namedtuple('Transition', ['episode', 'state', 'action', 'reward', 'next_state', 'done'])
+
+
+def agent_policy(agent):
+    """ function state => action of an agent, which sets the state first if the agent keeps one.
+    """
+    set_state = getattr(agent, 'set_state', None)
+
+    def act(state):
+        if set_state is not None:
+            set_state(state)
+        return agent.action()
+
+    return act
+
+
+def rollout(env, policy, n_episodes=None, n_steps=None, max_steps=None):
+    """ Yield the transitions of successive episodes of env.
+    Params:
+    env - environment following the BaseEnvironment contract, reset() and step(state, action).
+    policy - agent object, which is reset at the start of every episode, or a function state => action.
+    n_episodes - number of episodes, default None (no limit).
+    n_steps - total number of steps over all episodes, default None (no limit).
+    max_steps - episodes are cut after max_steps steps, default None (until terminal).
+
+    Returns:
+    generator of Transition, done is True only for the last step of an episode which terminated.
+    """
+    assert n_episodes is not None or n_steps is not None or max_steps is not None, 'rollout would never stop'
+    is_agent = not callable(policy)
+    act = agent_policy(policy) if is_agent else policy
+    reset_agent = getattr(policy, 'reset', None) if is_agent else None
+    episode, total = 0, 0
+    while (n_episodes is None or episode < n_episodes) and (n_steps is None or total < n_steps):
+        if reset_agent is not None:
+            reset_agent()
+        state = env.reset()
+        status, steps = IN_PROGRESS, 0
+        while status != TERMINAL and (max_steps is None or steps < max_steps) and \
+                (n_steps is None or total < n_steps):
+            action = act(state)
+            reward, next_state, status = env.step(state, action)
+            yield Transition(episode, state, action, reward, next_state, status == TERMINAL)
+            state = next_state
+            steps += 1
+            total += 1
+        episode += 1
+        if n_episodes is None and n_steps is None:
+            # max_steps only, a single episode
+            return
+
+
+def encode_states(transitions, encode):
+    """ map state and next_state of every transition by encode, next_state of a terminal step is kept None.
+    """
+    for tr in transitions:
+        yield tr._replace(state=encode(tr.state), next_state=None if tr.done else encode(tr.next_state))
+
+
+def episode_batches(transitions, n_episodes):
+    """ group whole episodes, n_episodes at a time, into flat (states, actions, rewards, offsets),
+    episode i is steps offsets[i]:offsets[i + 1], the format of BatchedBlackJackEnv.simulate,
+    BlackJackAgent.update_batch and TrajectoryStore.append_batch.
+    """
+    buf, offsets, current = [], [0], None
+    for tr in transitions:
+        if current is not None and tr.episode != current:
+            # the previous episode was cut
+            offsets.append(len(buf))
+            if len(offsets) > n_episodes:
+                yield _batch(buf, offsets)
+                buf, offsets = [], [0]
+        buf.append(tr)
+        current = tr.episode
+        if tr.done:
+            offsets.append(len(buf))
+            current = None
+            if len(offsets) > n_episodes:
+                yield _batch(buf, offsets)
+                buf, offsets = [], [0]
+    if current is not None:
+        offsets.append(len(buf))
+    if len(offsets) > 1:
+        yield _batch(buf, offsets)
+
+
+def _batch(buf, offsets):
+    return np.array([tr.state for tr in buf]), np.array([tr.action for tr in buf]), \
+        np.array([tr.reward for tr in buf], dtype=float), np.array(offsets)
+
+
+def learn(items, learner):
+    """ call learner(*item) for tuple items (batches) or learner(item) otherwise, and pass every item on.
+    """
+    for item in items:
+        if isinstance(item, tuple) and not isinstance(item, Transition):
+            learner(*item)
+        else:
+            learner(item)
+        yield item
+
+
+def td_learner(agent):
+    """ learner of a TD agent driven by rollout, e.g. rlp.temporal_difference.base.SarsaAgent.
+    """
+
+    def learner(tr):
+        agent.set_experience(tr.reward, tr.next_state, tr.done)
+        agent.update()
+
+    return learner
+
+
+def bandit_learner(agent):
+    """ learner of a bandit agent driven by rollout, e.g. rlp.multi_armed_bandits.agents.UCB.
+    """
+
+    def learner(tr):
+        agent.set_experience(tr.reward)
+        agent.update()
+
+    return learner
+
+
+def drain(items):
+    """ consume a pipeline, return the number of items it yielded.
+    """
+    counter = deque(enumerate(items, 1), maxlen=1)
+    return counter[0][0] if counter else 0
@@ -0,0 +1,258 @@
+from rlp.base import BaseAgent
+from rlp.monte_carlo.base import encode_state, STATE_SHAPE
+import numpy as np
+"""
+This module provides tabular one-step TD methods, see chapter 6:
+TD(0) prediction, SARSA, Expected SARSA and Q-learning.
+Values live in arrays indexed by integer states, an encode function maps the states of an
+environment to those integers, e.g. GridWorld.encode.
+Every update is O(n_actions) and allocates no arrays.
+"""
+
+# STATUS
+IN_PROGRESS, TERMINAL = 0, 1
+
+
+def grid_world_encoding(env):
+    """ (n_states, encode) of a GridWorld environment, states are flattened by env.encode.
+    """
+    return env.n_states, env.encode
+
+
+def blackjack_encoding():
+    """ (n_states, encode) of BlackJackEnv states (usable_ace, player_sum, dealer_show).
+    """
+    n_player, n_dealer = STATE_SHAPE[1], STATE_SHAPE[2]
+
+    def encode(state):
+        usable_ace, player, dealer = encode_state(state)
+        return (usable_ace * n_player + player) * n_dealer + dealer
+
+    return int(np.prod(STATE_SHAPE)), encode
+
+
+class TDAgent(BaseAgent):
+    """ Abstract Class for tabular one-step TD agents.
+    The agent is driven by set_state, action, set_experience, update at each step, see run_episode.
+    """
+
+    def __init__(self, n_states, n_actions, alpha, discountRatio, encode=None, seed=None):
+        """
+        Params:
+        n_states - number of states.
+        n_actions - number of actions, actions are 0 .. n_actions - 1.
+        alpha - const step size.
+        discountRatio - discount ratio for returns.
+        encode - function mapping a state to its index in 0 .. n_states - 1, default states are indices.
+        seed - random seed.
+        """
+        super(TDAgent, self).__init__(seed)
+        self.n_states = n_states
+        self.n_actions = n_actions
+        self.alpha = alpha
+        self.discountRatio = discountRatio
+        self.encode = encode if encode is not None else int
+        self.timestep = 0
+
+        self.s = None
+        self.At = None
+        self.Rt = 0.
+        self.s_ = None
+        self.done = False
+
+    def set_state(self, state):
+        self.s = self.encode(state)
+
+    def set_experience(self, reward, new_state, terminal=False):
+        """ Params:
+        reward - reward following the last action.
+        new_state - next state, ignored if terminal.
+        terminal - True if the episode ends with this transition.
+        """
+        self.Rt = reward
+        self.done = terminal
+        self.s_ = None if terminal else self.encode(new_state)
+
+    def reset(self):
+        self.s = None
+        self.At = None
+        self.s_ = None
+        self.done = False
+
+
+class TD0Agent(TDAgent):
+    """ Tabular TD(0) for estimating V of a given policy, page 120.
+    """
+
+    def __init__(self, n_states, n_actions, alpha, discountRatio, policy=None, encode=None, V0=0., seed=None):
+        """
+        Params:
+        policy - float array (n_states, n_actions) of action probabilities, default uniformly random.
+        V0 - initial estimate for state values.
+        See TDAgent for the others.
+        """
+        super(TD0Agent, self).__init__(n_states, n_actions, alpha, discountRatio, encode, seed)
+        if policy is None:
+            policy = np.full((n_states, n_actions), 1 / n_actions)
+        self.policy = np.asarray(policy, dtype=float)
+        self._cum_policy = self.policy.cumsum(axis=1)
+        self.V = np.full(n_states, V0, dtype=float)
+
+    def action(self):
+        cum = self._cum_policy[self.s]
+        self.At = min(int(cum.searchsorted(self.random_state.random_sample() * cum[-1], 'right')),
+                      self.n_actions - 1)
+        return self.At
+
+    def update(self):
+        target = self.Rt
+        if not self.done:
+            target += self.discountRatio * self.V[self.s_]
+        self.V[self.s] += self.alpha * (target - self.V[self.s])
+        self.timestep += 1
+
+
+class TDControlAgent(TDAgent):
+    """ Abstract Class for tabular one-step TD control with an eps-greedy behavior policy.
+    Subclasses define the value of the next state in the target, see _bootstrap.
+    """
+
+    def __init__(self, n_states, n_actions, alpha, discountRatio, eps=0.1, encode=None, Q0=0., seed=None):
+        """
+        Params:
+        eps - prob. of exploration (being totally greedy when eps = 0).
+        Q0 - initial estimate for action values.
+        See TDAgent for the others.
+        """
+        super(TDControlAgent, self).__init__(n_states, n_actions, alpha, discountRatio, encode, seed)
+        self.eps = eps
+        self.Q = np.full((n_states, n_actions), Q0, dtype=float)
+        self._ties = np.empty(n_actions, dtype=bool)
+
+    def greedy_action(self, s):
+        """ argmax_a Q(s, a), ties broken at random.
+        """
+        q = self.Q[s]
+        np.equal(q, q.max(), out=self._ties)
+        n_ties = np.count_nonzero(self._ties)
+        if n_ties == 1:
+            return int(q.argmax())
+        return int(np.flatnonzero(self._ties)[self.random_state.randint(n_ties)])
+
+    def _eps_greedy(self, s):
+        if self.random_state.random_sample() < self.eps:
+            return self.random_state.randint(self.n_actions)
+        return self.greedy_action(s)
+
+    def action(self):
+        self.At = self._eps_greedy(self.s)
+        return self.At
+
+    def update(self):
+        target = self.Rt
+        if not self.done:
+            target += self.discountRatio * self._bootstrap(self.s_)
+        self.Q[self.s, self.At] += self.alpha * (target - self.Q[self.s, self.At])
+        self.timestep += 1
+
+    def _bootstrap(self, s_):
+        """ value of the non-terminal next state s_ used in the TD target.
+        """
+        raise NotImplementedError
+
+
+class SarsaAgent(TDControlAgent):
+    """ SARSA, on-policy TD control, page 130.
+    The next action is chosen in update and taken by the following call of action.
+    """
+
+    def __init__(self, n_states, n_actions, alpha, discountRatio, eps=0.1, encode=None, Q0=0., seed=None):
+        super(SarsaAgent, self).__init__(n_states, n_actions, alpha, discountRatio, eps, encode, Q0, seed)
+        self._next_action = None
+
+    def action(self):
+        if self._next_action is not None:
+            self.At, self._next_action = self._next_action, None
+        else:
+            self.At = self._eps_greedy(self.s)
+        return self.At
+
+    def set_next_action(self, action):
+        """ take action as the next action, the update bootstraps on it and the following call of action returns it,
+        e.g. the recorded next action of replay_episode. None lets the update choose it eps-greedy.
+        """
+        self._next_action = action
+
+    def _bootstrap(self, s_):
+        # the next action may be given already, see set_next_action
+        if self._next_action is None:
+            self._next_action = self._eps_greedy(s_)
+        return self.Q[s_, self._next_action]
+
+    def reset(self):
+        super(SarsaAgent, self).reset()
+        self._next_action = None
+
+
+class ExpectedSarsaAgent(TDControlAgent):
+    """ Expected SARSA, the target takes the expectation over the eps-greedy policy, page 133.
+    """
+
+    def _bootstrap(self, s_):
+        q = self.Q[s_]
+        return (1 - self.eps) * q.max() + self.eps * q.mean()
+
+
+class QLearningAgent(TDControlAgent):
+    """ Q-learning, off-policy TD control, page 131.
+    """
+
+    def _bootstrap(self, s_):
+        return self.Q[s_].max()
+
+
+def run_episode(env, agent, state, max_steps=None):
+    """ Run one episode of a TD agent from state until a terminal status or max_steps.
+    Params:
+    env - environment whose step(state, action) returns (reward, new_state, status).
+    agent - TDAgent object.
+    state - start state.
+    max_steps - max number of steps, default None (until terminal).
+
+    Returns:
+    total reward, number of steps
+    """
+    agent.reset()
+    total, steps = 0, 0
+    status = IN_PROGRESS
+    while status != TERMINAL and (max_steps is None or steps < max_steps):
+        agent.set_state(state)
+        reward, state, status = env.step(state, agent.action())
+        agent.set_experience(reward, state, status == TERMINAL)
+        agent.update()
+        total += reward
+        steps += 1
+    return total, steps
+
+
+def replay_episode(agent, states, actions, rewards, terminal=True):
+    """ Feed a recorded episode, e.g. one of a TrajectoryStore, to a TD agent in place of an environment.
+    The recorded actions are taken, SARSA agents bootstrap on the recorded next action.
+    Params:
+    agent - TDAgent object.
+    states, actions, rewards - arrays (T, ), states as accepted by agent.encode.
+    terminal - True if the episode ended after its last step, False if it was cut.
+    """
+    agent.reset()
+    T = len(actions)
+    for t in range(T):
+        agent.set_state(states[t])
+        agent.At = int(actions[t])
+        last = t == T - 1
+        if last and not terminal:
+            break
+        agent.set_experience(rewards[t], None if last else states[t + 1], last)
+        if isinstance(agent, SarsaAgent):
+            agent.set_next_action(None if last else int(actions[t + 1]))
+        agent.update()
+    return float(np.sum(rewards)), T
@@ -0,0 +1,255 @@
+from .base import TD0Agent, SarsaAgent
+import numpy as np
+"""
+This module provides n-step TD methods (chapter 7) and backward-view TD(lambda) (chapter 12)
+on top of the one-step agents in base.
+n-step agents keep the last n + 1 states, actions and rewards in circular buffers,
+TD(lambda) agents keep the eligibility traces of recently visited entries only,
+so a step costs O(n) or O(number of active traces) rather than O(n_states).
+"""
+
+TRACES = ('accumulating', 'replacing', 'dutch')
+
+
+class NStepBuffer:
+    """ Circular buffers of the last n + 1 states, actions and rewards,
+    S_t and A_t are stored at t % (n + 1), R_t at t % (n + 1) as well.
+    """
+
+    def __init__(self, n, discountRatio):
+        """
+        Params:
+        n - number of steps.
+        discountRatio - discount ratio for returns.
+        """
+        assert n >= 1
+        self.n = n
+        m = n + 1
+        self.states = np.zeros(m, dtype=np.int64)
+        self.actions = np.zeros(m, dtype=np.int64)
+        self.rewards = np.zeros(m)
+        self.discounts = discountRatio ** np.arange(m)
+        # positions of R_{tau + 1} .. R_{tau + n} for each tau % (n + 1)
+        self._windows = (np.arange(m)[:, None] + np.arange(1, m)) % m
+
+    def rewards_sum(self, tau, end):
+        """ \\sum_{i = tau + 1}^{end} \\gamma^{i - tau - 1} R_i, end - tau <= n.
+        """
+        k = end - tau
+        return float(np.dot(self.discounts[:k], self.rewards[self._windows[tau % (self.n + 1), :k]]))
+
+
+class NStepTDAgent(TD0Agent):
+    """ n-step TD for estimating V of a given policy, page 144.
+    """
+
+    def __init__(self, n_states, n_actions, n, alpha, discountRatio, policy=None, encode=None, V0=0., seed=None):
+        """
+        Params:
+        n - number of steps before bootstrapping.
+        See TD0Agent for the others.
+        """
+        super(NStepTDAgent, self).__init__(n_states, n_actions, alpha, discountRatio, policy, encode, V0, seed)
+        self.n = n
+        self.buffer = NStepBuffer(n, discountRatio)
+        self.t = 0
+
+    def update(self):
+        n, m, buf, t = self.n, self.n + 1, self.buffer, self.t
+        buf.states[t % m] = self.s
+        buf.rewards[(t + 1) % m] = self.Rt
+        if self.done:
+            # the episode ends at T = t + 1, update the remaining states
+            for tau in range(max(0, t - n + 1), t + 1):
+                self._update_at(tau, buf.rewards_sum(tau, t + 1))
+        else:
+            buf.states[(t + 1) % m] = self.s_
+            tau = t - n + 1
+            if tau >= 0:
+                G = buf.rewards_sum(tau, tau + n) + buf.discounts[n] * self.V[self.s_]
+                self._update_at(tau, G)
+        self.t += 1
+        self.timestep += 1
+
+    def _update_at(self, tau, G):
+        s = self.buffer.states[tau % (self.n + 1)]
+        self.V[s] += self.alpha * (G - self.V[s])
+
+    def reset(self):
+        super(NStepTDAgent, self).reset()
+        self.t = 0
+
+
+class NStepSarsaAgent(SarsaAgent):
+    """ n-step SARSA, on-policy control, page 147.
+    """
+
+    def __init__(self, n_states, n_actions, n, alpha, discountRatio, eps=0.1, encode=None, Q0=0., seed=None):
+        """
+        Params:
+        n - number of steps before bootstrapping.
+        See TDControlAgent for the others.
+        """
+        super(NStepSarsaAgent, self).__init__(n_states, n_actions, alpha, discountRatio, eps, encode, Q0, seed)
+        self.n = n
+        self.buffer = NStepBuffer(n, discountRatio)
+        self.t = 0
+
+    def update(self):
+        n, m, buf, t = self.n, self.n + 1, self.buffer, self.t
+        buf.states[t % m] = self.s
+        buf.actions[t % m] = self.At
+        buf.rewards[(t + 1) % m] = self.Rt
+        if self.done:
+            for tau in range(max(0, t - n + 1), t + 1):
+                self._update_at(tau, buf.rewards_sum(tau, t + 1))
+        else:
+            q_ = self._bootstrap(self.s_)
+            buf.states[(t + 1) % m] = self.s_
+            buf.actions[(t + 1) % m] = self._next_action
+            tau = t - n + 1
+            if tau >= 0:
+                self._update_at(tau, buf.rewards_sum(tau, tau + n) + buf.discounts[n] * q_)
+        self.t += 1
+        self.timestep += 1
+
+    def _update_at(self, tau, G):
+        i = tau % (self.n + 1)
+        s, a = self.buffer.states[i], self.buffer.actions[i]
+        self.Q[s, a] += self.alpha * (G - self.Q[s, a])
+
+    def reset(self):
+        super(NStepSarsaAgent, self).reset()
+        self.t = 0
+
+
+class EligibilityTraces:
+    """ Sparse eligibility traces, dict: key => trace of the active keys only.
+    Traces decay by decay = gamma * lambda at every visit and are dropped once below cutoff.
+    """
+
+    def __init__(self, decay, trace='accumulating', cutoff=1e-4):
+        """
+        Params:
+        decay - gamma * lambda.
+        trace - 'accumulating', 'replacing' or 'dutch'.
+        cutoff - traces below cutoff are dropped.
+        """
+        assert trace in TRACES, 'unknown trace %s, expected one of %s' % (trace, TRACES)
+        self.decay = decay
+        self.trace = trace
+        self.cutoff = cutoff
+        self.traces = {}
+
+    def visit(self, key, alpha=None):
+        """ decay all traces, then bump the trace of the visited key.
+        Params:
+        alpha - step size, only used by dutch traces.
+        """
+        decay, cutoff = self.decay, self.cutoff
+        old = self.traces.get(key, 0.)
+        traces = {}
+        for k, z in self.traces.items():
+            z *= decay
+            if z >= cutoff:
+                traces[k] = z
+        if self.trace == 'accumulating':
+            traces[key] = decay * old + 1
+        elif self.trace == 'replacing':
+            traces[key] = 1.
+        else:
+            traces[key] = (1 - alpha) * decay * old + 1
+        self.traces = traces
+
+    def apply(self, table, step):
+        """ table[key] += step * trace for every active key.
+        """
+        for k, z in self.traces.items():
+            table[k] += step * z
+
+    def clear(self):
+        self.traces = {}
+
+    def __len__(self):
+        return len(self.traces)
+
+
+class TDLambdaAgent(TD0Agent):
+    """ Backward-view TD(lambda) for estimating V of a given policy, page 293,
+    dutch traces give true online TD(lambda), page 300.
+    """
+
+    def __init__(self, n_states, n_actions, alpha, discountRatio, lambda_, trace='accumulating', cutoff=1e-4,
+                 policy=None, encode=None, V0=0., seed=None):
+        """
+        Params:
+        lambda_ - trace decay parameter.
+        trace - 'accumulating', 'replacing' or 'dutch'.
+        cutoff - traces below cutoff are dropped.
+        See TD0Agent for the others.
+        """
+        super(TDLambdaAgent, self).__init__(n_states, n_actions, alpha, discountRatio, policy, encode, V0, seed)
+        self.lambda_ = lambda_
+        self.traces = EligibilityTraces(discountRatio * lambda_, trace, cutoff)
+        self.v_old = 0.
+
+    def update(self):
+        v = self.V[self.s]
+        v_ = 0. if self.done else self.V[self.s_]
+        delta = self.Rt + self.discountRatio * v_ - v
+        self.traces.visit(self.s, self.alpha)
+        if self.traces.trace == 'dutch':
+            self.traces.apply(self.V, self.alpha * (delta + v - self.v_old))
+            self.V[self.s] -= self.alpha * (v - self.v_old)
+            self.v_old = v_
+        else:
+            self.traces.apply(self.V, self.alpha * delta)
+        if self.done:
+            self.traces.clear()
+        self.timestep += 1
+
+    def reset(self):
+        super(TDLambdaAgent, self).reset()
+        self.traces.clear()
+        self.v_old = 0.
+
+
+class SarsaLambdaAgent(SarsaAgent):
+    """ SARSA(lambda) with traces over (state, action) pairs, page 305,
+    dutch traces give true online SARSA(lambda), page 307.
+    """
+
+    def __init__(self, n_states, n_actions, alpha, discountRatio, lambda_, trace='accumulating', cutoff=1e-4,
+                 eps=0.1, encode=None, Q0=0., seed=None):
+        """
+        Params:
+        lambda_ - trace decay parameter.
+        trace - 'accumulating', 'replacing' or 'dutch'.
+        cutoff - traces below cutoff are dropped.
+        See TDControlAgent for the others.
+        """
+        super(SarsaLambdaAgent, self).__init__(n_states, n_actions, alpha, discountRatio, eps, encode, Q0, seed)
+        self.lambda_ = lambda_
+        self.traces = EligibilityTraces(discountRatio * lambda_, trace, cutoff)
+        self.q_old = 0.
+
+    def update(self):
+        key = (self.s, self.At)
+        q = self.Q[key]
+        q_ = 0. if self.done else self._bootstrap(self.s_)
+        delta = self.Rt + self.discountRatio * q_ - q
+        self.traces.visit(key, self.alpha)
+        if self.traces.trace == 'dutch':
+            self.traces.apply(self.Q, self.alpha * (delta + q - self.q_old))
+            self.Q[key] -= self.alpha * (q - self.q_old)
+            self.q_old = q_
+        else:
+            self.traces.apply(self.Q, self.alpha * delta)
+        if self.done:
+            self.traces.clear()
+        self.timestep += 1
+
+    def reset(self):
+        super(SarsaLambdaAgent, self).reset()
+        self.traces.clear()
+        self.q_old = 0.
@@ -0,0 +1,52 @@
+from rlp.action_value_approximation.base import *
+from rlp.action_value_approximation.tile_coding import IHT, TileCoder, tiles
+from rlp.temporal_difference.base import run_episode
+import numpy as np
+
+
+def test_tile_coding():
+    coder = TileCoder((0., 0.), (1., 1.), n_tilings=8, n_tiles=4, size=4096)
+    a = coder((0.5, 0.5), ZERO)
+    assert a.shape == (8, ) and len(set(a)) == 8
+    assert np.array_equal(coder((0.5, 0.5), ZERO), a)
+    # nearby states share most tiles, far away ones none, other actions none
+    assert len(set(coder((0.52, 0.5), ZERO)) & set(a)) >= 6
+    assert not set(coder((0.05, 0.95), ZERO)) & set(a)
+    assert not set(coder((0.5, 0.5), FORWARD)) & set(a)
+
+    # the table never grows past its size, later tiles are hashed into it
+    iht = IHT(32)
+    for x in np.linspace(0, 10, 200):
+        indices = tiles(iht, 4, [x])
+        assert all(0 <= i < 32 for i in indices)
+    assert iht.count() == 32 and iht.full() and iht.overfull_count > 0
+    assert tiles(iht, 4, [100.], read_only=True) == [None] * 4
+
+
+def test_semi_gradient_sarsa_mountain_car():
+    env = MountainCarEnv(seed=0)
+    agent = SemiGradientSarsaAgent(env.tile_coder(), len(ACTIONS), alpha=0.5, discountRatio=1, seed=0)
+    steps = [run_episode(env, agent, env.reset())[1] for episode in range(50)]
+    assert np.mean(steps[-10:]) < 0.2 * steps[0]
+    assert agent.coder.iht.count() <= agent.coder.size
+    # q is the sum of the active weights
+    state = env.reset()
+    assert np.isclose(agent.q_values(state)[FORWARD], agent.w[agent.coder(state, FORWARD)].sum())
+
+
+def test_sarsa_keeps_next_action_of_equal_state():
+    env = MountainCarEnv(seed=0)
+    agent = SemiGradientSarsaAgent(env.tile_coder(), len(ACTIONS), alpha=0.5, discountRatio=1, eps=1., seed=0)
+    state = env.reset()
+    agent.set_state(state)
+    reward, new_state, status = env.step(state, agent.action())
+    agent.set_experience(reward, new_state)
+    agent.update()
+    chosen = agent._next_action
+    # an equal state built anew is still the next state of the update
+    agent.set_state(np.array(new_state))
+    assert agent.action() == chosen
+
+
+if __name__ == '__main__':
+    test_semi_gradient_sarsa_mountain_car()
@@ -1,6 +1,10 @@
 from rlp.dynamic_programming.solver import JackCarRentalSolver, DPGridWorldSolver
 from rlp.dynamic_programming.base import JackCarRentalAgent, JackCarRentalEnv, DPGridWorldAgent, DPGridWorldEnv
 from rlp import utilis
+from rlp.mdps import MDP
+from rlp.grid_world import ACTIONS, UP, DOWN, LEFT, IN_PROGRESS, TERMINAL
+import numpy as np
+import time
 
 def test_jack_car_rental():
     agent = JackCarRentalAgent(discountRatio=0.9)
@@ -14,12 +18,217 @@ def test_jack_car_rental():
         policy = solver.agent.policy
 
 
+def test_jack_car_rental_capacity():
+    agent = JackCarRentalAgent(discountRatio=0.9, capacity=8, max_move=3)
+    env_model = JackCarRentalEnv((3, 4), (3, 2), capacity=8)
+    assert len(agent.V) == 81 and max(len(acts) for acts in agent.policy.values()) == 7
+
+    # the structured model agrees with the one built from prob_next_state_n_reward
+    model = env_model.compile(agent.policy)
+    reference = MDP._compile(env_model, agent.policy)
+    V = np.random.RandomState(0).randn(model.n_states)
+    assert np.allclose(model.q_values(V, 0.9)[model.mask], reference.q_values(V, 0.9)[model.mask])
+
+    values = {}
+    for backend in ('dict', 'numpy'):
+        agent = JackCarRentalAgent(discountRatio=0.9, capacity=8, max_move=3)
+        JackCarRentalSolver(agent, env_model, threshold=1e-6, backend=backend).policy_iteration()
+        values[backend] = agent.V
+    for state in values['dict']:
+        assert np.isclose(values['dict'][state], values['numpy'][state], atol=1e-4)
+
+
+def test_compiled_model():
+    env_model = DPGridWorldEnv(4, 5, terminals=[(0, 0), (3, 4)])
+    agent = DPGridWorldAgent(4, 5, discountRatio=0.9)
+    model = env_model.compile(agent.policy)
+    assert model.n_states == 20 and model.n_actions == 4
+    assert model.mask.all()
+    assert env_model.compile(agent.policy) is model
+
+    V = np.arange(model.n_states, dtype=float)
+    Q = model.q_values(V, 0.9)
+    for s, state in enumerate(model.states):
+        for a, action in enumerate(model.actions):
+            expected = sum(p * (r + 0.9 * V[model.state_index[nextState]])
+                           for (nextState, r), p in env_model.prob_next_state_n_reward(state, action).items())
+            assert np.isclose(Q[s, a], expected)
+
+
+def test_compile_cache_follows_model_params():
+    agent = JackCarRentalAgent(discountRatio=0.9, capacity=5, max_move=2)
+    env_model = JackCarRentalEnv((3, 4), (3, 2), capacity=5)
+    solver = JackCarRentalSolver(agent, env_model, backend='numpy')
+    model = solver.compiled_model()
+    env_model.rental_lams = (1, 1)
+    recompiled = solver.compiled_model()
+    assert recompiled is not model and recompiled is env_model.compile(agent.policy)
+    assert not np.allclose(recompiled.R, model.R)
+    assert np.allclose(recompiled.R, JackCarRentalEnv((1, 1), (3, 2), capacity=5).compile(agent.policy).R)
+
+    env_model = DPGridWorldEnv(3, 3, terminals=[(0, 0)])
+    grid_agent = DPGridWorldAgent(3, 3, discountRatio=0.9)
+    model = env_model.compile(grid_agent.policy)
+    env_model.terminal_states = [(2, 2)]
+    assert not np.array_equal(env_model.compile(grid_agent.policy).R, model.R)
+
+
+def test_grid_world_tables():
+    env_model = DPGridWorldEnv(4, 5, terminals=[(0, 0), (3, 4)])
+    assert env_model.step((0, 1), LEFT) == (0, (0, 0), TERMINAL)
+    assert env_model.step((0, 3), UP) == (-1, (0, 3), IN_PROGRESS)
+    assert env_model.step((3, 4), DOWN) == (0, (3, 4), TERMINAL)
+
+    states = np.repeat(np.arange(20), 4)
+    actions = np.tile(ACTIONS, 20)
+    rewards, next_states, status = env_model.step_batch(states, actions)
+    for s, a, r, s_, done in zip(states, actions, rewards, next_states, status):
+        assert env_model.step(env_model.decode(s), a) == (r, env_model.decode(s_), done)
+
+    # the table-based rows match the generic ones built from prob_next_state_n_reward
+    agent = DPGridWorldAgent(4, 5, discountRatio=0.9)
+    states_, actions_, _ = MDP.enumerate(agent.policy)
+    fast = env_model.compile_rows(states_, actions_, agent.policy)
+    generic = MDP.compile_rows(env_model, states_, actions_, agent.policy)
+    for x, y in zip(fast, generic):
+        assert np.array_equal(x, y)
+
+
+def test_numpy_backend_matches_dict():
+    terminals = [(0, 0), (5, 6)]
+    results = {}
+    for backend in ('dict', 'numpy'):
+        agent = DPGridWorldAgent(6, 7, discountRatio=0.9)
+        env_model = DPGridWorldEnv(6, 7, terminals=terminals)
+        solver = DPGridWorldSolver(agent, env_model, threshold=1e-8, backend=backend)
+        for k in range(3):
+            solver.policy_eval()
+            solver.policy_improve()
+        results[backend] = agent
+
+    for state in results['dict'].V:
+        assert np.isclose(results['dict'].V[state], results['numpy'].V[state], atol=1e-5)
+        assert results['dict'].policy[state] == results['numpy'].policy[state]
+
+
+def test_iteration_drivers():
+    terminals = [(0, 0), (4, 5)]
+    stats, values = {}, {}
+    for backend in ('dict', 'numpy'):
+        for name in ('policy_iteration', 'modified_policy_iteration', 'value_iteration'):
+            agent = DPGridWorldAgent(5, 6, discountRatio=0.9)
+            solver = DPGridWorldSolver(agent, DPGridWorldEnv(5, 6, terminals=terminals),
+                                       threshold=1e-8, backend=backend)
+            if name == 'modified_policy_iteration':
+                stats[(backend, name)] = solver.modified_policy_iteration(k=3)
+            else:
+                stats[(backend, name)] = getattr(solver, name)()
+            values[(backend, name)] = agent.V
+            assert solver.policy_improve()
+
+    for key in stats:
+        assert stats[key]['sweeps'] > 0 and stats[key]['wall_time'] >= 0
+        for state in values[key]:
+            assert np.isclose(values[key][state], values[('dict', 'policy_iteration')][state], atol=1e-5)
+    assert stats[('numpy', 'value_iteration')]['sweeps'] < stats[('numpy', 'policy_iteration')]['sweeps']
+
+
+def test_async_backends():
+    terminals = [(0, 0)]
+    agent = DPGridWorldAgent(20, 20, discountRatio=1)
+    env_model = DPGridWorldEnv(20, 20, terminals=terminals)
+    DPGridWorldSolver(agent, env_model, backend='numpy').value_iteration()
+    optimal = dict(agent.V)
+
+    backups = {}
+    for backend in ('numpy', 'gauss_seidel', 'prioritized'):
+        for state in agent.V:
+            agent.V[state] = 0
+        solver = DPGridWorldSolver(agent, env_model, threshold=1e-6, backend=backend)
+        solver.policy_eval()
+        backups[backend] = solver.backups
+        for state in agent.V:
+            assert np.isclose(agent.V[state], optimal[state], atol=1e-4)
+    # a greedy policy is evaluated within 2 ordered sweeps
+    assert backups['gauss_seidel'] == 2 * 400
+    assert backups['prioritized'] < backups['numpy'] / 5
+
+
+def test_backup_cost_is_linear():
+    # the compiled model is looked up once per sweep, a sweep over 16 times the states takes about 16 times longer
+    for backend in ('dict', 'gauss_seidel', 'prioritized'):
+        times = []
+        for n in (15, 60):
+            solver = DPGridWorldSolver(DPGridWorldAgent(n, n, discountRatio=0.9),
+                                       DPGridWorldEnv(n, n, terminals=[(0, 0)]), backend=backend)
+            solver.policy_eval(max_sweeps=1)
+            best = np.inf
+            for _ in range(3):
+                start = time.perf_counter()
+                solver.policy_eval(max_sweeps=1)
+                best = min(best, time.perf_counter() - start)
+            times.append(best)
+        assert times[1] < 48 * times[0], backend
+
+
+def test_parallel_backend():
+    terminals = [(0, 0), (4, 5)]
+    values = {}
+    for backend in ('numpy', 'parallel'):
+        agent = DPGridWorldAgent(5, 6, discountRatio=0.9)
+        solver = DPGridWorldSolver(agent, DPGridWorldEnv(5, 6, terminals=terminals),
+                                   threshold=1e-8, backend=backend, n_workers=2)
+        stats = solver.policy_iteration()
+        solver.close()
+        values[backend] = (agent.V, agent.policy, stats['sweeps'])
+
+    assert values['numpy'][2] == values['parallel'][2]
+    assert values['numpy'][1] == values['parallel'][1]
+    for state in values['numpy'][0]:
+        assert np.isclose(values['numpy'][0][state], values['parallel'][0][state])
+
+
+def test_parallel_close_after_failure():
+    agent = DPGridWorldAgent(3, 3, discountRatio=0.9)
+    solver = DPGridWorldSolver(agent, DPGridWorldEnv(3, 3, terminals=[(0, 0)]), backend='parallel', n_workers=2)
+    sweeper = solver.parallel_sweeper()
+    workers = list(sweeper.workers)
+    # a failed worker aborts the barrier
+    sweeper._barrier.abort()
+    solver.close()
+    solver.close()
+    assert not sweeper.workers and not any(worker.is_alive() for worker in workers)
+
+
 def test_possion():
-    # print(utilis.possion_prob(1, 2))
-    # print(utilis.possion_prob(2, 2))
-    print(utilis.possion_prob(0, 2, truncate_threshold=0))
-    print(utilis.possion_prob.memo)
-    print(utilis.possion_prob.factorial)
+    assert np.isclose(utilis.possion_prob(2, 2), 2 * np.exp(-2))
+    assert np.isclose(utilis.possion_prob(20, 10), np.exp(20 * np.log(10) - 10 - np.sum(np.log(np.arange(1, 21)))))
+    assert utilis.possion_prob(0, 2, truncate_threshold=0) == 1
+    tail = utilis.possion_prob(5, 3, truncate_threshold=5)
+    assert np.isclose(tail, 1 - sum(utilis.possion_prob(i, 3) for i in range(5)))
+    assert np.isclose(utilis.truncated_poisson(3, 5).sum(), 1)
+    assert np.allclose(np.exp(utilis.poisson_log_pmf(4, 10)), utilis.poisson_pmf(4, 10))
+    # the deep tail keeps its precision, P{X >= 40} of Poisson(3) is about 8.0031e-31
+    assert np.isclose(utilis.poisson_tail(3, 40)[40], 8.003095092521891e-31, rtol=1e-12, atol=0)
+
+
+def test_argmax():
+    assert utilis.argmax([1, 3, 2, 3]) == [1, 3]
+    assert utilis.argmax({'a': 0, 'b': -1, 'c': 0}) == ['a', 'c']
+    assert utilis.argmax(np.array([0., 2., 2.])) == [1, 2]
+    assert utilis.argmax(np.array([[1, 1], [0, 2]])).tolist() == [[True, True], [False, True]]
+
+    random_state = np.random.RandomState(0)
+    picks = set(utilis.random_argmax([5, 1, 5, 5], random_state) for i in range(100))
+    assert picks == {0, 2, 3}
+    rows = np.array([[1., 1., 0.]] * 1000)
+    counts = np.bincount(utilis.random_argmax(rows, np.random.default_rng(0)), minlength=3)
+    assert counts[2] == 0 and 400 < counts[0] < 600
+
+    Q = np.array([[1., 1.], [0., 2.]])
+    assert utilis.one_hot_argmax(Q).tolist() == [[1, 0], [0, 1]]
+    assert utilis.one_hot_argmax(Q, keep=np.array([1, 0])).tolist() == [[0, 1], [0, 1]]
+
 
 def main():
     # test_possion()
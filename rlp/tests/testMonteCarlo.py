@@ -1,18 +1,167 @@
 from rlp.monte_carlo.base import *
 
 
-if __name__ == '__main__':
-    # agent = NaiveBlackJackAgent()
-    agent = AdvancedBlackJackAgent()
-    env = BlackJackEnv()
+def test_first_visit_and_every_visit():
+    # a made-up episode which visits state a twice
+    a, b = (0, 13, 5), (1, 15, 'A')
+    for first_visit, expected in ((True, 3.), (False, (3. + 2.) / 2)):
+        agent = NaiveBlackJackAgent(discountRatio=1, first_visit=first_visit)
+        for state, reward in ((a, 1), (b, 0), (a, 0), (b, 2)):
+            agent.set_state(state)
+            agent.set_experience(reward, None)
+        agent.update()
+        assert agent.V[a] == expected
+        assert agent.V[b] == 2.
+        assert agent.visit_counts[a] == (1 if first_visit else 2)
+
+
+def test_incremental_mean():
+    agent = NaiveBlackJackAgent(discountRatio=1)
+    state = (0, 20, 10)
+    for reward in (1, -1, 1, 1):
+        agent.reset()
+        agent.set_state(state)
+        agent.set_experience(reward, None)
+        agent.update()
+    assert agent.V[state] == 0.5 and agent.visit_counts[state] == 4
+
+
+def test_state_encoding():
+    for state in STATES:
+        assert decode_state(encode_state(state)) == state
+    assert len(set(STATES)) == len(STATES) == np.prod(STATE_SHAPE)
+    assert encode_state((1, 12, 'A')) == (1, 0, 0) and encode_state((0, 21, 10)) == (0, 9, 9)
+    assert (0, 11, 5) not in NaiveBlackJackAgent().V
+
+
+def test_table_views():
+    agent = AdvancedBlackJackAgent(discountRatio=1, seed=0)
+    state = (1, 18, 'A')
+    agent.Q[state][STICK] += 2
+    assert agent.Q_table[1, 6, 0, STICK] == 2
+    assert dict(agent.policy)[state] == {HIT: 0.5, STICK: 0.5}
+
+    agent.set_state(state)
+    agent.action_ = HIT
+    agent.set_experience(-1, None)
+    agent.update()
+    assert agent.Q[state][HIT] == -1 and agent.visit_counts[state][HIT] == 1
+    assert agent.policy[state] == {HIT: 0, STICK: 1}
+
+
+def test_dict_api():
+    # the dict code of the notebooks, e.g. parse_policy of Chapter 5, keeps working on the views
+    agent = AdvancedBlackJackAgent(discountRatio=1, seed=0)
+    state = (0, 20, 10)
+    assert [k for k, v in agent.policy[state].items() if v != 0] == ACTIONS
+    assert list(agent.policy[state]) == list(agent.Q[state].keys()) == ACTIONS
+    assert sum(agent.policy[state].values()) == 1 and HIT in agent.Q[state] and 2 not in agent.Q[state]
+
+    agent.policy[state] = {HIT: 0, STICK: 1}
+    agent.Q[state][HIT] = -1
+    assert agent.policy_table[0, 8, 9].tolist() == [0, 1] and agent.Q_table[0, 8, 9, HIT] == -1
+    assert utilis.argmax(agent.Q[state]) == [STICK] and agent.policy[state].get(STICK) == 1
+    assert np.array_equal(np.asarray(agent.policy[state]), [0, 1])
+
+
+def test_batched_env():
+    agent = NaiveBlackJackAgent(discountRatio=1)
+    states, actions, rewards, offsets = BatchedBlackJackEnv(seed=0).simulate(agent.policy_table, 2000)
+    again = BatchedBlackJackEnv(seed=0).simulate(agent.policy_table, 2000)
+    assert all(np.array_equal(x, y) for x, y in zip((states, actions, rewards, offsets), again))
+    assert offsets[0] == 0 and offsets[-1] == len(states) and np.all(np.diff(offsets) >= 1)
+    # the naive agent hits below 20, rewards come at the end of an episode
+    assert np.array_equal(actions, np.where(states[:, 1] >= 8, STICK, HIT))
+    assert np.all(np.delete(rewards, offsets[1:] - 1) == 0)
 
-    for episode in range(1000):
+    # a batch update averages the same returns as updating after each episode
+    sequential = NaiveBlackJackAgent(discountRatio=0.9)
+    for i in range(len(offsets) - 1):
+        sequential.reset()
+        for t in range(offsets[i], offsets[i + 1]):
+            sequential.set_state(decode_state(states[t]))
+            sequential.set_experience(rewards[t], None)
+        sequential.update()
+    batched = NaiveBlackJackAgent(discountRatio=0.9)
+    batched.update_batch(states, actions, rewards, offsets)
+    assert np.array_equal(batched.count_table, sequential.count_table)
+    assert np.allclose(batched.V_table, sequential.V_table)
+
+
+def test_batched_env_matches_scalar_env():
+    n_episodes = 20000
+    batched = NaiveBlackJackAgent(discountRatio=1)
+    states, actions, rewards, offsets = BatchedBlackJackEnv(seed=0).simulate(batched.policy_table, n_episodes)
+    batched.update_batch(states, actions, rewards, offsets)
+
+    looped = NaiveBlackJackAgent(discountRatio=1)
+    env = BlackJackEnv(seed=0)
+    np.random.seed(0)
+    total = 0
+    for episode in range(n_episodes):
+        state = env.reset()
+        looped.reset()
+        status = IN_PROGRESS
+        while status != TERMINAL:
+            looped.set_state(state)
+            reward, state, status = env.step(state, looped.action())
+            looped.set_experience(reward, state)
+            total += reward
+        looped.update()
+
+    assert abs(rewards.sum() - total) / n_episodes < 0.03
+    # a 21 reached by hits is no natural in either simulator, V(0, 21, .) is about 0.88
+    assert abs(batched.V_table[0, 9].mean() - looped.V_table[0, 9].mean()) < 0.04
+    assert np.allclose(batched.V_table[:, 4:], looped.V_table[:, 4:], atol=0.3)
+
+
+def test_off_policy_prediction():
+    a, b, c = (1, 13, 2), (1, 20, 2), (1, 15, 2)
+    # the target sticks on 20 or 21, the behavior is uniformly random
+    episodes = [[(a, HIT, 0), (b, STICK, 1)], [(a, HIT, 0), (c, STICK, 1)]]
+    agents = dict((weighted, OffPolicyBlackJackAgent(weighted=weighted, discountRatio=1))
+                  for weighted in (True, False))
+    for episode in episodes:
+        for agent in agents.values():
+            agent.reset()
+            for state, action, reward in episode:
+                agent.set_state(state)
+                agent.action_ = action
+                agent.set_experience(reward, None)
+            agent.update()
+
+    weighted, ordinary = agents[True], agents[False]
+    assert weighted.Q[b][STICK] == 1 and weighted.Q[c][STICK] == 1
+    # the ratio of the second episode is zero after c, weighted IS leaves a untouched
+    assert weighted.Q[a][HIT] == 1 and weighted.C[a][HIT] == 2
+    # ordinary IS averages rho * G = 2 and 0
+    assert ordinary.Q[a][HIT] == 1 and ordinary.visit_counts[a][HIT] == 2
+
+
+def test_off_policy_control():
+    env = BlackJackEnv(seed=0)
+    agent = OffPolicyControlBlackJackAgent(discountRatio=1, seed=0)
+    np.random.seed(0)
+    for episode in range(2000):
         state = env.reset()
         agent.reset()
         status = IN_PROGRESS
         while status != TERMINAL:
             agent.set_state(state)
-            action = agent.action()
-            reward, state, status = env.react(state, action)
+            reward, state, status = env.step(state, agent.action())
             agent.set_experience(reward, state)
         agent.update()
+    assert np.all(agent.policy_table.sum(axis=-1) == 1)
+    assert agent.policy[(1, 21, 10)][STICK] == 1
+    assert np.all(agent.C_table >= 0)
+
+
+if __name__ == '__main__':
+    from rlp.rollout import rollout, encode_states, episode_batches, learn, drain
+    # agent = NaiveBlackJackAgent()
+    agent = AdvancedBlackJackAgent()
+    env = BlackJackEnv()
+
+    # the policy is improved after every 100 episodes
+    drain(learn(episode_batches(encode_states(rollout(env, agent, n_episodes=1000), encode_state), 100),
+                agent.update_batch))
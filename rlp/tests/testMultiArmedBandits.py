@@ -1,8 +1,10 @@
 import numpy as np
-from rlp.envs import MultiArmedBandit
-from rlp.agents import UCB, GradientBandit, EpsGreedy
-import matplotlib.pyplot as plt
-from tqdm import tqdm
+from rlp.multi_armed_bandits.envs import MultiArmedBandit, BatchedMultiArmedBandit
+from rlp.multi_armed_bandits.agents import UCB, GradientBandit, EpsGreedy, EpsGreedyConstStep, \
+    BatchedEpsGreedy, BatchedUCB, BatchedGradientBandit
+from rlp.multi_armed_bandits.testbed import BanditTestbed, run_experiments
+from rlp.rollout import rollout, learn, bandit_learner, drain
+from rlp import utilis
 
 
 def getCumOptActRate(actions, optimal):
@@ -26,6 +28,7 @@ def getCumAvgRewards(rewards):
 
 
 def draw(stats):
+    import matplotlib.pyplot as plt
     _, ax = plt.subplots(nrows=2, sharex=True, figsize=(8, 8))
     ax = ax.ravel()
     for i in range(2):
@@ -40,60 +43,51 @@ def draw(stats):
     plt.show()
 
 
+def runAgent(bandit, agent, n_timesteps):
+    """run an agent on a bandit for n_timesteps steps.
+    ===================
+    params:
+    bandit - MultiArmedBandit object
+    agent - bandit agent object
+    n_timesteps - number of steps
+    """
+    drain(learn(rollout(bandit, agent, n_steps=n_timesteps), bandit_learner(agent)))
+    cum_rewards = getCumAvgRewards(agent.rewards)
+    optimal_action_rate = getCumOptActRate(agent.actions, np.argmax(bandit.reward_dist_means))
+    return cum_rewards, optimal_action_rate
+
+
 def runGreedy(n_timesteps, eps):
     means = np.random.normal(0, 1, 5)
     stds = np.ones(5)
-    # assign inital action value estimates Q0 as 5 (over-optimistic)
     initQ = np.zeros((5, ))
 
     bandit = MultiArmedBandit(k=5, means=means, stds=stds)
-    agent = EpsGreedy(eps=0.1, Q0=initQ)
-    for _ in range(n_timesteps):
-        # pdb.set_trace()
-        At = agent.action()
-        print('choose ', At)
-        Rt = bandit.reward(At)
-        agent.get_reward(Rt)
-        agent.update()
+    agent = EpsGreedy(eps=eps, Q0=initQ)
+    return runAgent(bandit, agent, n_timesteps)
 
 
 def runUCB(n_timesteps, c):
     means = np.random.normal(0, 1, 10)
     stds = np.ones(10)
-    # assign inital action value estimates Q0 as 5 (over-optimistic)
     initQ = np.zeros((10, ))
 
     bandit = MultiArmedBandit(k=10, means=means, stds=stds)
     agent = UCB(alpha=0.2, conf_level=c, Q0=initQ)
-    for _ in range(n_timesteps):
-        # pdb.set_trace()
-        At = agent.action()
-        Rt = bandit.reward(At)
-        agent.get_reward(Rt)
-        agent.update()
-
-    cum_rewards = getCumAvgRewards(agent.rewards)
-    optimal_action_rate = getCumOptActRate(agent.actions, np.argmax(means))
-    return cum_rewards, optimal_action_rate, agent
+    return runAgent(bandit, agent, n_timesteps) + (agent, )
 
 
 def runGB(n_timesteps):
     means = np.random.normal(5, 1, 10)
     stds = np.ones(10)
-    # assign inital action value estimates Q0 as 5 (over-optimistic)
     initH = np.random.randn(10)
 
     bandit = MultiArmedBandit(k=10, means=means, stds=stds)
     agent = GradientBandit(H0=initH, alpha=0.2)
-    for _ in range(n_timesteps):
-        # pdb.set_trace()
-        At = agent.action()
-        Rt = bandit.reward(At)
-        agent.get_reward(Rt)
-        agent.update()
+    return runAgent(bandit, agent, n_timesteps)
 
 
-def runUCB(n_timesteps, isUCB):
+def runUCBOrEpsGreedy(n_timesteps, isUCB):
     means = np.random.normal(0, 1, 10)
     stds = np.ones(10)
     initQ = np.zeros(10)
@@ -101,38 +95,106 @@ def runUCB(n_timesteps, isUCB):
     bandit = MultiArmedBandit(k=10, means=means, stds=stds)
     agent = UCB(alpha=0.2, conf_level=5, Q0=initQ) if isUCB else EpsGreedyConstStep(
         alpha=0.2, eps=0.1, Q0=initQ)
-    for _ in range(n_timesteps):
-        At = agent.action()
-        Rt = bandit.reward(At)
-        agent.get_reward(Rt)
-        agent.update()
-
-    cum_rewards = getCumAvgRewards(agent.rewards)
-    optimal_action_rate = getCumOptActRate(agent.actions, np.argmax(means))
-
-    return cum_rewards, optimal_action_rate
+    return runAgent(bandit, agent, n_timesteps)
+
+
+def test_drivers():
+    np.random.seed(0)
+    for cum_rewards, optimal_action_rate in (runGreedy(50, 0.1), runUCB(50, 2)[:2], runGB(50),
+                                              runUCBOrEpsGreedy(50, False)):
+        assert cum_rewards.shape == optimal_action_rate.shape == (50, )
+
+
+def test_history_ring_buffer():
+    bandit = MultiArmedBandit(k=5, means=np.arange(5.), stds=np.ones(5), seed=0)
+    full = GradientBandit(H0=np.zeros(5), alpha=0.1, baseline=True, seed=1)
+    ring = GradientBandit(H0=np.zeros(5), alpha=0.1, baseline=True, seed=1, history_size=10)
+    silent = GradientBandit(H0=np.zeros(5), alpha=0.1, baseline=True, seed=1, record_history=False)
+    rewards = []
+    for _ in range(100):
+        Rt = bandit.act(full.action())
+        rewards.append(Rt)
+        for agent in (full, ring, silent):
+            if agent is not full:
+                agent.action()
+            agent.set_experience(Rt)
+            agent.update()
+
+    assert np.allclose(full.rewards, rewards)
+    assert np.allclose(ring.rewards, rewards[-10:]) and len(ring.actions) == 10
+    assert len(silent.rewards) == 0
+    for agent in (full, ring, silent):
+        assert agent.rewards.count == 100
+        assert np.isclose(agent.rewards.mean, np.mean(rewards))
+    assert np.allclose(full.Hs, ring.Hs) and np.allclose(full.Hs, silent.Hs)
+
+
+def test_batched_testbed():
+    n_runs, k = 200, 10
+    means = np.random.RandomState(0).normal(0, 1, (n_runs, k))
+    bandit = BatchedMultiArmedBandit(n_runs, k, means, np.ones(k), seed=1)
+    agent = BatchedEpsGreedy(eps=0.1, Q0=np.zeros(k), n_runs=n_runs, seed=2)
+    avg_rewards, opt_act_rate = BanditTestbed(bandit, agent).run(500)
+    assert avg_rewards.shape == opt_act_rate.shape == (500, )
+    assert opt_act_rate[-100:].mean() > opt_act_rate[:10].mean()
+    assert agent.action_cnt.sum() == n_runs * 500
+
+
+def test_batched_ucb_tries_every_arm_first():
+    n_runs, k = 50, 5
+    bandit = BatchedMultiArmedBandit(n_runs, k, np.zeros(k), np.ones(k), seed=1)
+    agent = BatchedUCB(alpha=0.1, conf_level=2, Q0=np.zeros(k), n_runs=n_runs, seed=2)
+    testbed = BanditTestbed(bandit, agent)
+    for _ in range(k):
+        testbed.step()
+    assert (agent.action_cnt == 1).all()
+
+
+def test_batched_gradient_bandit():
+    n_runs, k = 50, 4
+    bandit = BatchedMultiArmedBandit(n_runs, k, np.arange(k) + 4., np.ones(k), seed=1)
+    agent = BatchedGradientBandit(H0=np.zeros(k), alpha=0.1, n_runs=n_runs, baseline=True, seed=2)
+    avg_rewards, opt_act_rate = BanditTestbed(bandit, agent).run(300)
+    assert np.allclose(agent.prob.sum(axis=1), 1)
+    assert opt_act_rate[-50:].mean() > 0.5
+
+
+def test_softmax():
+    H = np.array([[1000., 1000., 0.], [1., 2., 3.]])
+    prob = utilis.softmax(H, axis=1)
+    assert np.allclose(prob[0], [0.5, 0.5, 0]) and np.allclose(prob.sum(axis=1), 1)
+    assert np.allclose(utilis.softmax(H[1]), np.exp(H[1]) / np.exp(H[1]).sum())
+    assert np.allclose(utilis.softmax(H, axis=0)[:, 0], [1, 0])
+    assert np.allclose(np.exp(utilis.log_softmax(H, axis=1, temperature=2.)),
+                       utilis.softmax(H, axis=1, temperature=2.))
+    out = np.empty_like(H)
+    assert utilis.softmax(H, axis=1, out=out) is out and np.array_equal(out, prob)
+
+
+def test_run_experiments_deterministic():
+    settings = {
+        'UCB c=2': (UCB, {'alpha': 0.1, 'conf_level': 2, 'Q0': np.zeros(10)}),
+        'gradient': (GradientBandit, {'H0': np.zeros(10), 'alpha': 0.1, 'baseline': True}),
+    }
+    serial = run_experiments(settings, n_runs=6, n_timesteps=50, n_workers=1, seed=7)
+    parallel = run_experiments(settings, n_runs=6, n_timesteps=50, n_workers=2, seed=7)
+    for conf in settings:
+        assert np.array_equal(serial[conf][0], parallel[conf][0])
+        assert np.array_equal(serial[conf][1], parallel[conf][1])
+        assert serial[conf][0].shape == (50, )
 
 
 def main():
     nRuns = 100
     nTimeStep = 5000
-    UCBStats = {}
-    cumRewardMat = np.zeros((nRuns, nTimeStep))
-    cumOptActRateMat = np.zeros((nRuns, nTimeStep))
-
     settings = {
-        'UCB c=2': True,
+        'UCB c=2': (UCB, {'alpha': 0.2, 'conf_level': 2, 'Q0': np.zeros(10)}),
+        'eps-greedy eps=0.1': (EpsGreedyConstStep, {'alpha': 0.2, 'eps': 0.1, 'Q0': np.zeros(10)}),
     }
 
-    for conf, isUCB in tqdm(settings.items(), desc='loop over settings'):
-        cumRewardMat = np.zeros((nRuns, nTimeStep))
-        cumOptActRateMat = np.zeros((nRuns, nTimeStep))
-        for i in tqdm(range(nRuns), desc='repeat exps', leave=False):
-            cumRewardMat[i], cumOptActRateMat[i] = runUCB(nTimeStep, isUCB)
-        UCBStats[conf] = (cumRewardMat.mean(axis=0),
-                          cumOptActRateMat.mean(axis=0))
-
-    draw(UCBStats)
+    stats = run_experiments(settings, nRuns, nTimeStep, seed=0)
+    draw(dict((conf, (getCumAvgRewards(rewards), getCumAvgRewards(optRate)))
+              for conf, (rewards, optRate) in stats.items()))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,55 @@
+from rlp.policy_gradient_approximation.corridor import *
+import numpy as np
+
+
+def test_corridor():
+    env = Corridor(seed=0)
+    assert env.step(0, LEFT) == (-1, 0, IN_PROGRESS) and env.step(0, RIGHT) == (-1, 1, IN_PROGRESS)
+    # actions are switched in state 1
+    assert env.step(1, LEFT) == (-1, 2, IN_PROGRESS) and env.step(1, RIGHT) == (-1, 0, IN_PROGRESS)
+    assert env.step(2, RIGHT) == (-1, GOAL, TERMINAL)
+    ps = np.linspace(0.01, 0.99, 99)
+    values = [Corridor.start_value(p) for p in ps]
+    assert np.isclose(ps[np.argmax(values)], 0.59) and np.isclose(max(values), -11.6, atol=0.1)
+
+
+def test_reinforce_update():
+    agent = ReinforceAgent(alpha=0.1, discountRatio=0.9, theta0=(0., 0.))
+    episode = [RIGHT, LEFT, RIGHT, RIGHT]
+    for action in episode:
+        agent.At = action
+        agent.set_experience(-1, None)
+    pi = agent.pi.copy()
+    expected = np.zeros(2)
+    for t, action in enumerate(episode):
+        G = sum(-0.9 ** k for k in range(len(episode) - t))
+        expected += 0.1 * 0.9 ** t * G * (np.eye(2)[action] - pi)
+    agent.update()
+    assert np.allclose(agent.theta, expected)
+
+
+def test_running_baseline():
+    G = np.random.RandomState(0).randn(500)
+    rates = np.full(500, 0.6)
+    w, expected = 1., []
+    for t in range(500):
+        expected.append(w)
+        w += rates[t] * (G[t] - w)
+    baselines, w_end = running_baseline(G, rates, 1.)
+    assert np.allclose(baselines, expected) and np.isclose(w_end, w)
+
+
+def test_run_batched():
+    totals = run_batched(20, 300, alpha=2 ** -9, alpha_w=2 ** -6, seed=0)
+    assert totals.shape == (20, 300)
+    assert totals[:, :10].mean() < -40 and totals[:, -50:].mean() > -15
+    assert np.array_equal(totals, run_batched(20, 300, alpha=2 ** -9, alpha_w=2 ** -6, seed=0))
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    for alpha in (2 ** -12, 2 ** -13, 2 ** -14):
+        plt.plot(run_batched(100, 1000, alpha).mean(axis=0), label='alpha = 2^%d' % np.log2(alpha))
+    plt.plot(run_batched(100, 1000, 2 ** -9, 2 ** -6).mean(axis=0), label='with baseline')
+    plt.legend()
+    plt.show()
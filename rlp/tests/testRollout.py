@@ -0,0 +1,56 @@
+from rlp.rollout import *
+from rlp.grid_world import GridWorld
+from rlp.monte_carlo.base import BlackJackEnv, NaiveBlackJackAgent, encode_state, decode_state
+from rlp.multi_armed_bandits.envs import MultiArmedBandit
+from rlp.multi_armed_bandits.agents import UCB
+from rlp.temporal_difference.base import SarsaAgent, run_episode
+import numpy as np
+
+
+def test_td_pipeline_matches_run_episode():
+    agents = []
+    for piped in (False, True):
+        env = GridWorld(4, 4, [(0, 0), (3, 3)], seed=0)
+        agent = SarsaAgent(env.n_states, 4, alpha=0.5, discountRatio=1, eps=0.2, encode=env.encode, seed=1)
+        if piped:
+            assert drain(learn(rollout(env, agent, n_episodes=200, max_steps=50), td_learner(agent))) > 200
+        else:
+            for episode in range(200):
+                run_episode(env, agent, env.reset(), max_steps=50)
+        agents.append(agent)
+    assert np.array_equal(agents[0].Q, agents[1].Q)
+
+
+def test_mc_episode_batches():
+    env = BlackJackEnv()
+    policy = NaiveBlackJackAgent()
+    np.random.seed(0)
+    batches = list(episode_batches(encode_states(rollout(env, policy, n_episodes=250), encode_state), 100))
+    assert [len(offsets) - 1 for states, actions, rewards, offsets in batches] == [100, 100, 50]
+
+    batched, sequential = NaiveBlackJackAgent(discountRatio=0.9), NaiveBlackJackAgent(discountRatio=0.9)
+    drain(learn(batches, batched.update_batch))
+    for states, actions, rewards, offsets in batches:
+        assert np.all(np.delete(rewards, offsets[1:] - 1) == 0)
+        for i in range(len(offsets) - 1):
+            sequential.reset()
+            for t in range(offsets[i], offsets[i + 1]):
+                sequential.set_state(decode_state(states[t]))
+                sequential.set_experience(rewards[t], None)
+            sequential.update()
+    assert np.allclose(batched.V_table, sequential.V_table)
+
+
+def test_bandits_and_cut_episodes():
+    means = np.arange(5.)
+    agent = UCB(alpha=0.1, conf_level=2, Q0=np.zeros(5), seed=0)
+    transitions = list(learn(rollout(MultiArmedBandit(5, means, np.ones(5), seed=1), agent, n_steps=250),
+                             bandit_learner(agent)))
+    assert len(transitions) == 250 and agent.timestep == 250 and not any(tr.done for tr in transitions)
+    assert np.array_equal([tr.action for tr in transitions], agent.actions)
+
+    # episodes cut by max_steps end a batch without a terminal step
+    env = GridWorld(3, 3, [(0, 0)], seed=0)
+    transitions = list(rollout(env, lambda state: 0, n_episodes=3, max_steps=4))
+    offsets = next(episode_batches(encode_states(transitions, env.encode), 10))[3]
+    assert offsets[-1] == len(transitions) and len(offsets) == 4
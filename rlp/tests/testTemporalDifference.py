@@ -0,0 +1,127 @@
+from rlp.temporal_difference.base import *
+from rlp.temporal_difference.multistep import *
+from rlp.grid_world import GridWorld
+from rlp.monte_carlo.base import BlackJackEnv
+import numpy as np
+
+
+def run_grid_world(agent, env, n_episodes, seed=0):
+    random_state = np.random.RandomState(seed)
+    starts = np.flatnonzero(~env.terminal_mask)
+    for episode in range(n_episodes):
+        run_episode(env, agent, env.decode(random_state.choice(starts)), max_steps=100)
+
+
+def test_q_learning_and_expected_sarsa_grid_world():
+    env = GridWorld(4, 4, [(0, 0), (3, 3)], seed=0)
+    # reward is -1 per step except the last one into a terminal state
+    distance = np.array([min(y + x, 6 - y - x) for y in range(4) for x in range(4)])
+    optimal = np.where(env.terminal_mask, 0, 1 - distance)
+
+    for agent_cls in (QLearningAgent, ExpectedSarsaAgent):
+        n_states, encode = grid_world_encoding(env)
+        agent = agent_cls(n_states, 4, alpha=0.5, discountRatio=1, eps=0.2, encode=encode, seed=1)
+        run_grid_world(agent, env, 2000)
+        V = agent.Q.max(axis=1)
+        if agent_cls is QLearningAgent:
+            assert np.allclose(V[~env.terminal_mask], optimal[~env.terminal_mask])
+        # the greedy policy reaches a terminal state by a shortest path
+        for s in np.flatnonzero(~env.terminal_mask):
+            steps = 0
+            while not env.terminal_mask[s]:
+                s = env.next_state_table[s, agent.greedy_action(s)]
+                steps += 1
+            assert steps <= 6
+
+
+def test_sarsa_next_action():
+    env = GridWorld(1, 3, [(0, 2)], seed=0)
+    agent = SarsaAgent(3, 4, alpha=1, discountRatio=1, eps=0.5, encode=env.encode, seed=0)
+    agent.set_state((0, 0))
+    action = agent.action()
+    reward, state, status = env.step((0, 0), action)
+    agent.set_experience(reward, state, status == TERMINAL)
+    agent.update()
+    chosen = agent._next_action
+    agent.set_state(state)
+    assert agent.action() == chosen and agent._next_action is None
+    agent.set_next_action(3)
+    assert agent.action() == 3
+
+
+def test_td0_and_sarsa_blackjack():
+    env = BlackJackEnv(seed=0)
+    np.random.seed(0)
+    n_states, encode = blackjack_encoding()
+    assert sorted(encode((a, p, d)) for a, p, d in [(0, 12, 'A'), (1, 21, 10)]) == [0, n_states - 1]
+
+    sarsa = SarsaAgent(n_states, 2, alpha=0.05, discountRatio=1, eps=0.1, encode=encode, seed=0)
+    td0 = TD0Agent(n_states, 2, alpha=0.05, discountRatio=1, encode=encode, seed=0)
+    for agent in (sarsa, td0):
+        for episode in range(500):
+            total, steps = run_episode(env, agent, env.reset())
+            assert total in (-1, 0, 1) and steps >= 1
+    assert np.all(np.abs(sarsa.Q) <= 1) and np.all(np.abs(td0.V) <= 1)
+    assert np.any(td0.V != 0)
+
+
+def test_n_step_buffer():
+    buf = NStepBuffer(3, discountRatio=0.5)
+    for t in range(1, 7):
+        buf.rewards[t % 4] = t
+    # R_4 + 0.5 R_5 + 0.25 R_6 across the wrap-around
+    assert buf.rewards_sum(3, 6) == 4 + 0.5 * 5 + 0.25 * 6
+    assert buf.rewards_sum(5, 6) == 6
+
+
+def run_corridor(agent, env, n_episodes):
+    random_state = np.random.RandomState(0)
+    for episode in range(n_episodes):
+        run_episode(env, agent, (0, random_state.randint(1, 6)))
+    return agent
+
+
+def test_multistep_prediction():
+    env = GridWorld(1, 7, [(0, 0), (0, 6)], seed=0)
+    # values of the uniformly random policy, UP and DOWN stay in place
+    P = np.zeros((7, 7))
+    for action in range(4):
+        P[np.arange(7), env.next_state_table[:, action]] += 0.25
+    live = ~env.terminal_mask
+    V = np.zeros(7)
+    V[live] = np.linalg.solve(np.eye(5) - P[np.ix_(live, live)], env.reward_table.mean(axis=1)[live])
+
+    agents = [NStepTDAgent(7, 4, 3, 0.02, 1, encode=env.encode, seed=1)]
+    agents += [TDLambdaAgent(7, 4, 0.02, 1, 0.8, trace, encode=env.encode, seed=1) for trace in TRACES]
+    for agent in agents:
+        run_corridor(agent, env, 2000)
+        assert np.allclose(agent.V, V, rtol=0.25, atol=0.5)
+        assert len(getattr(agent, 'traces', [])) == 0
+
+    # one step back, both reduce to TD(0)
+    td0 = run_corridor(TD0Agent(7, 4, 0.1, 0.9, encode=env.encode, seed=3), env, 200)
+    assert np.array_equal(run_corridor(NStepTDAgent(7, 4, 1, 0.1, 0.9, encode=env.encode, seed=3), env, 200).V, td0.V)
+    assert np.allclose(run_corridor(TDLambdaAgent(7, 4, 0.1, 0.9, 0., encode=env.encode, seed=3), env, 200).V, td0.V)
+
+
+def test_multistep_control():
+    env = GridWorld(1, 7, [(0, 0), (0, 6)], seed=0)
+    sarsa = run_corridor(SarsaAgent(7, 4, 0.1, 0.9, encode=env.encode, seed=3), env, 200)
+    one_step = run_corridor(NStepSarsaAgent(7, 4, 1, 0.1, 0.9, encode=env.encode, seed=3), env, 200)
+    assert np.array_equal(sarsa.Q, one_step.Q)
+
+    env = GridWorld(4, 4, [(0, 0), (3, 3)], seed=0)
+    for agent in (NStepSarsaAgent(16, 4, 4, 0.2, 1, encode=env.encode, seed=0),
+                  SarsaLambdaAgent(16, 4, 0.2, 1, 0.9, 'replacing', encode=env.encode, seed=0),
+                  SarsaLambdaAgent(16, 4, 0.2, 1, 0.9, 'dutch', encode=env.encode, seed=0)):
+        run_grid_world(agent, env, 500)
+        for s in np.flatnonzero(~env.terminal_mask):
+            steps = 0
+            while not env.terminal_mask[s] and steps < 16:
+                s = env.next_state_table[s, agent.greedy_action(s)]
+                steps += 1
+            assert env.terminal_mask[s]
+
+
+if __name__ == '__main__':
+    test_q_learning_and_expected_sarsa_grid_world()
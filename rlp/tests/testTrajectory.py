@@ -0,0 +1,125 @@
+from rlp.trajectory import TrajectoryStore
+from rlp.monte_carlo.base import BatchedBlackJackEnv, NaiveBlackJackAgent, OffPolicyBlackJackAgent, \
+    threshold_policy, decode_state, STATE_SHAPE
+from rlp.grid_world import GridWorld
+from rlp.temporal_difference.base import TD0Agent, SarsaAgent, replay_episode
+from rlp.temporal_difference.multistep import NStepSarsaAgent
+import numpy as np
+import tempfile
+
+
+def test_memory_and_file_stores():
+    env = BatchedBlackJackEnv(seed=0)
+    batches = [env.simulate(threshold_policy(20), 300) for _ in range(3)]
+    with tempfile.TemporaryDirectory() as path:
+        stores = [TrajectoryStore(state_shape=(3, )), TrajectoryStore(path, state_shape=(3, ), chunk_size=100)]
+        for store in stores:
+            for batch in batches:
+                store.append_batch(*batch)
+            store.append_episode(np.array([[0, 8, 9]]), [1], [1.])
+        stores[1].close()
+        stores.append(TrajectoryStore(path))
+        assert isinstance(stores[2].arrays()[0], np.memmap)
+
+        for store in stores:
+            assert store.n_episodes == 901 and store.state_shape == (3, )
+            states, actions, rewards, offsets = store.batch(300, 600)
+            assert np.array_equal(states, batches[1][0]) and np.array_equal(offsets, batches[1][3])
+            assert np.array_equal(rewards, batches[1][2]) and np.array_equal(actions, batches[1][1])
+            assert np.array_equal(store[-1][0], [[0, 8, 9]])
+            assert np.shares_memory(store[5][2], store.arrays()[2])
+
+
+def test_reopen_without_close():
+    with tempfile.TemporaryDirectory() as path:
+        store = TrajectoryStore(path)
+        store.append_episode([1, 2, 3], [0, 1, 0], [0., 0., 1.])
+        # a read writes the buffered steps together with the meta
+        assert np.array_equal(store.episode(0)[0], [1, 2, 3])
+        store.append_episode([4, 5], [1, 1], [0., -1.])
+        store.columns['states'].flush()
+        del store
+
+        # the second episode reached states.bin only, it is dropped
+        store = TrajectoryStore(path)
+        assert store.n_episodes == 1 and store.n_steps == 3
+        store.append_episode([7, 8], [0, 0], [1., 1.])
+        store.close()
+        store = TrajectoryStore(path)
+        assert np.array_equal(store.episode(0)[0], [1, 2, 3]) and np.array_equal(store.episode(1)[0], [7, 8])
+        assert np.array_equal(store.arrays()[3], [0, 3, 5])
+
+
+def test_replay_mc():
+    env = BatchedBlackJackEnv(seed=1)
+    store = TrajectoryStore(state_shape=(3, ))
+    store.append_batch(*env.simulate(np.full(STATE_SHAPE + (2, ), 0.5), 2000))
+
+    batched, looped = NaiveBlackJackAgent(), NaiveBlackJackAgent()
+    batched.update_batch(*store.batch())
+    for episode in store:
+        looped.replay(*episode)
+    assert np.allclose(batched.V_table, looped.V_table)
+
+    replayed, live = OffPolicyBlackJackAgent(discountRatio=0.9), OffPolicyBlackJackAgent(discountRatio=0.9)
+    for episode in store:
+        replayed.replay(*episode)
+        live.reset()
+        for index, action, reward in zip(*episode):
+            live.set_state(decode_state(index))
+            live.action_ = action
+            live.set_experience(reward, None)
+        live.update()
+    assert live.C_table.sum() > 0
+    assert np.array_equal(replayed.Q_table, live.Q_table) and np.array_equal(replayed.C_table, live.C_table)
+
+
+def test_replay_td():
+    env = GridWorld(4, 4, [(0, 0), (3, 3)], seed=0)
+    store = TrajectoryStore()
+    recorder = TD0Agent(env.n_states, 4, 0.1, 1., encode=env.encode, seed=0)
+    for _ in range(50):
+        state = env.reset()
+        states, actions, rewards = [], [], []
+        status = 0
+        while not status:
+            recorder.set_state(state)
+            states.append(env.encode(state))
+            actions.append(recorder.action())
+            reward, state, status = env.step(state, actions[-1])
+            rewards.append(reward)
+            recorder.set_experience(reward, state, bool(status))
+            recorder.update()
+        store.append_episode(states, actions, rewards)
+
+    agent = TD0Agent(env.n_states, 4, 0.1, 1.)
+    for episode in store:
+        total, steps = replay_episode(agent, *episode)
+        assert total == episode[2].sum() and steps == len(episode[1])
+    assert np.allclose(agent.V, recorder.V)
+
+
+def test_replay_sarsa():
+    env = GridWorld(4, 4, [(0, 0), (3, 3)], seed=0)
+    for agent_cls, args in ((SarsaAgent, ()), (NStepSarsaAgent, (3, ))):
+        live = agent_cls(env.n_states, 4, *args, alpha=0.5, discountRatio=1, eps=0.3, encode=env.encode, seed=1)
+        store = TrajectoryStore()
+        for _ in range(30):
+            states, actions, rewards = [], [], []
+            live.reset()
+            state, status = env.reset(), 0
+            while not status:
+                live.set_state(state)
+                states.append(env.encode(state))
+                actions.append(live.action())
+                reward, state, status = env.step(state, actions[-1])
+                rewards.append(reward)
+                live.set_experience(reward, state, bool(status))
+                live.update()
+            store.append_episode(states, actions, rewards)
+
+        # the replay bootstraps on the recorded next actions, with another seed
+        replayed = agent_cls(env.n_states, 4, *args, alpha=0.5, discountRatio=1, eps=0.3, seed=2)
+        for episode in store:
+            replay_episode(replayed, *episode)
+        assert np.array_equal(replayed.Q, live.Q)
@@ -0,0 +1,81 @@
+from rlp.vector_env import VectorEnv, TERMINAL
+from rlp.grid_world import GridWorld, LEFT, UP
+from rlp.monte_carlo.base import BlackJackEnv, STICK
+from rlp.multi_armed_bandits.envs import NonStationaryMultiArmedBandit
+from rlp.temporal_difference.base import QLearningAgent, blackjack_encoding
+import numpy as np
+
+
+def make_grid_worlds(n):
+    return [GridWorld(3, 4, [(0, 0)], seed=k) for k in range(n)]
+
+
+def test_sync_matches_subprocess():
+    results = {}
+    for backend in VectorEnv.BACKENDS:
+        env = make_grid_worlds(1)[0]
+        with VectorEnv(make_grid_worlds(5), encode=env.encode, backend=backend, n_workers=2) as venv:
+            history = [venv.reset()]
+            for t in range(20):
+                actions = np.full(5, LEFT if t % 3 else UP)
+                history.extend(venv.step(actions))
+        results[backend] = history
+    for x, y in zip(results['sync'], results['subprocess']):
+        assert np.array_equal(x, y)
+
+
+def test_wrapping_keeps_random_state():
+    env = make_grid_worlds(1)[0]
+    venv = VectorEnv(make_grid_worlds(3), encode=env.encode)
+    assert np.array_equal(venv.reset()[:, 0], [env.encode(e.reset()) for e in make_grid_worlds(3)])
+
+
+def test_auto_reset():
+    env = GridWorld(1, 3, [(0, 0)], seed=0)
+    venv = VectorEnv([env], encode=env.encode)
+    obs = venv.reset()
+    steps = 0
+    done = False
+    while not done:
+        rewards, obs, dones = venv.step([LEFT])
+        done, steps = dones[0], steps + 1
+    # the episode ended with reward 0 and the observation is a new non-terminal start
+    assert rewards[0] == 0 and obs[0, 0] in (1, 2) and steps <= 2
+
+
+def test_blackjack_workers_collect_experience():
+    n_states, encode = blackjack_encoding()
+    venv = VectorEnv([BlackJackEnv(seed=k) for k in range(4)], encode=encode, backend='subprocess',
+                     n_workers=2, seed=0)
+    obs = venv.reset()
+    rewards, obs, dones = venv.step(np.full(4, STICK))
+    venv.close()
+    assert dones.all() and set(rewards) <= {-1., 0., 1.}
+    assert np.all((0 <= obs) & (obs < n_states))
+
+    # one Q table learning from the streams of all copies
+    env = GridWorld(3, 4, [(0, 0)], seed=0)
+    agents = [QLearningAgent(12, 4, alpha=0.5, discountRatio=1, eps=0.2, seed=k) for k in range(4)]
+    for agent in agents[1:]:
+        agent.Q = agents[0].Q
+    venv = VectorEnv(make_grid_worlds(4), encode=env.encode)
+    obs = venv.reset()
+    for t in range(2000):
+        actions = []
+        for agent, s in zip(agents, obs[:, 0]):
+            agent.set_state(s)
+            actions.append(agent.action())
+        rewards, obs_, dones = venv.step(actions)
+        for agent, reward, s_, done in zip(agents, rewards, obs_[:, 0], dones):
+            agent.set_experience(reward, s_, done)
+            agent.update()
+        obs = obs_
+    assert np.isclose(agents[0].Q.max(axis=1)[env.encode((2, 3))], -4)
+
+
+def test_non_stationary_bandit():
+    bandit = NonStationaryMultiArmedBandit(3, [0., 1., 2.], np.ones(3), seed=0)
+    state = bandit.reset()
+    reward, state, status = bandit.step(state, 1)
+    assert isinstance(reward, float) and status != TERMINAL
+    assert not np.array_equal(bandit.reward_dist_means, [0., 1., 2.])
@@ -0,0 +1,234 @@
+import json
+import os
+import numpy as np
+"""
+This module stores collected episodes column by column:
+states, actions and rewards of all steps back to back, and episode offsets,
+episode i is steps offsets[i]:offsets[i + 1].
+Stores live in memory or in a directory of raw .bin files which grow by appending chunks
+and are read back through np.memmap, so episodes are sliced without copies.
+"""
+
+COLUMNS = ('states', 'actions', 'rewards')
+
+
+class _Column:
+    """ Growable array of rows with a fixed trailing shape, in memory or in an appendable file.
+    """
+
+    def __init__(self, dtype, shape=(), path=None, size=0):
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.path = path
+        self.size = size  # rows stored, pending ones included
+        self._pending = []
+        self._map = None
+        if path is None:
+            self._data = np.zeros((max(size, 16), ) + self.shape, dtype=self.dtype)
+        elif not os.path.exists(path):
+            open(path, 'wb').close()
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=self.dtype).reshape((-1, ) + self.shape)
+        if self.path is None:
+            if self.size + len(rows) > len(self._data):
+                data = np.zeros((max(2 * len(self._data), self.size + len(rows)), ) + self.shape, dtype=self.dtype)
+                data[:self.size] = self._data[:self.size]
+                self._data = data
+            self._data[self.size:self.size + len(rows)] = rows
+        else:
+            self._pending.append(rows.copy())
+        self.size += len(rows)
+
+    def truncate(self):
+        """ drop rows of the file beyond size, e.g. written by a process which ended before recording them.
+        """
+        nbytes = self.size * self.dtype.itemsize * int(np.prod(self.shape, dtype=np.int64))
+        if os.path.getsize(self.path) > nbytes:
+            with open(self.path, 'r+b') as f:
+                f.truncate(nbytes)
+
+    def flush(self):
+        if self._pending:
+            with open(self.path, 'ab') as f:
+                for rows in self._pending:
+                    f.write(rows.tobytes())
+            self._pending = []
+            self._map = None
+
+    def view(self):
+        """ read-only array of all rows, a memmap for file columns, pending rows must be flushed first.
+        """
+        if self.path is None:
+            ret = self._data[:self.size].view()
+            ret.flags.writeable = False
+            return ret
+        assert not self._pending, 'flush the store before reading'
+        if self._map is None or len(self._map) != self.size:
+            if self.size == 0:
+                self._map = np.zeros((0, ) + self.shape, dtype=self.dtype)
+            else:
+                self._map = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(self.size, ) + self.shape)
+        return self._map
+
+
+class TrajectoryStore:
+    """ Columnar store of episodes, see the module docstring.
+    Episodes read back as (states, actions, rewards) views, without copies.
+    """
+
+    def __init__(self, path=None, state_shape=(), state_dtype=np.int64, action_dtype=np.int64,
+                 reward_dtype=np.float64, chunk_size=1 << 16):
+        """
+        Params:
+        path - directory of the store, created if missing and reopened for appending if it holds one,
+            default None keeps the store in memory.
+        state_shape - shape of one encoded state, e.g. () for GridWorld.encode, (3, ) for encode_state of Black Jack.
+        state_dtype, action_dtype, reward_dtype - column dtypes, ignored when reopening a store.
+        chunk_size - number of buffered steps written to the files at a time.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        meta = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(self._meta_path()):
+                with open(self._meta_path()) as f:
+                    meta = json.load(f)
+        if meta is None:
+            meta = {'state_shape': list(state_shape), 'state_dtype': np.dtype(state_dtype).str,
+                    'action_dtype': np.dtype(action_dtype).str, 'reward_dtype': np.dtype(reward_dtype).str,
+                    'n_steps': 0, 'n_episodes': 0}
+        self.state_shape = tuple(meta['state_shape'])
+
+        def column(name, dtype, shape=(), size=meta['n_steps']):
+            return _Column(dtype, shape, None if path is None else os.path.join(path, name + '.bin'), size)
+
+        self.columns = {
+            'states': column('states', meta['state_dtype'], self.state_shape),
+            'actions': column('actions', meta['action_dtype']),
+            'rewards': column('rewards', meta['reward_dtype']),
+        }
+        self.offsets = column('offsets', np.int64, size=meta['n_episodes'] + 1)
+        if path is not None:
+            # rows beyond the meta were written by a process which ended without flushing the meta
+            for col in self._all_columns():
+                col.truncate()
+        if meta['n_episodes'] == 0 and (path is None or os.path.getsize(self.offsets.path) == 0):
+            self.offsets.size = 0
+            self.offsets.append([0])
+        self.flush()
+
+    def _all_columns(self):
+        return list(self.columns.values()) + [self.offsets]
+
+    def _meta_path(self):
+        return os.path.join(self.path, 'meta.json')
+
+    @property
+    def n_steps(self):
+        return self.columns['states'].size
+
+    @property
+    def n_episodes(self):
+        return self.offsets.size - 1
+
+    def __len__(self):
+        return self.n_episodes
+
+    def append_episode(self, states, actions, rewards):
+        """ append one episode of T steps.
+        Params:
+        states - array (T, ) + state_shape.
+        actions, rewards - arrays (T, ).
+        """
+        T = len(actions)
+        assert len(states) == len(rewards) == T
+        self.columns['states'].append(states)
+        self.columns['actions'].append(actions)
+        self.columns['rewards'].append(rewards)
+        self.offsets.append([self.n_steps])
+        self._maybe_flush()
+
+    def append_batch(self, states, actions, rewards, offsets):
+        """ append many episodes given as flat arrays, e.g. from BatchedBlackJackEnv.simulate.
+        Params:
+        offsets - int array (n_episodes + 1, ), episode i is steps offsets[i]:offsets[i + 1].
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        assert offsets[0] == 0 and offsets[-1] == len(actions) == len(rewards) == len(states)
+        base = self.n_steps
+        self.columns['states'].append(states)
+        self.columns['actions'].append(actions)
+        self.columns['rewards'].append(rewards)
+        self.offsets.append(offsets[1:] + base)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self.path is not None and sum(len(rows) for rows in self.columns['states']._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ write buffered steps and the meta data to the files.
+        """
+        if self.path is None:
+            return
+        for col in self._all_columns():
+            col.flush()
+        meta = {'state_shape': list(self.state_shape), 'state_dtype': self.columns['states'].dtype.str,
+                'action_dtype': self.columns['actions'].dtype.str, 'reward_dtype': self.columns['rewards'].dtype.str,
+                'n_steps': self.n_steps, 'n_episodes': self.n_episodes}
+        with open(self._meta_path(), 'w') as f:
+            json.dump(meta, f)
+
+    def _views(self):
+        """ read-only views of the columns and offsets, buffered steps are flushed with the meta first.
+        """
+        if any(col._pending for col in self._all_columns()):
+            self.flush()
+        return tuple(self.columns[name].view() for name in COLUMNS) + (self.offsets.view(), )
+
+    def arrays(self):
+        """ (states, actions, rewards, offsets) of the whole store, read-only views.
+        """
+        return self._views()
+
+    def episode(self, i):
+        """ (states, actions, rewards) of episode i, read-only views.
+        """
+        if i < 0:
+            i += self.n_episodes
+        if not 0 <= i < self.n_episodes:
+            raise IndexError('episode %d out of range' % i)
+        states, actions, rewards, offsets = self._views()
+        lo, hi = offsets[i], offsets[i + 1]
+        return states[lo:hi], actions[lo:hi], rewards[lo:hi]
+
+    def batch(self, start=0, stop=None):
+        """ episodes start .. stop - 1 as flat (states, actions, rewards, offsets),
+        views except offsets which are rebased to start at 0, e.g. for BlackJackAgent.update_batch.
+        """
+        states, actions, rewards, offsets = self._views()
+        offsets = offsets[start:(self.n_episodes if stop is None else stop) + 1]
+        lo, hi = offsets[0], offsets[-1]
+        return states[lo:hi], actions[lo:hi], rewards[lo:hi], offsets - lo
+
+    def __getitem__(self, i):
+        return self.episode(i)
+
+    def __iter__(self):
+        for i in range(self.n_episodes):
+            yield self.episode(i)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        where = 'memory' if self.path is None else self.path
+        return 'TrajectoryStore(%d episodes, %d steps, %s)' % (self.n_episodes, self.n_steps, where)
@@ -1,35 +1,177 @@
 import numpy as np
+from collections.abc import Mapping
+from functools import lru_cache
 
 
-def softmax(x):
-    """ Caluate softmax distribution over float array x.
+def softmax(x, axis=-1, temperature=1., out=None):
+    """ Caluate softmax distribution over float array x along axis, numerically stable:
+    exp((x - max(x)) / temperature), normalized.
+    Params:
+    axis - axis of the distribution, default the last one, e.g. each row of a (n_runs, n_arms) batch.
+    temperature - positive float, the distribution gets greedier as it goes to 0.
+    out - optional float array with the shape of x to write the result into, may be x itself.
+    """
+    out = _shifted(x, axis, temperature, out)
+    np.exp(out, out=out)
+    out /= out.sum(axis=axis, keepdims=True)
+    return out
+
+
+def log_softmax(x, axis=-1, temperature=1., out=None):
+    """ log of softmax(x, axis, temperature), computed without under- or overflow.
     """
-    arr = np.exp(x)
-    return arr / arr.sum()
+    out = _shifted(x, axis, temperature, out)
+    out -= np.log(np.exp(out).sum(axis=axis, keepdims=True))
+    return out
+
+
+def _shifted(x, axis, temperature, out):
+    """ (x - max(x)) / temperature along axis, written into out.
+    """
+    assert temperature > 0
+    x = np.asarray(x, dtype=float)
+    out = np.subtract(x, x.max(axis=axis, keepdims=True), out=out)
+    if temperature != 1:
+        out /= temperature
+    return out
 
 
 def argmax(container):
-    """ argmax for container (list or dict).
-    if there are multiple argmax in the result, return all of them.
+    """ argmax for container (dict or other mapping, list, tuple or NumPy array) in a single pass.
+    if there are multiple argmax in the result, return all of them:
+    a list of keys for dict, a list of indices for list, tuple or 1-D array,
+    a boolean mask of the maximizers of each row for 2-D array.
     """
-    if isinstance(container, dict):
-        sorted_ = sorted(container.items(), key=lambda x: x[1], reverse=True)
-        arg_max, max_ = sorted_[0]
+    if isinstance(container, np.ndarray):
+        if container.ndim == 1:
+            return np.flatnonzero(container == container.max()).tolist()
+        elif container.ndim == 2:
+            return container == container.max(axis=1, keepdims=True)
+        raise ValueError('argmax expects a 1-D or 2-D array, got %d-D' % container.ndim)
+    if isinstance(container, Mapping):
+        items = container.items()
     elif isinstance(container, list) or isinstance(container, tuple):
-        sorted_ = sorted(enumerate(container), key=lambda x: x[1], reverse=True)
-        arg_max, max_ = sorted_[0]
+        items = enumerate(container)
     else:
         raise TypeError('invliad container type %s' % type(container))
 
-    ret = [arg_max]
-    for key, val in sorted_[1:]:
-        if val == max_:
+    ret = []
+    for key, val in items:
+        if not ret or val > max_:
+            max_ = val
+            ret = [key]
+        elif val == max_:
             ret.append(key)
-        else:
-            break
+    if not ret:
+        raise ValueError('argmax of an empty container')
+    return ret
+
+
+def random_argmax(container, random_state=None):
+    """ one argmax of container picked uniformly at random among the ties, see argmax.
+    For 2-D array, return an int array with one maximizer of each row.
+    Params:
+    random_state - RandomState or Generator, default the global numpy random state.
+    """
+    random_state = np.random if random_state is None else random_state
+    ties = argmax(container)
+    if isinstance(ties, np.ndarray):
+        return np.where(ties, random_state.random(ties.shape), -1).argmax(axis=1)
+    if len(ties) == 1:
+        return ties[0]
+    return ties[int(random_state.random() * len(ties))]
+
+
+def one_hot_argmax(values, keep=None):
+    """ one-hot matrix of the argmax of each row of a 2-D array, the first maximizer by default.
+    Params:
+    keep - int array (n_rows, ), column kept in a row whenever it is one of its maximizers,
+        e.g. the current greedy action, so that policy iteration does not flip between ties.
+    """
+    rows = np.arange(len(values))
+    best = values.argmax(axis=1)
+    if keep is not None:
+        tied = values[rows, keep] == values[rows, best]
+        best[tied] = keep[tied]
+    ret = np.zeros(values.shape)
+    ret[rows, best] = 1
     return ret
 
 
+class History:
+    """ Preallocated NumPy store for a scalar history, e.g. rewards or actions of an agent.
+    By default the buffer doubles when full, in ring mode only the last capacity entries are kept.
+    Running count, sum and mean cover every appended value, whether it is kept or not.
+    """
+
+    def __init__(self, capacity=None, ring=False, record=True, dtype=float):
+        """
+        Params:
+        capacity - buffer size, required in ring mode, default 1024 otherwise.
+        ring - keep only the last capacity entries.
+        record - keep entries at all, if False only the running statistics are updated.
+        dtype - dtype of entries.
+        """
+        assert not ring or capacity, 'ring mode needs a capacity'
+        self.ring = ring
+        self.record = record
+        self._buffer = np.zeros(((capacity or 1024) if record else 0, ), dtype=dtype)
+        self._start = 0
+        self._size = 0
+        self.count = 0
+        self.sum = 0
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.
+
+    def append(self, value):
+        self.count += 1
+        self.sum += value
+        if not self.record:
+            return
+
+        capacity = len(self._buffer)
+        if self._size < capacity:
+            self._buffer[(self._start + self._size) % capacity] = value
+            self._size += 1
+        elif self.ring:
+            # overwrite the oldest entry
+            self._buffer[self._start] = value
+            self._start = (self._start + 1) % capacity
+        else:
+            self._buffer = np.concatenate([self._buffer, np.zeros_like(self._buffer)])
+            self._buffer[self._size] = value
+            self._size += 1
+
+    def values(self):
+        """ kept entries in order of appending, a view unless the ring has wrapped.
+        """
+        end = self._start + self._size
+        if end <= len(self._buffer):
+            return self._buffer[self._start:end]
+        return np.concatenate([self._buffer[self._start:], self._buffer[:end - len(self._buffer)]])
+
+    def clear(self):
+        self._start = self._size = self.count = 0
+        self.sum = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, idx):
+        return self.values()[idx]
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.values(), dtype=dtype)
+
+    def __repr__(self):
+        return 'History(%d kept, count=%d, mean=%.4f)' % (self._size, self.count, self.mean)
+
+
 def element_wise_product(dict1, dict2):
     assert dict1.keys() == dict2.keys()
     ret = {}
@@ -38,37 +180,106 @@ def element_wise_product(dict1, dict2):
     return ret
 
 
+def discounted_returns(rewards, discountRatio):
+    """ returns G_t = \\sum_{k >= t} \\gamma^{k - t} R_{k + 1} of one episode in a backward pass,
+    where rewards[t] is R_{t + 1}. Long episodes are processed in blocks short enough
+    for the powers of gamma not to underflow.
+    Params:
+    rewards - float array (T, ).
+    discountRatio - discount ratio for returns.
+
+    Returns:
+    float array (T, )
+    """
+    rewards = np.asarray(rewards, dtype=float)
+    T = len(rewards)
+    if discountRatio == 0:
+        return rewards.copy()
+    if discountRatio == 1:
+        return np.cumsum(rewards[::-1])[::-1]
+
+    block = max(1, int(-200 / np.log10(discountRatio)))
+    G = np.empty(T)
+    carry = 0.
+    for end in range(T, 0, -block):
+        start = max(0, end - block)
+        discounts = discountRatio ** np.arange(end - start)
+        G[start:end] = np.cumsum((discounts * rewards[start:end])[::-1])[::-1] / discounts
+        G[start:end] += carry * discountRatio ** np.arange(end - start, 0, -1)
+        carry = G[start]
+    return G
+
+
+POISSON_CACHE_SIZE = 256  # max number of (lambda, size) tables kept in memory
+
+
+@lru_cache(maxsize=POISSON_CACHE_SIZE)
+def _poisson_tables(lambda_, size):
+    """ log pmf, pmf and tail P{X >= n} for n = 0, 1, .. size - 1, computed in log space.
+    Tables are cached with LRU eviction, the arrays are read only.
+    """
+    # the tail sums the pmf beyond the table as well, up to where the remaining terms are negligible
+    m = max(size, int(lambda_ + 10 * np.sqrt(lambda_))) + 64
+    n = np.arange(m)
+    log_factorial = np.concatenate([[0.], np.cumsum(np.log(np.arange(1, m)))])
+    if lambda_ > 0:
+        log_pmf = n * np.log(lambda_) - lambda_ - log_factorial
+    else:
+        log_pmf = np.where(n == 0, 0., -np.inf)
+    log_tail = np.logaddexp.accumulate(log_pmf[::-1])[::-1][:size]
+    log_pmf = log_pmf[:size]
+    pmf = np.exp(log_pmf)
+    tail = np.minimum(np.exp(log_tail), 1.)
+    for arr in (log_pmf, pmf, tail):
+        arr.flags.writeable = False
+    return log_pmf, pmf, tail
+
+
+def _table_size(n_max):
+    # round up so that nearby bounds share one cached table
+    size = 32
+    while size <= n_max:
+        size *= 2
+    return size
+
+
+def poisson_log_pmf(lambda_, n_max):
+    """ log possion dist prob, log Pr{n} for n = 0, 1, .. n_max. float array (n_max + 1, ).
+    """
+    return _poisson_tables(lambda_, _table_size(n_max))[0][:n_max + 1]
+
+
+def poisson_pmf(lambda_, n_max):
+    """ possion dist prob, Pr{n} for n = 0, 1, .. n_max. float array (n_max + 1, ).
+    """
+    return _poisson_tables(lambda_, _table_size(n_max))[1][:n_max + 1]
+
+
+def poisson_tail(lambda_, n_max):
+    """ possion dist tail prob, Pr{X >= n} for n = 0, 1, .. n_max. float array (n_max + 1, ).
+    """
+    return _poisson_tables(lambda_, _table_size(n_max))[2][:n_max + 1]
+
+
+def truncated_poisson(lambda_, truncate_threshold):
+    """ possion dist truncated at truncate_threshold, the last entry takes the whole tail, i.e.
+        Pr{truncate_threshold} = 1 - (Pr{0} + Pr{1} + .. Pr{truncate_threshold - 1}).
+    Returns:
+    float array (truncate_threshold + 1, ), sums to 1.
+    """
+    pmf = poisson_pmf(lambda_, truncate_threshold).copy()
+    pmf[-1] = poisson_tail(lambda_, truncate_threshold)[-1]
+    return pmf
+
+
 def possion_prob(n, lambda_, truncate_threshold=None):
     """ compute possion dist prob
         according to : p = exp(-lambda) * lambda^n / n!
     Params:
     n, lambda_: as defined in formula
     truncate_threshold: if n >= truncate_threshold,
-        Pr{n} = 1 - (Pr{0} + Pr{1} + Pr{2} + .. Pr{truncate_threshold}), default None.
+        Pr{n} = 1 - (Pr{0} + Pr{1} + Pr{2} + .. Pr{truncate_threshold - 1}), default None.
     """
     if truncate_threshold is not None and n >= truncate_threshold:
-        return 1 - sum([possion_prob(i, lambda_) for i in range(truncate_threshold)])
-
-    if (n, lambda_) in possion_prob.memo:
-        return possion_prob.memo[(n, lambda_)]
-
-    if n in possion_prob.factorial:
-        factorial = possion_prob.factorial[n]
-    else:
-        for i in sorted(possion_prob.factorial.keys(), reverse=True):
-            if i < n:
-                factorial = possion_prob.factorial[i]
-                i += 1
-                while i <= n:
-                    factorial = factorial * i
-                    possion_prob.factorial[i] = factorial
-                    i += 1
-                break
-            else:
-                continue
-    ret = np.power(lambda_, n) * np.exp(- 1 * lambda_) / factorial
-    possion_prob.memo[(n, lambda_)] = ret
-    return ret
-
-possion_prob.factorial = {0: 1, 1: 1}
-possion_prob.memo = {}
+        return float(poisson_tail(lambda_, truncate_threshold)[truncate_threshold])
+    return float(poisson_pmf(lambda_, n)[n])
@@ -0,0 +1,182 @@
+from threading import BrokenBarrierError
+from copy import deepcopy
+import multiprocessing as mp
+import numpy as np
+"""
+This module steps K copies of an environment together, in this process ('sync')
+or on a pool of worker processes ('subprocess') which write observations, rewards
+and done flags into shared-memory buffers.
+Every copy follows the BaseEnvironment contract, reset() and step(state, action),
+the wrapper keeps the current state of each copy and resets finished episodes automatically.
+"""
+
+# STATUS
+IN_PROGRESS, TERMINAL = 0, 1
+# COMMANDS
+STOP, RESET, STEP = 0, 1, 2
+
+
+def _default_encode(state):
+    return state
+
+
+class VectorEnv:
+    """ K copies of an environment stepped together with auto-reset.
+    States are encoded to float vectors of obs_size entries, e.g. by GridWorld.encode,
+    the observation of a copy whose episode just ended is the first state of its next episode.
+    """
+
+    BACKENDS = ('sync', 'subprocess')
+
+    def __init__(self, envs, encode=None, backend='sync', n_workers=None, seed=None):
+        """
+        Params:
+        envs - list of environment objects, one per copy, must be picklable if processes are spawned.
+        encode - function mapping a state to a number or float array, default the state itself.
+        backend - 'sync' steps the copies in this process, 'subprocess' on worker processes.
+        n_workers - number of worker processes of 'subprocess', default os.cpu_count().
+        seed - entropy for the global numpy random state of each worker,
+            used by environments which draw from np.random, e.g. BlackJackEnv.
+        """
+        assert backend in VectorEnv.BACKENDS, 'unknown backend %s, expected one of %s' % (backend, VectorEnv.BACKENDS)
+        self.envs = list(envs)
+        self.encode = encode if encode is not None else _default_encode
+        self.backend = backend
+        self.n_envs = len(self.envs)
+        K = self.n_envs
+        # size of an encoded state, probed on a copy of the first environment
+        self.obs_size = np.atleast_1d(np.asarray(self.encode(deepcopy(self.envs[0]).reset()), dtype=float)).size
+
+        self.workers = []
+        if backend == 'sync':
+            self.obs = np.zeros((K, self.obs_size))
+            self.rewards = np.zeros(K)
+            self.dones = np.zeros(K, dtype=np.int8)
+            self.actions = np.zeros(K, dtype=np.int64)
+            self.states = [None] * K
+            return
+
+        n_workers = max(1, min(n_workers or mp.cpu_count(), K))
+        self._obs_raw = mp.RawArray('d', K * self.obs_size)
+        self._rewards_raw = mp.RawArray('d', K)
+        self._dones_raw = mp.RawArray('b', K)
+        self._actions_raw = mp.RawArray('q', K)
+        self._cmd = mp.RawValue('i', STOP)
+        self._barrier = mp.Barrier(n_workers + 1)
+
+        self.obs = np.frombuffer(self._obs_raw).reshape(K, self.obs_size)
+        self.rewards = np.frombuffer(self._rewards_raw)
+        self.dones = np.frombuffer(self._dones_raw, dtype=np.int8)
+        self.actions = np.frombuffer(self._actions_raw, dtype=np.int64)
+
+        bounds = np.linspace(0, K, n_workers + 1).astype(int)
+        worker_seeds = np.random.SeedSequence(seed).spawn(n_workers)
+        for rank in range(n_workers):
+            lo, hi = bounds[rank], bounds[rank + 1]
+            worker = mp.Process(target=_worker, daemon=True,
+                                args=(self.envs[lo:hi], self.encode, lo, hi, self.obs_size,
+                                      int(worker_seeds[rank].generate_state(1)[0]),
+                                      self._obs_raw, self._rewards_raw, self._dones_raw, self._actions_raw,
+                                      self._cmd, self._barrier))
+            worker.start()
+            self.workers.append(worker)
+
+    def reset(self):
+        """ start an episode in every copy.
+
+        Returns:
+        float array (n_envs, obs_size), encoded first states.
+        """
+        if self.backend == 'sync':
+            for k, env in enumerate(self.envs):
+                self.states[k] = env.reset()
+                self.obs[k] = self.encode(self.states[k])
+        else:
+            self._run(RESET)
+        return self.obs.copy()
+
+    def step(self, actions):
+        """ one step of every copy, finished episodes are reset.
+        Params:
+        actions - int array (n_envs, ).
+
+        Returns:
+        rewards - float array (n_envs, ).
+        obs - float array (n_envs, obs_size), encoded next states.
+        dones - bool array (n_envs, ), True if the episode of the copy just ended.
+        """
+        self.actions[:] = actions
+        if self.backend == 'sync':
+            _step_slice(self.envs, self.states, self.encode, self.actions, self.obs, self.rewards, self.dones)
+        else:
+            self._run(STEP)
+        return self.rewards.copy(), self.obs.copy(), self.dones.astype(bool)
+
+    def close(self):
+        if not self.workers:
+            return
+        try:
+            self._run(STOP, wait=False)
+        except RuntimeError:
+            # the barrier is broken, the workers cannot be stopped by a command
+            for worker in self.workers:
+                worker.terminate()
+        finally:
+            for worker in self.workers:
+                worker.join()
+            self.workers = []
+
+    def _run(self, cmd, wait=True):
+        self._cmd.value = cmd
+        try:
+            self._barrier.wait()
+            if wait:
+                self._barrier.wait()
+        except BrokenBarrierError:
+            raise RuntimeError('a VectorEnv worker failed, see its traceback above')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return 'VectorEnv(%d x %s, %s)' % (self.n_envs, self.envs[0].__class__.__name__, self.backend)
+
+
+def _step_slice(envs, states, encode, actions, obs, rewards, dones):
+    for k, env in enumerate(envs):
+        reward, state, status = env.step(states[k], int(actions[k]))
+        if status == TERMINAL:
+            state = env.reset()
+        states[k] = state
+        obs[k] = encode(state)
+        rewards[k] = reward
+        dones[k] = status == TERMINAL
+
+
+def _worker(envs, encode, lo, hi, obs_size, seed, obs_raw, rewards_raw, dones_raw, actions_raw, cmd, barrier):
+    try:
+        np.random.seed(seed)
+        K = len(np.frombuffer(rewards_raw))
+        obs = np.frombuffer(obs_raw).reshape(K, obs_size)[lo:hi]
+        rewards = np.frombuffer(rewards_raw)[lo:hi]
+        dones = np.frombuffer(dones_raw, dtype=np.int8)[lo:hi]
+        actions = np.frombuffer(actions_raw, dtype=np.int64)[lo:hi]
+        states = [None] * (hi - lo)
+
+        while True:
+            barrier.wait()
+            if cmd.value == STOP:
+                return
+            if cmd.value == RESET:
+                for k, env in enumerate(envs):
+                    states[k] = env.reset()
+                    obs[k] = encode(states[k])
+            else:
+                _step_slice(envs, states, encode, actions, obs, rewards, dones)
+            barrier.wait()
+    except BaseException:
+        barrier.abort()
+        raise